@@ -1,8 +1,10 @@
 import logging
+import os
 from os.path import join
 from src.application import conf
 
 
+os.makedirs(conf.path_to_temp, exist_ok=True)
 path_log = join(conf.path_to_temp, 'data.log')
 logging.basicConfig(filename=path_log, filemode='w', format='%(asctime)s - %(filename)s - %(funcName)s - %(levelname)s - %(message)s',
                     datefmt='%d-%b-%y %H:%M:%S')
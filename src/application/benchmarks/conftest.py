@@ -0,0 +1,16 @@
+""" Microbenchmarks of the code that runs on every event, with pytest-benchmark.
+Each benchmark runs on synthetic data of several sizes, the objects are created again in each round so
+the state of a round (equity vectors, saved values) doesn't change the next one.
+
+Run:      python -m pytest src/application/benchmarks --benchmark-only
+Baseline: python -m pytest src/application/benchmarks --benchmark-only --benchmark-save=baseline
+Compare:  python -m pytest src/application/benchmarks --benchmark-only --benchmark-compare
+          --benchmark-compare-fail=mean:10%
+The last command fails if the mean of any benchmark is 10% slower than the last run saved, the runs are saved in
+.benchmarks and can be compared with pytest-benchmark compare.
+"""
+import importlib.util
+
+# without pytest-benchmark the benchmarks are not collected
+if importlib.util.find_spec('pytest_benchmark') is None:
+    collect_ignore_glob = ['test_bench_*.py']
@@ -0,0 +1,259 @@
+""" Replay benchmark of the pipeline provider -> bus -> portfolio -> broker.
+The events recorded (Bar, Tick, Odds) are published with Emit_Events at 1x, 10x... or as fast as possible
+(speed=0), the portfolio receives them with receive_events and its orders are received by a mock broker, also
+with receive_events, so the real serialization and bus path is measured. The bus is a local RabbitMQ (--bus
+rabbitmq, config of conf) or the in-process LocalBroker (--bus local).
+
+Stages reported (seconds, p50/p99 of LatencyHistogram):
+ - bus: publish of the provider to reception in the portfolio, deserialization included
+ - portfolio: processing of the event by the portfolio and its strategies
+ - tick_to_order: publish of the bar to reception of the order by the broker
+
+Run: python -m src.application.benchmarks.pipeline_benchmark --bus local --synthetic 20000 --speed 0
+     --output bench.json --baseline bench_previous.json
+"""
+import argparse
+import collections
+import datetime as dt
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from typing import Dict, List
+from src.domain.services.stats.latency import LatencyStats
+
+
+def _rss() -> int:
+    """ Resident memory of the process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _version() -> str:
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def save_events(path: str, events: list) -> None:
+    """ Record events in a json lines file, one event by line"""
+    with open(path, 'w') as f:
+        for event in events:
+            f.write(event.to_json() + '\n')
+
+
+def load_events(path: str) -> list:
+    """ Events of a json lines file recorded with save_events"""
+    from src.infrastructure.brokerMQ import events_type
+    events = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                events.append(events_type[data['event_type']].from_dict(data))
+    return events
+
+
+def synthetic_bars(tickers: List[str], n: int, start: dt.datetime = dt.datetime(2023, 1, 2),
+                   seconds: int = 60, seed: int = 1) -> list:
+    """ n bars by ticker with a random walk, the same for the same seed"""
+    from src.domain.models.trading.bar import Bar
+    rnd = random.Random(seed)
+    prices = {t: 100.0 for t in tickers}
+    bars = []
+    for i in range(n):
+        for ticker in tickers:
+            close = prices[ticker] * (1 + rnd.gauss(0, 0.002))
+            bars.append(Bar(ticker=ticker, contract=ticker, datetime=start + dt.timedelta(seconds=seconds * i),
+                            open=prices[ticker], high=max(prices[ticker], close), low=min(prices[ticker], close),
+                            close=close, volume=1.0, freq=f'{seconds}s'))
+            prices[ticker] = close
+    return bars
+
+
+class PipelineBenchmark(object):
+    """ Replay of events through the bus to a consumer (the portfolio) and from it to a mock broker.
+
+    Parameters
+    ----------
+    config_brokermq: config of brokerMQ, with the connection_factory of a LocalBroker for the in-process bus
+    consumer: callable(event) of the portfolio, Portfolio_Constructor._callback_datafeed
+    routing_key_orders: topic of the orders of the portfolio (conf.ROUTING_KEY)
+    speed: 1 real time, 10 ten times faster, 0 as fast as possible
+    """
+
+    def __init__(self, config_brokermq: Dict, consumer: callable = None, routing_key_orders: str = 'order',
+                 speed: float = 0):
+        self.config_brokermq = config_brokermq
+        self.consumer = consumer
+        self.routing_key_orders = routing_key_orders
+        self.speed = speed
+        self.stats = LatencyStats()
+        self.received = 0
+        self.orders = 0
+        self._sent = collections.defaultdict(collections.deque)  # key: (event_type, ticker), value: send times
+        self._sent_bars = {}  # key: (ticker, datetime), value: send time, for the orders
+        self._last_received = None
+        self._active = True
+
+    def _on_event(self, event) -> None:
+        received = time.perf_counter()
+        sent = self._sent[(event.event_type, event.ticker)]
+        if sent:
+            sent_time = sent.popleft()
+            self.stats.add('bus', received - sent_time)
+            self._sent_bars[(event.ticker, event.datetime)] = sent_time
+        if self.consumer is not None:
+            self.consumer(event)
+        self._last_received = time.perf_counter()
+        self.stats.add('portfolio', self._last_received - received)
+        self.received += 1
+
+    def _on_order(self, order) -> None:
+        received = time.perf_counter()
+        sent_time = self._sent_bars.get((order.ticker, order.datetime))
+        if sent_time is not None:
+            self.stats.add('tick_to_order', received - sent_time)
+        self.orders += 1
+
+    def _consume(self, routing_key: str, callback: callable, ready: threading.Event) -> None:
+        from src.infrastructure.brokerMQ import receive_events
+        connection = receive_events(routing_key=routing_key, callback=callback, config=self.config_brokermq,
+                                    block=False)
+        ready.set()
+        while self._active:
+            connection.process_data_events(time_limit=0.05)
+        connection.close()
+
+    def _start_consumer(self, routing_key: str, callback: callable) -> threading.Thread:
+        ready = threading.Event()
+        thread = threading.Thread(target=self._consume, args=(routing_key, callback, ready), daemon=True)
+        thread.start()
+        ready.wait(10)
+        return thread
+
+    def run(self, events: list, timeout: float = 60) -> Dict:
+        """ Replay the events and returns the results"""
+        from src.infrastructure.brokerMQ import Emit_Events
+        topics = sorted({event.event_type for event in events})
+        threads = [self._start_consumer(','.join(topics), self._on_event),
+                   self._start_consumer(self.routing_key_orders, self._on_order)]
+        emit = Emit_Events(config=self.config_brokermq)
+        rss_start = _rss()
+        # seconds of each event from the first one, publish_event changes the datetime of the events
+        offsets = [(event.datetime - events[0].datetime).total_seconds() for event in events]
+        start = time.perf_counter()
+        for event, offset in zip(events, offsets):
+            if self.speed > 0:  # wait the time of the event
+                delay = offset / self.speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            self._sent[(event.event_type, event.ticker)].append(time.perf_counter())
+            emit.publish_event(event.event_type, event)
+        published = time.perf_counter()
+        deadline = published + timeout
+        while self.received < len(events) and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)  # last orders
+        self._active = False
+        for thread in threads:
+            thread.join(1)
+        emit.close()
+        end = self._last_received or time.perf_counter()
+        rss_end = _rss()
+        return {'version': _version(), 'datetime': dt.datetime.utcnow().isoformat(), 'python': platform.python_version(),
+                'bus': self.config_brokermq['host'], 'speed': self.speed, 'events': len(events),
+                'received': self.received, 'orders': self.orders, 'seconds': end - start,
+                'events_per_second': self.received / (end - start) if end > start else None,
+                'publish_per_second': len(events) / (published - start) if published > start else None,
+                'stages': self.stats.summary(),
+                'memory': {'rss_start': rss_start, 'rss_end': rss_end, 'rss_growth': rss_end - rss_start}}
+
+
+def save_results(path: str, results: Dict) -> None:
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def compare_results(baseline: Dict, results: Dict, tolerance: float = 0.1) -> List[str]:
+    """ Regressions of results against baseline bigger than tolerance (0.1 = 10%)"""
+    regressions = []
+    if baseline.get('events_per_second') and results.get('events_per_second'):
+        change = results['events_per_second'] / baseline['events_per_second'] - 1
+        if change < -tolerance:
+            regressions.append(f'events_per_second {baseline["events_per_second"]:.0f} -> '
+                               f'{results["events_per_second"]:.0f} ({change:+.0%})')
+    for stage, summary in results['stages'].items():
+        base = baseline.get('stages', {}).get(stage)
+        if base is None:
+            continue
+        for key in ['p50', 'p99']:
+            if base.get(key) and summary.get(key):
+                change = summary[key] / base[key] - 1
+                if change > tolerance:
+                    regressions.append(f'{stage} {key} {base[key] * 1e6:.0f}us -> {summary[key] * 1e6:.0f}us '
+                                       f'({change:+.0%})')
+    return regressions
+
+
+def _portfolio(tickers: List[str], config_brokermq: Dict):
+    """ Portfolio of Simple_Avg_Cross by ticker sending the orders to the bus"""
+    from src.application.services.portfolio_constructor import Portfolio_Constructor
+    strategies = [{'id': i, 'strategy': 'Simple_Avg_Cross',
+                   'params': {'ticker': t, 'short_period': 5, 'long_period': 20, 'quantity': 1}}
+                  for i, t in enumerate(tickers)]
+    portfolio = Portfolio_Constructor({'Name': 'benchmark', 'Data_Sources': None, 'Strategies': strategies},
+                                      run_real=True, asset_type='financial', send_orders_to_broker=True,
+                                      config_brokermq=config_brokermq)
+    portfolio.in_real_time = True
+    return portfolio
+
+
+def main(args=None) -> Dict:
+    parser = argparse.ArgumentParser(description='Replay benchmark of the pipeline')
+    parser.add_argument('--bus', choices=['local', 'rabbitmq'], default='local')
+    parser.add_argument('--events', help='json lines file with the events recorded')
+    parser.add_argument('--synthetic', type=int, default=5000, help='bars by ticker without --events')
+    parser.add_argument('--tickers', default='EURUSD,GBPUSD,USDJPY')
+    parser.add_argument('--speed', type=float, default=0, help='1 real time, 10 ten times faster, 0 max')
+    parser.add_argument('--output', help='json file for the results')
+    parser.add_argument('--baseline', help='json file of previous results to compare')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args(args)
+    from src.application import conf
+    if args.bus == 'local':
+        from src.infrastructure.local_broker import LocalBroker
+        config_brokermq = {'host': 'local', 'port': None, 'user': None, 'password': None,
+                           'connection_factory': LocalBroker('local').connection}
+    else:
+        config_brokermq = {'host': conf.RABBITMQ_HOST, 'port': conf.RABBITMQ_PORT, 'user': conf.RABBITMQ_USER,
+                           'password': conf.RABBITMQ_PASSWORD}
+    tickers = args.tickers.split(',')
+    events = load_events(args.events) if args.events else synthetic_bars(tickers, args.synthetic)
+    trading_tickers = sorted({e.ticker for e in events if e.event_type in ['bar', 'tick']})
+    consumer = _portfolio(trading_tickers, config_brokermq)._callback_datafeed if trading_tickers else None
+    benchmark = PipelineBenchmark(config_brokermq, consumer=consumer, routing_key_orders=conf.ROUTING_KEY,
+                                  speed=args.speed)
+    results = benchmark.run(events)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        save_results(args.output, results)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(json.load(f), results, args.tolerance)
+        print('\n'.join(['Regressions:'] + regressions) if regressions else 'No regressions')
+        results['regressions'] = regressions
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+""" Microbenchmarks of the domain: strategies, equity, indicators, events and statistics"""
+import datetime as dt
+import random
+import pytest
+from src.application.benchmarks.pipeline_benchmark import synthetic_bars
+from src.domain.models.trading.bar import Bar
+from src.domain.services.equity_handler import Equity
+from src.domain.services.indicators.simple_average import Simple_Average
+from src.domain.services.strategies.simple_avg_cross import Simple_Avg_Cross
+
+SIZES = [100, 1000, 10000]
+ROUNDS = 5
+
+
+def _closes(n: int, seed: int = 1) -> list:
+    return [bar.close for bar in synthetic_bars(['EURUSD'], n, seed=seed)]
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_send_order(benchmark, n):
+    """ n orders of a strategy, alternating buy and sell, with the update of its equity"""
+    closes = _closes(n)
+    start = dt.datetime(2023, 1, 2)
+
+    def setup():
+        orders = []
+        strategy = Simple_Avg_Cross({'ticker': 'EURUSD', 'short_period': 5, 'long_period': 20, 'quantity': 1},
+                                    id_strategy=1, callback=orders.append)
+        return (strategy,), {}
+
+    def run(strategy):
+        for i, close in enumerate(closes):
+            strategy.send_order(ticker='EURUSD', price=close, quantity=1, action='buy' if i % 2 == 0 else 'sell',
+                                type='market', datetime=start + dt.timedelta(minutes=i))
+
+    benchmark.pedantic(run, setup=setup, rounds=ROUNDS)
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_equity_update(benchmark, n):
+    """ n updates of the equity with prices and changes of quantity, each one saved in the equity vector"""
+    start = dt.datetime(2023, 1, 2)
+    rnd = random.Random(1)
+    updates = [{'quantity': rnd.choice([0, 0, 0, 1, -1]), 'price': close, 'datetime': start + dt.timedelta(minutes=i)}
+               for i, close in enumerate(_closes(n))]
+
+    def setup():
+        return (Equity(ticker='EURUSD', asset_type='crypto', fees=0.0001, slippage=0.0001),), {}
+
+    def run(equity):
+        for update in updates:
+            equity.update(update)
+            equity.fill_equity_vector()
+
+    benchmark.pedantic(run, setup=setup, rounds=ROUNDS)
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_simple_average_add(benchmark, n):
+    closes = _closes(n)
+
+    def run():
+        average = Simple_Average(20)
+        average.set_initial_value(closes[0])
+        for close in closes:
+            average.add(close)
+        return average.get_value()
+
+    benchmark(run)
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_bar_json(benchmark, n):
+    """ Serialization and deserialization of n bars, as in each publish and reception of the bus"""
+    bars = synthetic_bars(['EURUSD'], n)
+
+    def run():
+        return [Bar.from_json(bar.to_json()) for bar in bars]
+
+    benchmark.pedantic(run, rounds=ROUNDS)
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_return_series_summary(benchmark, n):
+    """ Summary of n daily returns"""
+    import numpy as np
+    import pandas as pd
+    from src.domain.services.stats.return_series import from_returns
+    returns = pd.Series(np.random.default_rng(1).normal(0.0002, 0.01, n),
+                        index=pd.date_range('2000-01-03', periods=n, freq='D'))
+    series = from_returns(returns)
+
+    benchmark.pedantic(series.summary, rounds=ROUNDS)
@@ -0,0 +1,96 @@
+""" Microbenchmarks of the path of an event: reception from the bus, portfolio and processing of Betfair books"""
+import datetime as dt
+import os
+import tempfile
+from types import SimpleNamespace
+import pytest
+from src.application.benchmarks.pipeline_benchmark import synthetic_bars
+
+SIZES = [100, 1000, 10000]
+ROUNDS = 5
+TICKERS = ['EURUSD', 'GBPUSD', 'USDJPY']
+MARKETS = [10, 100, 1000]  # a list of market books has up to a few hundred markets
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_callback_recieved(benchmark, n):
+    """ n bars received from the bus, deserialization and datetime truncation included"""
+    from src.infrastructure.brokerMQ import CallBack_Handler
+    bodies = [bar.to_json() for bar in synthetic_bars(TICKERS, n // len(TICKERS))]
+    method = SimpleNamespace(routing_key='bar')
+    handler = CallBack_Handler(callback=lambda event: None)
+
+    def run():
+        for body in bodies:
+            handler.callback_recieved(None, method, None, body)
+
+    benchmark.pedantic(run, rounds=ROUNDS)
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_portfolio_callback_datafeed(benchmark, n):
+    """ n bars fed to a portfolio of one Simple_Avg_Cross by ticker"""
+    from src.application.services.portfolio_constructor import Portfolio_Constructor
+    bars = synthetic_bars(TICKERS, n // len(TICKERS))
+    strategies = [{'id': i, 'strategy': 'Simple_Avg_Cross',
+                   'params': {'ticker': t, 'short_period': 5, 'long_period': 20, 'quantity': 1}}
+                  for i, t in enumerate(TICKERS)]
+
+    def setup():
+        portfolio = Portfolio_Constructor({'Name': 'benchmark', 'Data_Sources': None, 'Strategies': strategies},
+                                          asset_type='financial')
+        return (portfolio,), {}
+
+    def run(portfolio):
+        for bar in bars:
+            portfolio._callback_datafeed(bar)
+
+    benchmark.pedantic(run, setup=setup, rounds=ROUNDS)
+
+
+def _betfair_markets(n: int, start: dt.datetime = dt.datetime(2023, 1, 2, 15)) -> tuple:
+    """ next_events and books of n markets of match odds with three runners and three levels of prices"""
+    next_events = {}
+    books = []
+    for i in range(n):
+        market_id = f'1.{200000000 + i}'
+        runners = [{'selectionId': 1000 + i * 3 + j, 'runnerName': name, 'sortPriority': j + 1}
+                   for j, name in enumerate([f'home {i}', f'away {i}', 'the draw'])]
+        next_events[market_id] = {'marketId': market_id, 'marketName': 'Match Odds', 'runners': runners,
+                                  'marketStartTime': (start + dt.timedelta(minutes=i)).isoformat() + 'Z',
+                                  'event': {'name': f'home {i} v away {i}'},
+                                  'competition': {'name': 'league', 'id': '1'}, 'eventType': {'id': '1'}}
+        books.append({'marketId': market_id, 'status': 'OPEN', 'inplay': False, 'totalMatched': 1000.0 + i,
+                      'lastMatchTime': (start - dt.timedelta(seconds=i)).isoformat() + 'Z',
+                      'numberOfActiveRunners': 3, 'numberOfWinners': 1,
+                      'runners': [{'selectionId': r['selectionId'], 'status': 'ACTIVE', 'lastPriceTraded': 2.0,
+                                   'totalMatched': 300.0,
+                                   'ex': {'availableToBack': [{'price': 2.0 - k * 0.02, 'size': 10.0 + k}
+                                                              for k in range(3)],
+                                          'availableToLay': [{'price': 2.02 + k * 0.02, 'size': 10.0 + k}
+                                                             for k in range(3)]}}
+                                  for r in runners]})
+    return next_events, books
+
+
+@pytest.mark.parametrize('n', MARKETS)
+def test_betfair_processing_data(benchmark, n):
+    """ Books of n markets (3 odds events by market) processed by the Betfair handler, without connection"""
+    pytest.importorskip('requests')
+    from src.infrastructure.betfair.actual_off import ActualOffStore
+    from src.infrastructure.betfair.betfair_handler import Trading
+    next_events, books = _betfair_markets(n)
+    odds = []
+
+    with tempfile.TemporaryDirectory() as folder:
+        def setup():
+            trading = Trading.__new__(Trading)  # without login
+            trading.next_events = next_events
+            trading.ultimo_datetime = {}
+            trading.data_actual_off = ActualOffStore(os.path.join(folder, 'actual_off.json'), background=False)
+            trading.callback_real_time = odds.append
+            odds.clear()
+            return (trading, books), {}
+
+        benchmark.pedantic(lambda trading, _books: trading.processing_data(_books), setup=setup, rounds=ROUNDS)
+    assert len(odds) == 3 * n
@@ -18,7 +18,8 @@ class BrokerBetfair(object):
         self.config_brokermq = config_brokermq
         self.config_broker = {'USERNAME_BETFAIR': conf.USERNAME_BETFAIR, 'PASSWORD_BETFAIR': conf.PASSWORD_BETFAIR,
                               'APP_KEYS_BETFAIR': conf.APP_KEYS_BETFAIR}
-        self.trading = Trading(config_broker= self.config_broker)
+        self.trading = Trading(config_broker=self.config_broker, send_orders_status=True,
+                               config_brokermq=self.config_brokermq)
         self.health_handler = Health_Handler(n_check=6,
                                              name_service='broker_betfair',
                                              config=self.config_brokermq)
@@ -32,7 +33,7 @@ class BrokerBetfair(object):
         """
         if bet.event_type == 'bet':
             logger.info(f'Send Bet to broker in: {bet.match_name}')
-            self.trading.send_order(bet)
+            self.trading.queue_order(bet)
 
     def check_balance(self) -> None:
         try:
@@ -8,7 +8,7 @@ from typing import Dict
 from src.infrastructure.betfair.betfair_handler import Trading
 from src.application.services.health_handler import Health_Handler
 from src.infrastructure.brokerMQ import Emit_Events
-from src.infrastructure.betfair.betfair_handler import get_realtime_data
+from src.infrastructure.betfair.betfair_handler import get_realtime_data, get_realtime_data_stream
 
 
 class ProviderBetfair(object):
@@ -31,6 +31,7 @@ class ProviderBetfair(object):
             'time_books_play': 5,
             'time_books_not_play': 10,
             'time_events': 1800,
+            'stream': True,  # Exchange Stream API, False for polling the market books
             'min_total_matched': 0,
             'minutes': 60,
             'event_ids': [1],
@@ -46,4 +47,7 @@ class ProviderBetfair(object):
 
     def get_realtime_data(self) -> None:
         logger.info('Getting real data from Betfair')
-        get_realtime_data(self.settings, callback=self.save_odds, config_broker=self.config_broker)
\ No newline at end of file
+        if self.settings['stream']:
+            get_realtime_data_stream(self.settings, callback=self.save_odds, config_broker=self.config_broker)
+        else:
+            get_realtime_data(self.settings, callback=self.save_odds, config_broker=self.config_broker)
\ No newline at end of file
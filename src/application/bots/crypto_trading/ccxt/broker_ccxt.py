@@ -5,6 +5,9 @@ from src.application import conf
 import datetime as dt
 from src.infrastructure.crypto.exchange_handler import Trading
 from src.application.services.health_handler import Health_Handler
+from src.domain.services.order_netting import OrderNetting
+from src.domain.models.balance import Balance
+from src.infrastructure.brokerMQ import Emit_Events
 
 class BrokerCCXT(object):
     """
@@ -21,14 +24,25 @@ class BrokerCCXT(object):
         self.health_handler = Health_Handler(n_check=6,
                                              name_service=f'broker_{exchange_or_broker}',
                                              config=config_brokermq)
+        self.emit = Emit_Events(config=config_brokermq)
         # Launch thead for update orders status
         self.trading.start_update_orders_status()
+        # net the market orders of the same bar, the status of the net order is allocated to each strategy
+        self.netting = None
+        if conf.NETTING_ORDERS and self.trading.emit_orders is not None:
+            self.netting = OrderNetting(send_order=self.trading.send_order,
+                                        publish_event=self.trading.emit_orders.publish_event,
+                                        window_seconds=conf.NETTING_WINDOW_SECONDS)
+            self.trading.emit_orders = self.netting
 
     def check_balance(self) -> None:
         try:
             balance = self.trading.get_total_balance()
             logger.info(f'Balance {balance} {dt.datetime.utcnow()} in broker {self.exchange}')
             print(f'Balance {balance} {dt.datetime.utcnow()}')
+            # published for the telegram bot and for saving in the database
+            self.emit.publish_event('balance', Balance(datetime=dt.datetime.utcnow(), balance=balance,
+                                                       account=self.exchange))
             self.health_handler.check()
         except Exception as e:
             logger.error(f'Error Getting {self.exchange} Balance: {e}')
@@ -44,7 +58,10 @@ class BrokerCCXT(object):
         if event.event_type == 'order' and conf.SEND_ORDERS_BROKER == 1:
             event.exchange_or_broker = self.exchange
             logger.info(f'Sending Order to broker {self.exchange} in ticker {event.ticker} quantity {event.quantity}')
-            self.trading.send_order(event)
+            if self.netting is not None:
+                self.netting.add(event)
+            else:
+                self.trading.send_order(event)
         elif event.event_type == 'order' and conf.SEND_ORDERS_BROKER == 0:
             event.exchange_or_broker = self.exchange
             print(f'Order for {event.ticker} recieved but not send.')
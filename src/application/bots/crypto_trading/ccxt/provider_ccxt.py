@@ -7,6 +7,7 @@ from src.application.services.health_handler import Health_Handler
 import pytz
 from src.application.base_logger import logger
 from src.infrastructure.crypto.exchange_handler import Trading
+from src.domain.services.bar_aggregator import BarAggregator, timeframe_seconds
 from typing import Dict
 
 
@@ -17,19 +18,29 @@ class ProviderCCXT(object):
 
     """
 
-    def __init__(self, config_brokermq: Dict = {}, symbols=['EURUSD'], exchange_or_broker='darwinex'):
+    def __init__(self, config_brokermq: Dict = {}, symbols=['EURUSD'], exchange_or_broker='darwinex',
+                 timeframes=['1m']):
         self.config_brokermq = config_brokermq
+        self.exchange_or_broker = exchange_or_broker
         self.trading = Trading(exchange_or_broker=exchange_or_broker, config_brokermq=config_brokermq)
         self.health_handler = Health_Handler(n_check=10,
                                              name_service=f'Provider {exchange_or_broker}',
                                              config=config_brokermq)
         self.emit = Emit_Events(config=config_brokermq)
         self.last_bar = {s: None for s in symbols}
+        self.last_bars = {}  # key: (symbol, interval), value: last Bar published
         self.save_data = {symbol: [] for symbol in symbols}
         self.symbols = symbols
+        # websocket mode, bars are built with the trades
+        self.timeframes = timeframes
+        self.bar_aggregator = None
+        self.stream = None
+        self._next_close = None
 
     def create_tick_closed_day(self):
         for t in self.last_bar.values():
+            if t is None:
+                continue
             tick = Tick(event_type='tick', tick_type='close_day', price=t.close,
                         ticker=t.ticker, datetime=t.datetime)
             print(f'tick close_day {tick.ticker} {tick.datetime} {tick.price}')
@@ -38,8 +49,8 @@ class ProviderCCXT(object):
 
     """ Create thread for bar event """
     def create_bar(self, interval: str = '1m', verbose: bool = True):
-        bars_info = self.trading.get_historical_data(timeframe=interval, symbols=self.symbols, limit=2)
-        for b in bars_info:
+        # bars are published as soon as each symbol is received
+        for b in self.trading.get_last_bars(timeframe=interval, symbols=self.symbols):
             symbol = b['symbol']
             exchange = b['exchange']
             ohlc = b['candle']
@@ -55,3 +66,75 @@ class ProviderCCXT(object):
             self.emit.publish_event('bar', bar)
             self.last_bar[symbol] = bar
             self.health_handler.check()
+
+    def get_stream_quotes_changes(self, verbose: bool = False):
+        """ Websocket mode: publish a Tick with the last trade of every message and the Bars built with the trades.
+        Bars missed while the connection is lost are back filled with REST"""
+        from src.infrastructure.crypto.stream import TradeStream, get_adapter
+        self.bar_aggregator = BarAggregator(timeframes=self.timeframes, symbols=self.symbols)
+        self._next_close = self._next_boundary(dt.datetime.utcnow().timestamp())
+        adapter = get_adapter(self.exchange_or_broker, self.symbols, client=self.trading.client)
+        self.stream = TradeStream(adapter, on_trades=lambda trades: self._on_trades(trades, verbose),
+                                  on_idle=lambda: self._close_bars(verbose), on_reconnect=self._back_fill)
+        self.stream.run()
+
+    def _next_boundary(self, now: float) -> float:
+        seconds = min(timeframe_seconds(t) for t in self.timeframes)
+        return now - now % seconds + seconds
+
+    def _on_trades(self, trades: list, verbose: bool = False):
+        last = {}
+        for symbol, timestamp, price, amount in trades:
+            self.bar_aggregator.add_tick(symbol, timestamp, price, price, amount)
+            last[symbol] = (timestamp, price)
+        for symbol, (timestamp, price) in last.items():
+            tick = Tick(event_type='tick', tick_type='trade', price=price, ticker=symbol,
+                        datetime=dt.datetime.fromtimestamp(timestamp, tz=pytz.UTC))
+            if verbose:
+                print(f'tick {tick.ticker} {tick.datetime} {tick.price}')
+            self.emit.publish_event('tick', tick)
+        self._close_bars(verbose)
+
+    def _close_bars(self, verbose: bool = False):
+        """ Publish the bars closed when the period has finished"""
+        now = dt.datetime.utcnow().timestamp()
+        if now < self._next_close:
+            return
+        self._next_close = self._next_boundary(now)
+        for b in self.bar_aggregator.close(now):
+            self._publish_bar(b['symbol'], b['datetime'], b['timeframe'], b['open'], b['high'], b['low'],
+                              b['close'], b['volume'], verbose)
+
+    def _publish_bar(self, symbol, dtime, interval, _open, high, low, close, volume, verbose=True):
+        bar = Bar(ticker=symbol, datetime=dtime, dtime_zone='UTC',
+                  open=_open, high=high, low=low, close=close,
+                  volume=volume, exchange=self.trading.client.id, provider=self.trading.client.id, freq=interval)
+        if verbose:
+            print(f'bar {bar.ticker} {bar.datetime} {bar.close}')
+        self.emit.publish_event('bar', bar)
+        if interval == self.timeframes[0]:
+            self.last_bar[symbol] = bar
+        self.last_bars[(symbol, interval)] = bar
+        self.health_handler.check()
+
+    def _back_fill(self):
+        """ Publish with REST the bars closed while the websocket was disconnected"""
+        now_ms = dt.datetime.utcnow().timestamp() * 1000
+        for symbol in self.symbols:
+            for interval in self.timeframes:
+                last = self.last_bars.get((symbol, interval))  # each interval from its own last bar
+                if last is None:
+                    continue
+                period_ms = timeframe_seconds(interval) * 1000
+                since = int(last.datetime.timestamp() * 1000) + period_ms
+                try:
+                    candles = self.trading.client.fetch_ohlcv(symbol, interval, since)
+                except Exception as e:
+                    logger.error(f'Error back filling {symbol} {interval}: {e}')
+                    continue
+                candles = [c for c in candles if c[0] >= since and c[0] + period_ms <= now_ms]  # closed bars
+                for c in candles:
+                    dtime = dt.datetime.fromtimestamp(c[0] / 1000, tz=pytz.UTC)
+                    self._publish_bar(symbol, dtime, interval, c[1], c[2], c[3], c[4], c[5])
+                if len(candles) > 0:
+                    self.bar_aggregator.seed(symbol, interval, candles[-1][0] / 1000, candles[-1][4])
@@ -17,8 +17,9 @@ def main():
         provider.create_tick_closed_day()
 
     def schedule_broker():
-        # create scheduler for bar event
-        schedule.every().minute.at(":00").do(create_bar)
+        # create scheduler for bar event, in stream mode the bars are created with the trades
+        if not conf.STREAM_CRYPTO:
+            schedule.every().minute.at(":00").do(create_bar)
         # create scheduler for close_day event
         schedule.every().day.at("00:00").do(create_tick_closed_day)
         while True:
@@ -36,6 +37,8 @@ def main():
                               exchange_or_broker=conf.BROKER_CRYPTO)
     x = threading.Thread(target=schedule_broker)
     x.start()
+    if conf.STREAM_CRYPTO:
+        provider.get_stream_quotes_changes()
 
 
 if __name__ == '__main__':
@@ -6,8 +6,11 @@ import dataclasses
 def main(_name_library='events_keeper') -> None:
     import time
     time.sleep(10) # wait until MQ and Database are running
+    import signal
+    import sys
     from src.infrastructure.brokerMQ import receive_events
     from src.infrastructure.database_handler import Universe
+    from src.infrastructure.events_sink import EventSink, get_events_collection
     import datetime as dt
     from src.application import conf
 
@@ -34,6 +37,9 @@ def main(_name_library='events_keeper') -> None:
         """Callback for saving events to DataBase"""
         if event.event_type != 'timer':
             saved_variable['events'] += 1
+            sink.put(event)
+            if not conf.EVENT_KEEPER_ARCTIC:
+                return
             ticker = event.ticker
             unique = get_unique(event)
             # check if a string is in ASCII
@@ -53,12 +59,16 @@ def main(_name_library='events_keeper') -> None:
 
     # variable
     saved_variable = {'events': 0}
-    # Create connection  to DataBase
-    store = Universe(host=conf.MONGO_HOST, port=conf.MONGO_PORT)
-    # Create library for saving events
-    name = f'{_name_library}_{dt.datetime.utcnow().strftime("%Y%m%d")}'
-    saved_variable['lib'] = store.get_library(name, library_chunk_store=False)
-    saved_variable['name'] = name
+    # events in batches to the collection of events, flushed at exit
+    sink = EventSink(get_events_collection(host=conf.MONGO_HOST, port=conf.MONGO_PORT))
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if conf.EVENT_KEEPER_ARCTIC:
+        # Create connection  to DataBase
+        store = Universe(host=conf.MONGO_HOST, port=conf.MONGO_PORT)
+        # Create library for saving events
+        name = f'{_name_library}_{dt.datetime.utcnow().strftime("%Y%m%d")}'
+        saved_variable['lib'] = store.get_library(name, library_chunk_store=False)
+        saved_variable['name'] = name
 
     # Connect to brokerMQ for receiving events
     config_brokermq = {'host': conf.RABBITMQ_HOST, 'port': conf.RABBITMQ_PORT, 'user': conf.RABBITMQ_USER,
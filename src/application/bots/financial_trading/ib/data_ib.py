@@ -3,6 +3,7 @@ import pandas as pd
 from src.domain.models.trading.bar import Bar
 from src.domain.models.trading.tick import Tick
 from src.domain.models.trading.timer import Timer
+from src.domain.services.bar_aggregator import BarAggregator
 from src.infrastructure.brokerMQ import Emit_Events
 from src.application.services.health_handler import Health_Handler
 import pytz
@@ -19,7 +20,8 @@ class ProviderIB(object):
 
     """
 
-    def __init__(self, config_brokermq: Dict = {}, symbols=['EURUSD'], exchange_or_broker='ib'):
+    def __init__(self, config_brokermq: Dict = {}, symbols=['EURUSD'], exchange_or_broker='ib',
+                 timeframes=['1min']):
         self.config_brokermq = config_brokermq
         self.config_broker = {'HOST_IB': conf.HOST_IB, 'PORT_IB': int(conf.PORT_IB), 'CLIENT_IB': int(conf.CLIENT_IB_PROVIDER)}
         path_ticker = os.path.join(conf.path_to_principal, 'ticker_info_ib.csv')
@@ -30,12 +32,14 @@ class ProviderIB(object):
                                              config=self.config_brokermq)
         self.emit = Emit_Events(config=config_brokermq)
         self.last_bar = {s: None for s in symbols}
-        self.save_data = {symbol: [] for symbol in symbols}
         self.symbols = symbols
+        # bars are updated with every tick and closed by create_bar
+        self.bar_aggregator = BarAggregator(timeframes=timeframes, symbols=symbols)
+        self.bar_aggregator_timeframe = timeframes[0]  # timeframe of last_bar
         self.ticker_info = pd.read_csv(path_ticker, encoding="utf-8", sep=",")
 
     def save_tick_data(self, tickers) -> None:
-        """ Save tick data in dictionary """
+        """ Update the bars with the ticks """
         for ticker in tickers:
             info_contract = ticker.contract.dict()
             info_contract_month = info_contract['lastTradeDateOrContractMonth']
@@ -50,10 +54,15 @@ class ProviderIB(object):
                     symbol = local_symbol.replace('.','')
                 else:
                     symbol = info_contract['localSymbol']
-            self.save_data[symbol].append(ticker.dict())
+            bid, ask = float(ticker.bid), float(ticker.ask)
+            if ticker.time is None or bid != bid or ask != ask:  # without time or nan prices
+                continue
+            self.bar_aggregator.add_tick(symbol, ticker.time.timestamp(), bid, ask)
 
     def create_tick_closed_day(self):
         for t in self.last_bar.values():
+            if t is None:  # no ticks of this symbol yet
+                continue
             tick = Tick(event_type='tick', tick_type='close_day', price=t.close,
                         ticker=t.ticker, datetime=t.datetime)
             print(f'tick close_day {tick.ticker} {tick.datetime} {tick.price}')
@@ -62,36 +71,20 @@ class ProviderIB(object):
     """ Create thread for bar event """
 
     def create_bar(self, interval: str = '1min', verbose: bool = True):
-        for symbol in self.save_data.keys():
-            try:
-                data = pd.DataFrame(self.save_data[symbol])
-                data['Bid'] = data['bid'].astype(float)
-                data['Ask'] = data['ask'].astype(float)
-                data['price'] = (data['Bid'] + data['Ask']) / 2
-            except Exception as e:
-                data = []
-                logger.error(f'* Error converting data to Dataframe: {e}')
-            finally:
-                self.save_data[symbol] = []  # clear data
-            if len(data) > 0:
-                data.index = pd.to_datetime(data['time'], format='%Y-%m-%d %H:%M:%S.%f')
-                ohlc = data['price'].astype(float).resample(interval).ohlc()
-                # there are two bars and 2 dates
-                if len(ohlc) > 1:
-                    ohlc = ohlc[ohlc.index == ohlc.index.min()]
+        """ Publish the bars closed, interval is kept for compatibility, the timeframes are set in __init__"""
+        now = dt.datetime.utcnow().replace(tzinfo=pytz.UTC).timestamp()
+        for b in self.bar_aggregator.close(now):
+            bar = Bar(ticker=b['symbol'], datetime=b['datetime'], dtime_zone='UTC',
+                      open=b['open'], bid=b['bid'], ask=b['ask'],
+                      high=b['high'], low=b['low'], close=b['close'],
+                      volume=b['volume'], exchange='ib', provider='ib', freq=b['timeframe'])
 
-                ohlc['volume'] = float(0)
-                dtime = dt.datetime(ohlc.index[0].year, ohlc.index[0].month, ohlc.index[0].day,
-                                    ohlc.index[0].hour, ohlc.index[0].minute, ohlc.index[0].second, 0, pytz.UTC)
-                bar = Bar(ticker=symbol, datetime=dtime, dtime_zone='UTC',
-                          open=ohlc.open[0], bid=data['Bid'].values[-1], ask=data['Ask'].values[-1],
-                          high=ohlc.high[0], low=ohlc.low[0], close=ohlc.close[0],
-                          volume=ohlc.volume[0], exchange='ib', provider='ib', freq=interval)
-
-                if verbose:
-                    print(f'bar {bar.ticker} {bar.datetime} {bar.close}')
-                self.emit.publish_event('bar', bar)
-                self.last_bar[symbol] = bar
+            if verbose:
+                print(f'bar {bar.ticker} {bar.datetime} {bar.close}')
+            self.emit.publish_event('bar', bar)
+            if b['timeframe'] == self.bar_aggregator_timeframe:
+                self.last_bar[bar.ticker] = bar
+            if b['ticks'] > 0:
                 self.health_handler.check()
 
     def create_timer(self):
@@ -38,6 +38,10 @@ class BrokerMT4(object):
         self.lib_balance = store.get_library(name, library_chunk_store=False)
         # Launch thead for update orders status
         self.trading.start_update_orders_status()
+        # no netting in MT4: an order is split in close_trade, close_partial and normal legs that report their
+        # own fills, and OrderNetting needs the cumulative fills of the net order to allocate them
+        if conf.NETTING_ORDERS:
+            logger.warning('NETTING_ORDERS is not supported by the MT4 broker, the orders are sent one by one')
 
     def check_balance(self) -> None:
         try:
@@ -116,44 +120,47 @@ class BrokerMT4(object):
         """
         if event.event_type == 'order' and conf.SEND_ORDERS_BROKER_MT4 == 1:
             event.exchange_or_broker = f'mt4_{conf.BROKER_FINANCIAL}'
-            qtypes = {'buy': 1, 'sell': 0}  # the opposite position to the order
-            symbol = event.ticker
-            quantity = event.quantity
-            open_trades = self.trading.get_trades()
-            if open_trades is not None:
-                trades_id = list(open_trades.keys())
-                # Loop every trade
-                for trade_id in trades_id:
-                    trade = open_trades[trade_id]
-                    # same symbol
-                    if symbol == trade['_symbol']:
-                        if trade['_type'] == qtypes[event.action]:
-                            if quantity != 0:
-                                if quantity > trade['_lots'] or quantity == trade['_lots']:
-                                    # Close trade
-                                    event.action_mt4 = 'close_trade'
-                                    event.order_id_receiver = trade_id
-                                    logger.info(
-                                        f'Sending Order to close positions in ticker: {event.ticker} quantity: {event.quantity}')
-                                    self.trading.send_order(event)
-                                    quantity -= trade['_lots']
-                                else:
-                                    # Partially closed trade
-                                    event.action_mt4 = 'close_partial'
-                                    event.order_id_receiver = trade_id
-                                    event.quantity = quantity
-                                    logger.info(
-                                        f'Sending Order to close partial positions in ticker: {event.ticker} quantity: {event.quantity}')
-                                    self.trading.send_order(event)
-                                    quantity = 0
-                if quantity != 0:
-                    # send a normal order
-                    logger.info(f'Sending Order to MT4 in ticker: {event.ticker} quantity: {event.quantity}')
-                    event.quantity = quantity
-                    event.action_mt4 = 'normal'
-                    self.trading.send_order(event)
+            self._send_order(event)
 
         elif event.event_type == 'order' and conf.SEND_ORDERS_BROKER_MT4 == 0:
             event.exchange_or_broker = f'mt4_{conf.BROKER_FINANCIAL}'
             print(f'Order for {event.ticker} recieved but not send.')
 
+    def _send_order(self, event) -> None:
+        """ Close the opposite trades of the symbol and send the rest as a normal order"""
+        qtypes = {'buy': 1, 'sell': 0}  # the opposite position to the order
+        symbol = event.ticker
+        quantity = event.quantity
+        open_trades = self.trading.get_trades()
+        if open_trades is not None:
+            trades_id = list(open_trades.keys())
+            # Loop every trade
+            for trade_id in trades_id:
+                trade = open_trades[trade_id]
+                # same symbol
+                if symbol == trade['_symbol']:
+                    if trade['_type'] == qtypes[event.action]:
+                        if quantity != 0:
+                            if quantity > trade['_lots'] or quantity == trade['_lots']:
+                                # Close trade
+                                event.action_mt4 = 'close_trade'
+                                event.order_id_receiver = trade_id
+                                logger.info(
+                                    f'Sending Order to close positions in ticker: {event.ticker} quantity: {event.quantity}')
+                                self.trading.send_order(event)
+                                quantity -= trade['_lots']
+                            else:
+                                # Partially closed trade
+                                event.action_mt4 = 'close_partial'
+                                event.order_id_receiver = trade_id
+                                event.quantity = quantity
+                                logger.info(
+                                    f'Sending Order to close partial positions in ticker: {event.ticker} quantity: {event.quantity}')
+                                self.trading.send_order(event)
+                                quantity = 0
+            if quantity != 0:
+                # send a normal order
+                logger.info(f'Sending Order to MT4 in ticker: {event.ticker} quantity: {event.quantity}')
+                event.quantity = quantity
+                event.action_mt4 = 'normal'
+                self.trading.send_order(event)
@@ -1,8 +1,8 @@
 import datetime as dt
-import pandas as pd
 from src.domain.models.trading.bar import Bar
 from src.domain.models.trading.tick import Tick
 from src.domain.models.trading.timer import Timer
+from src.domain.services.bar_aggregator import BarAggregator
 from src.infrastructure.brokerMQ import Emit_Events
 from src.application.services.health_handler import Health_Handler
 import pytz
@@ -19,7 +19,8 @@ class ProviderMT4(object):
 
     """
 
-    def __init__(self, config_brokermq: Dict = {}, symbols=['EURUSD'], exchange_or_broker='darwinex'):
+    def __init__(self, config_brokermq: Dict = {}, symbols=['EURUSD'], exchange_or_broker='darwinex',
+                 timeframes=['1min']):
         self.config_brokermq = config_brokermq
         self.config_broker = {'MT4_HOST': conf.MT4_HOST, 'CLIENT_IF': conf.CLIENT_IF, 'PUSH_PORT': conf.PUSH_PORT,
                               'PULL_PORT_PROVIDER': conf.PULL_PORT_PROVIDER,
@@ -31,15 +32,20 @@ class ProviderMT4(object):
                                              config=self.config_brokermq)
         self.emit = Emit_Events(config=config_brokermq)
         self.last_bar = {s: None for s in symbols}
-        self.save_data = {symbol: [] for symbol in symbols}
         self.symbols = symbols
+        # bars are updated with every tick and closed by create_bar
+        self.bar_aggregator = BarAggregator(timeframes=timeframes, symbols=symbols)
+        self.bar_aggregator_timeframe = timeframes[0]  # timeframe of last_bar
 
     def save_tick_data(self, msg=dict) -> None:
-        """ Save tick data in dictionary """
-        self.save_data[msg['Symbol']].append(msg)
+        """ Update the bars with the tick, Time is UTC"""
+        timestamp = dt.datetime.fromisoformat(msg['Time']).replace(tzinfo=pytz.UTC).timestamp()
+        self.bar_aggregator.add_tick(msg['Symbol'], timestamp, float(msg['Bid']), float(msg['Ask']))
 
     def create_tick_closed_day(self):
         for t in self.last_bar.values():
+            if t is None:  # no ticks of this symbol yet
+                continue
             tick = Tick(event_type='tick', tick_type='close_day', price=t.close,
                         ticker=t.ticker, datetime=t.datetime)
             print(f'tick close_day {tick.ticker} {tick.datetime} {tick.price}')
@@ -48,36 +54,20 @@ class ProviderMT4(object):
     """ Create thread for bar event """
 
     def create_bar(self, interval: str = '1min', verbose: bool = True):
-        for symbol in self.save_data.keys():
-            try:
-                data = pd.DataFrame(self.save_data[symbol])
-                data['Bid'] = data['Bid'].astype(float)
-                data['Ask'] = data['Ask'].astype(float)
-                data['price'] = (data['Bid'] + data['Ask']) / 2
-            except Exception as e:
-                data = []
-                logger.error(f'* Error converting data to Dataframe: {e}')
-            finally:
-                self.save_data[symbol] = []  # clear data
-            if len(data) > 0:
-                data.index = pd.to_datetime(data['Time'], format='%Y-%m-%d %H:%M:%S.%f')
-                ohlc = data['price'].astype(float).resample(interval).ohlc()
-                # there are two bars and 2 dates
-                if len(ohlc) > 1:
-                    ohlc = ohlc[ohlc.index == ohlc.index.min()]
+        """ Publish the bars closed, interval is kept for compatibility, the timeframes are set in __init__"""
+        now = dt.datetime.utcnow().replace(tzinfo=pytz.UTC).timestamp()
+        for b in self.bar_aggregator.close(now):
+            bar = Bar(ticker=b['symbol'], datetime=b['datetime'], dtime_zone='UTC',
+                      open=b['open'], bid=b['bid'], ask=b['ask'],
+                      high=b['high'], low=b['low'], close=b['close'],
+                      volume=b['volume'], exchange='mt4', provider='mt4', freq=b['timeframe'])
 
-                ohlc['volume'] = float(0)
-                dtime = dt.datetime(ohlc.index[0].year, ohlc.index[0].month, ohlc.index[0].day,
-                                    ohlc.index[0].hour, ohlc.index[0].minute, ohlc.index[0].second, 0, pytz.UTC)
-                bar = Bar(ticker=symbol, datetime=dtime, dtime_zone='UTC',
-                          open=ohlc.open[0], bid=data['Bid'].values[-1], ask=data['Ask'].values[-1],
-                          high=ohlc.high[0], low=ohlc.low[0], close=ohlc.close[0],
-                          volume=ohlc.volume[0], exchange='mt4', provider='mt4', freq=interval)
-
-                if verbose:
-                    print(f'bar {bar.ticker} {bar.datetime} {bar.close}')
-                self.emit.publish_event('bar', bar)
-                self.last_bar[symbol] = bar
+            if verbose:
+                print(f'bar {bar.ticker} {bar.datetime} {bar.close}')
+            self.emit.publish_event('bar', bar)
+            if b['timeframe'] == self.bar_aggregator_timeframe:
+                self.last_bar[bar.ticker] = bar
+            if b['ticks'] > 0:
                 self.health_handler.check()
 
     def create_timer(self):
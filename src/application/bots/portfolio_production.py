@@ -14,37 +14,26 @@
     to produce orders that will send to trading.
     """
 import datetime as dt
-from src.application import conf
+
 
 def main(run_real: bool = False, send_orders_to_broker: bool = True,
          start_date: dt.datetime = dt.datetime(2022, 7, 1),conf_portfolio: str=None ,
-         asset_type: str=None) -> None:
+         asset_type: str=None, profiler=None, perf_stats: bool = False) -> None:
     """ Run the portfolio engine. """
-    from src.domain.config_helper import get_config
+    from src.domain.config_helper import get_config, get_strategies_from_csv
     import os
-    import pandas as pd
+    from src.application import conf
     from src.application.services.portfolio_constructor import Portfolio_Constructor
     path = os.path.abspath(__file__)
     path_bot = os.path.dirname(path)  # path to the module
     path_to_config = os.path.join(conf.path_modulo, "application", "config_portfolios", conf_portfolio+".yaml")
     conf_portfolio = get_config(path_to_config)  # get the configuration from the config file
     # if our strategy is in a csv file
-    list_strategy = []
     if conf_portfolio['Strategies_Load_From']['from']:
         # load strategy from csv
         path_info_strategy = os.path.join(path_bot, f'{asset_type}_trading', conf_portfolio['Strategies_Load_From']['from'])
-        info_strategy = pd.read_csv(path_info_strategy)
-        for index, strategy in info_strategy.iterrows():
-            dict_strategy = {'params': {}}
-            for k in strategy.keys():
-                if k == 'id':
-                    dict_strategy['id'] = strategy[k]
-                elif k == 'name':
-                    dict_strategy['strategy'] = strategy[k]
-                else:
-                    dict_strategy['params'][k] = strategy[k]
-            list_strategy.append(dict_strategy)
-        conf_portfolio['Strategies'] = list_strategy
+        conf_portfolio['Strategies'] = get_strategies_from_csv(path_info_strategy)
+        path_to_config = None  # the strategies are not in the config file, they are reloaded only by petition
 
     # run the portfolio engine, set run_real=True to run in real time
     routing_key = 'bar,petition,timer,webhook'
@@ -52,14 +41,30 @@ def main(run_real: bool = False, send_orders_to_broker: bool = True,
         routing_key = 'petition,webhook'
     portfolio_production = Portfolio_Constructor(conf_portfolio, run_real=run_real, asset_type=asset_type,
                                                  send_orders_to_broker=send_orders_to_broker, start_date=start_date,
-                                                 routing_key=routing_key)
+                                                 routing_key=routing_key, path_to_config=path_to_config,
+                                                 perf_stats=perf_stats)
+    if profiler is not None:  # time until the portfolio is ready for the events
+        profiler.stop()
+        print('\n'.join(profiler.report()))
     portfolio_production.run()
 
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Portfolio Production Bot')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='report the import time of each module when the portfolio is built')
+    parser.add_argument('--perf-stats', action='store_true',
+                        help='measure the time of each strategy by event, published with the health events')
+    args = parser.parse_args()
+    profiler = None
+    if args.profile_startup:  # started before conf, its import loads dotenv
+        from src.application.services.startup_profile import ImportProfiler
+        profiler = ImportProfiler().start()
+    from src.application import conf
     run_real = False
     asset_type = conf.ASSET_TYPE
     conf_portfolio = conf.CONF_PORTFOLIO
     start_date = dt.datetime(2022, 1, 1)
     main(run_real=run_real, send_orders_to_broker=True, start_date=start_date,
-         conf_portfolio=conf_portfolio,asset_type=asset_type)
+         conf_portfolio=conf_portfolio,asset_type=asset_type, profiler=profiler, perf_stats=args.perf_stats)
@@ -10,6 +10,8 @@ from telegram import ReplyKeyboardMarkup, ParseMode
 from telegram.error import NetworkError, TelegramError
 import schedule
 from src.infrastructure.database_handler import Universe
+from src.infrastructure.events_sink import get_events_collection
+from src.infrastructure.events_query import EventsQuery
 from src.infrastructure.brokerMQ import Emit_Events
 from src.domain.models.trading.petition import Petition
 from tabulate import tabulate
@@ -163,7 +165,12 @@ def balance(update, context):
     """
     try:
         if trading_type == 'crypto':
-            current_balance = round(trading.get_total_balance('usd'), 2)
+            # last balance published by the broker, the exchange is asked if there is not any
+            last_balance = events.last('balance', account=conf.BROKER_CRYPTO)
+            if last_balance is not None:
+                current_balance = round(last_balance['balance'], 2)
+            else:
+                current_balance = round(trading.get_total_balance('usd'), 2)
         elif trading_type == 'betting':
             current_balance = trading.get_account_funds()['availableToBetBalance']
         msg = '*Current Balance:*  ' + str(current_balance) + '\n'
@@ -205,9 +212,8 @@ def positions(update, context):
                 agregate[t] = round(agregate[t], 2)
 
             # Get real positions
-            lib_keeper = store.get_library(name_library)
-            data = lib_keeper.read(symbol_positions).data
-            broker_pos = data.positions
+            data = events.last('positions', account=symbol_positions)
+            broker_pos = data['positions']
             if conf.BROKER_FINANCIAL == 'ib':
                 broker_pos = broker_pos[account]
             trades = []
@@ -263,15 +269,17 @@ def _get_status(seconds=300):
     Send health
     """
     try:
-        lib_keeper = store.get_library(name_library)
         _health = {}
         _now = dt.datetime.utcnow()
         for service_name in list_services:
             # check if the service is running
-            data = lib_keeper.read(service_name).data
             pn = service_name.replace('_health', '')
-            _dtime = data.datetime
-            state = data.state
+            data = events.last('health', ticker=pn)
+            if data is None:
+                _health[pn] = {'last': None, 'state': 0}
+                continue
+            _dtime = data['datetime']
+            state = data['state']
             if _now >= _dtime:
                 df_time = _now - _dtime
             else:
@@ -291,28 +299,23 @@ def prices(update, context):
     Send Price
     """
     try:
-        lib_keeper = store.get_library(name_library)
         now = dt.datetime.utcnow()
-        initial_time = now.strftime("%Y-%m-%d 00:00:00")
+        initial_time = dt.datetime(now.year, now.month, now.day)
 
         prices = []
         # Get price for each symbols
         for s in symbols:
-            initial_price_symbol = f'{s}_{initial_time}_bar'
-            initial_price_data = lib_keeper.read(initial_price_symbol).data
-            initial_price = initial_price_data.close
-            _range = range(0, 4, 1)
-            # Check If the symbol exist
-            for minute in _range:
-                _now = now - dt.timedelta(minutes=minute)
-                current_time = _now.strftime("%Y-%m-%d %H:%M:00")
-                current_price_symbol = f'{s}_{current_time}_bar'
-                if lib_keeper.has_symbol(current_price_symbol):
-                    break
+            initial_bars = events.find_documents('bar', ticker=s, start=initial_time,
+                                                 end=initial_time + dt.timedelta(minutes=1))
             # get current price
-            current_price_data = lib_keeper.read(current_price_symbol).data
-            current_price = current_price_data.close
-            perc = round((current_price - initial_price) / initial_price * 100, 2)
+            last_bar = events.last('bar', ticker=s)
+            if last_bar is None:  # no bars of the symbol
+                continue
+            current_price = last_bar['close']
+            perc = None  # without bar at 00:00 there is no change of the day
+            if len(initial_bars) > 0:
+                initial_price = initial_bars[0]['close']
+                perc = round((current_price - initial_price) / initial_price * 100, 2)
             # Insert info to list
             prices.append([s, current_price, perc])
 
@@ -331,9 +334,7 @@ def prices(update, context):
 
 #  Controls
 def callback_control():
-    global name_library
     _time = dt.datetime.utcnow()
-    name_library = f'{_name_library}_{_time.strftime("%Y%m%d")}'
     print('Checking controller  ' + str(_time))
     for k in counters_callback.keys():
         counters_callback[k] += 1
@@ -343,18 +344,17 @@ def callback_control():
             try:
                 print('Check health process  ' + str(_time))
                 counters_callback['health'] = 0
-                lib_keeper = store.get_library(name_library)
                 for service_name in list_services:
                     # check if the service is running
-                    try:
-                        data = lib_keeper.read(service_name).data
-                    except:
+                    data = events.last('health', ticker=service_name.replace('_health', ''))
+                    if data is None:
                         # not exist this service name in the DB
                         for user in LIST_OF_ADMINS:
                             # send alert
                             msg = 'ALERT, THIS SERVICE IS NOT WORKING: ' + str(service_name.replace('_health', ''))
                             _send_msg(msg=msg, chat_id=user)
-                    datetime_service = data.datetime
+                        continue
+                    datetime_service = data['datetime']
                     # compare datetime_service with datetime current, if the difference is greater than 15 minutes, send alert
                     diff_minutes = abs((_time-datetime_service).seconds / 60)
                     if diff_minutes >= 15:
@@ -390,9 +390,8 @@ def callback_control():
                     agregate[t] = round(agregate[t], 2)
 
                 if trading_type == 'financial':
-                    lib_keeper = store.get_library(name_library)
-                    data = lib_keeper.read(symbol_positions).data
-                    broker_pos = data.positions
+                    data = events.last('positions', account=symbol_positions)
+                    broker_pos = data['positions']
                     if conf.BROKER_FINANCIAL == 'ib':
                         broker_pos = broker_pos[account]
                 elif trading_type == 'crypto':
@@ -401,8 +400,8 @@ def callback_control():
                     broker_pos = {c['currency']: float(c['balance']) for c in _broker_pos if
                                   c['currency'] in list_currency}
                 # check if positions is saving
-                if _time > data.datetime:
-                    diff_minutes = abs((_time - data.datetime).seconds / 60)
+                if trading_type == 'financial' and _time > data['datetime']:
+                    diff_minutes = abs((_time - data['datetime']).seconds / 60)
                     if diff_minutes > 4:
                         for user in LIST_OF_ADMINS:
                             msg = 'ALERT, Positions from mt4 is not saving'
@@ -452,7 +451,7 @@ def schedule_callback_control():
 
 
 def main():
-    global LIST_OF_ADMINS, updater, counters_callback, name_library, _name_library, lib_keeper, store, list_services
+    global LIST_OF_ADMINS, updater, counters_callback, store, list_services, events
     global lib_petitions, emiter, name_portfolio, symbol_positions, symbols, initial_balance, trading, account
 
     # initialize these variables to none
@@ -503,10 +502,8 @@ def main():
     x = threading.Thread(target=schedule_callback_control)
     x.start()
     # Config DataBase
-    _name_library = 'events_keeper'
-    name_library = f'{_name_library}_{dt.datetime.utcnow().strftime("%Y%m%d")}'
     store = Universe(host=conf.MONGO_HOST, port=conf.MONGO_PORT)
-    lib_keeper = store.get_library(name_library)
+    events = EventsQuery(get_events_collection(host=conf.MONGO_HOST, port=conf.MONGO_PORT))
     lib_petitions = store.get_library('petitions')
 
     # Connection to broker mq
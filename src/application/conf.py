@@ -10,14 +10,8 @@ path_to_principal = path_modulo.parent
 
 path_to_temp = os.path.join(path_modulo, 'application', 'temp')
 path_to_data = os.path.join(path_modulo, 'application', 'data')
-# Check is exist temp folder
-if not os.path.exists(path_to_temp):
-    os.makedirs(path_to_temp)
-
-# Check is exist data folder for test_data
+# the folders are created by the code writing in them, not when conf is imported
 path_to_test_data = os.path.join(path_to_data, 'test_data')
-if not os.path.exists(path_to_test_data):
-    os.makedirs(path_to_test_data)
 
 
 if os.getenv('AM_I_IN_A_DOCKER_CONTAINER') == '1': # only with docker running
@@ -38,6 +32,7 @@ path_to_my_strategies['betting' ]= os.path.join(path_to_my_smartbots, 'my_bettin
 # MongoDB
 MONGO_HOST = os.getenv("MONGO_HOST") or "REPLACE_ME"
 MONGO_PORT = os.getenv("MONGO_PORT") or "REPLACE_ME"
+EVENT_KEEPER_ARCTIC = int(os.getenv("EVENT_KEEPER_ARCTIC") or 0)  # also save each event in daily libraries
 
 # BrokerMQ
 RABBITMQ_USER = os.getenv("RABBITMQ_USER") or "REPLACE_ME"
@@ -57,6 +52,9 @@ if 'ROUTING_KEY' in os.environ: #docker
     ROUTING_KEY = os.environ['ROUTING_KEY']
 else:
     ROUTING_KEY = os.getenv("ROUTING_KEY") or "order"
+# netting of the market orders of the strategies on the same bar before sending them to the broker
+NETTING_ORDERS = int(os.getenv("NETTING_ORDERS") or 0)
+NETTING_WINDOW_SECONDS = float(os.getenv("NETTING_WINDOW_SECONDS") or 1)
 
 # config of porfolio
 if 'CONF_PORTFOLIO' in os.environ: #docker
@@ -185,5 +183,6 @@ if '[' in CRYPTO_SYMBOLS:
     CRYPTO_SYMBOLS = ast.literal_eval(CRYPTO_SYMBOLS)
 INITIAL_BALANCE_CRYPTO = os.getenv("INITIAL_BALANCE_CRYPTO") or 100
 BROKER_CRYPTO = os.getenv("BROKER_CRYPTO") or "REPLACE_ME"
+STREAM_CRYPTO = int(os.getenv("STREAM_CRYPTO") or 0)  # 1: trades by websocket, 0: bars by REST
 NAME_CRYPTO_PORTFOLIO = os.getenv("NAME_CRYPTO_PORTFOLIO") or "REPLACE_ME"
 ##################################################
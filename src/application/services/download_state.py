@@ -0,0 +1,131 @@
+""" State of the historical downloads: checkpoints by symbol to resume after a crash and progress metrics.
+The checkpoint of a symbol is the datetime of the last row saved in the database, it is written to a json file
+(atomic replace) after each page, so a download restarts from the next page saved instead of the start date.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import datetime as dt
+
+logger = logging.getLogger(__name__)
+
+
+def month_windows(start_date: dt.datetime, end_date: dt.datetime) -> list:
+    """ Split [start_date, end_date) in windows of calendar months"""
+    windows = []
+    start = start_date
+    while start < end_date:
+        if start.month == 12:
+            next_month = dt.datetime(start.year + 1, 1, 1)
+        else:
+            next_month = dt.datetime(start.year, start.month + 1, 1)
+        end = min(next_month, end_date)
+        windows.append((start, end))
+        start = end
+    return windows
+
+
+class DownloadCheckpoints(object):
+    """ Last datetime saved by (provider, interval, symbol) and whether the download is done.
+
+    Parameters
+    ----------
+    path: json file of the checkpoints
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._data = json.load(f)
+            except ValueError as e:
+                logger.error(f'Checkpoints file {path} corrupted, starting again: {e}')
+
+    @staticmethod
+    def _key(provider: str, interval: str, symbol: str) -> str:
+        return f'{provider}|{interval}|{symbol}'
+
+    def get(self, provider: str, interval: str, symbol: str) -> dt.datetime:
+        """ Datetime of the last row saved, None if there is no checkpoint"""
+        with self._lock:
+            checkpoint = self._data.get(self._key(provider, interval, symbol))
+        if checkpoint is None:
+            return None
+        return dt.datetime.fromisoformat(checkpoint['last'])
+
+    def is_done(self, provider: str, interval: str, symbol: str, end_date: dt.datetime) -> bool:
+        with self._lock:
+            checkpoint = self._data.get(self._key(provider, interval, symbol))
+        return checkpoint is not None and checkpoint['done'] and \
+            dt.datetime.fromisoformat(checkpoint['end']) >= end_date
+
+    def update(self, provider: str, interval: str, symbol: str, last: dt.datetime, end_date: dt.datetime,
+               done: bool = False) -> None:
+        with self._lock:
+            self._data[self._key(provider, interval, symbol)] = {'last': last.isoformat(),
+                                                                 'end': end_date.isoformat(), 'done': done}
+            self._save()
+
+    def reset(self, provider: str, interval: str, symbol: str) -> None:
+        """ Forget the checkpoint, the symbol is downloaded again from the start date"""
+        with self._lock:
+            if self._data.pop(self._key(provider, interval, symbol), None) is not None:
+                self._save()
+
+    def _save(self) -> None:
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._data, f)
+        os.replace(tmp, self.path)
+
+
+class DownloadProgress(object):
+    """ Rows, pages, errors and throughput by symbol of a download"""
+
+    def __init__(self, total_symbols: int = 0):
+        self.total_symbols = total_symbols
+        self.start = time.monotonic()
+        self._lock = threading.Lock()
+        self._symbols = {}  # key: symbol, value: dict of metrics
+        self.done = 0
+        self.failed = 0
+
+    def _get(self, symbol: str) -> dict:
+        return self._symbols.setdefault(symbol, {'rows': 0, 'pages': 0, 'errors': 0, 'seconds': 0.0,
+                                                 'last': None})
+
+    def page(self, symbol: str, rows: int, seconds: float, last: dt.datetime = None) -> None:
+        with self._lock:
+            metrics = self._get(symbol)
+            metrics['rows'] += rows
+            metrics['pages'] += 1
+            metrics['seconds'] += seconds
+            metrics['last'] = last
+
+    def error(self, symbol: str) -> None:
+        with self._lock:
+            self._get(symbol)['errors'] += 1
+            self.failed += 1
+
+    def finished(self, symbol: str) -> None:
+        with self._lock:
+            self._get(symbol)
+            self.done += 1
+
+    def summary(self) -> dict:
+        """ Totals of the download and metrics by symbol"""
+        with self._lock:
+            elapsed = time.monotonic() - self.start
+            rows = sum(m['rows'] for m in self._symbols.values())
+            return {'symbols': self.total_symbols, 'done': self.done, 'failed': self.failed,
+                    'rows': rows, 'pages': sum(m['pages'] for m in self._symbols.values()),
+                    'elapsed': elapsed, 'rows_per_second': rows / elapsed if elapsed > 0 else 0.0,
+                    'by_symbol': {s: dict(m) for s, m in self._symbols.items()}}
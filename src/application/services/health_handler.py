@@ -1,17 +1,24 @@
 """ Manage if a services if running and working"""
 from src.infrastructure.brokerMQ import Emit_Events
 from src.domain.models.health import Health
+from src.domain.models.perf_stats import PerfStats
 import datetime as dt
+import time
 import pytz
 
 
 class Health_Handler():
     """ Manage if a services if running and working"""
-    def __init__(self, n_check: int = 10, name_service: str = '', config: dict = {}):
+    def __init__(self, n_check: int = 10, name_service: str = '', config: dict = {}, perf_stats: callable = None,
+                 perf_stats_seconds: float = 60):
         self.n_check = n_check # number of check before sending a event
         self.n = 0
         self.health = Health(ticker=name_service)
         self.emit = Emit_Events(config=config)
+        # stats of the service published with the health every perf_stats_seconds
+        self.perf_stats = perf_stats
+        self.perf_stats_seconds = perf_stats_seconds
+        self._perf_stats_sent = time.monotonic()
 
     def check(self):
         """ Add check to health event"""
@@ -28,5 +35,9 @@ class Health_Handler():
         self.health.state = state
         self.health.description = description
         self.emit.publish_event('health', self.health)
+        if self.perf_stats is not None and time.monotonic() - self._perf_stats_sent >= self.perf_stats_seconds:
+            self._perf_stats_sent = time.monotonic()
+            self.emit.publish_event('perf_stats', PerfStats(datetime=dtime, ticker=self.health.ticker,
+                                                            stats=self.perf_stats()))
 
 
@@ -3,15 +3,18 @@
 
  """
 import os
+import time
+import threading
 import datetime as dt
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict
 import pandas as pd
 from src.domain.decorators import log_start_end
-from src.application.services.historical_utils_handler import save_historical, read_historical, clean_symbol
+from src.application.services.historical_utils_handler import save_historical, last_datetime_historical, \
+    clean_symbol
+from src.application.services.download_state import DownloadCheckpoints, DownloadProgress, month_windows
+from src.application.base_logger import logger
 from src.application import conf
-from src.infrastructure.crypto.exchange_handler import Trading as Trading_Crypto
-from src.infrastructure.mt4.mt4_handler import Trading as Trading_Darwinex
-from src.infrastructure.ib.ib_handler import Trading as Trading_ib
 
 
 def save_test_data():
@@ -24,63 +27,147 @@ def save_test_data():
         save_historical(file.split('.')[0], df, name_library='test_historical_1min')
 
 
-def historical_downloader(symbols: List[str] = ["EURUSD"], start_date: dt.datetime = dt.datetime(2022, 7, 1),
-                          end_date: dt.datetime = dt.datetime.utcnow(),
-                          interval: str = '1m', provider: str = 'darwinex', clean_symbols_database: list = [],
-                          unit=''):
-    """ Main function """
-    name_library = f'{provider}_historical_{interval}'
-    # Connect to the exchange or broker
+MAX_WORKERS_PROVIDER = {'darwinex': 4, 'ib': 1}  # ib client not thread safe, darwinex one FTP by thread
+
+
+def get_trading(provider: str):
+    """ Connect to the exchange or broker, only the stack of the provider is imported"""
     if provider == 'darwinex':
+        from src.infrastructure.mt4.mt4_handler import Trading as Trading_Darwinex
         config_broker = {'DWT_FTP_USER': conf.DWT_FTP_USER, 'DWT_FTP_PASS': conf.DWT_FTP_PASS,
                          'DWT_FTP_HOSTNAME': conf.DWT_FTP_HOSTNAME, 'DWT_FTP_PORT': conf.DWT_FTP_PORT,
                          'MT4_HOST': conf.MT4_HOST, 'CLIENT_IF': conf.CLIENT_IF, 'PUSH_PORT': conf.PUSH_PORT,
                          'PULL_PORT_BROKER': conf.PULL_PORT_BROKER, 'SUB_PORT_BROKER': conf.SUB_PORT_BROKER
                          }
-        trading = Trading_Darwinex(send_orders_status=False, config_broker=config_broker)
+        return Trading_Darwinex(send_orders_status=False, config_broker=config_broker)
     elif provider == 'ib':
+        from src.infrastructure.ib.ib_handler import Trading as Trading_ib
         config_broker = {'HOST_IB': conf.HOST_IB, 'PORT_IB': int(conf.PORT_IB),
                          'CLIENT_IB': 99}
         path_ticker = os.path.join(conf.path_to_principal, 'ticker_info_ib.csv')
-        trading = Trading_ib(send_orders_status=False, exchange_or_broker=f'{provider}_broker',
-                             config_broker=config_broker,
-                             path_ticker=path_ticker)
+        return Trading_ib(send_orders_status=False, exchange_or_broker=f'{provider}_broker',
+                          config_broker=config_broker,
+                          path_ticker=path_ticker)
     else:
-        trading = Trading_Crypto(exchange_or_broker=provider)
-
-    # check if symbols por cleaning
-    if len(clean_symbols_database) > 0:
-        clean_symbol(clean_symbols_database, name_library)
-
-    # Get historical data
-    for symbol in symbols:
-        # Check if exist data in DB
-        data_last = read_historical(symbol, name_library, last_month=True)
-        # if exist data in DB, check if data is complete for the query period
-        if len(data_last) > 0:  # if exist data in DB, do smart update
-            start_date = data_last.index.max() + dt.timedelta(minutes=1)
-            start_date = start_date.to_pydatetime()
-        # load from provider
-        if provider == 'ib':
-            data = trading.get_historical_data(timeframe=interval, start_date=start_date,
-                                               end_date=end_date, symbols=symbol, unit=unit)
-        else:
-            data = trading.get_historical_data(timeframe=interval, limit=1500, start_date=start_date,
-                                               end_date=end_date, symbols=[symbol])[symbol]
-
-        # change types to float for columns with numeric values (in this case all columns)
-        for c in data.columns:
-            if c not in ['symbol', 'datetime', 'exchange', 'ticker', 'dtime_zone', 'provider', 'freq']:
-                data[c] = data[c].astype(float)
-
-        if len(data) > 0 and len(data_last) > 0:  #
-            # update data
-            data = data[data.index > data_last.index.max()]
-            data = pd.concat([data_last, data])
-
-        if len(data) > 0:  # save data
-            save_historical(symbol, data, name_library=name_library)
-        print(f'* Historical data for {symbol} saved')
+        from src.infrastructure.crypto.exchange_handler import Trading as Trading_Crypto
+        return Trading_Crypto(exchange_or_broker=provider)
+
+
+class HistoricalDownloader(object):
+    """ Download the historical data of several providers and symbols with a bounded pool of workers.
+    Each page (crypto), day (darwinex) or month (ib) is saved when it is received and the checkpoint of the symbol
+    is updated, so a download interrupted resumes from the last page saved.
+
+    Parameters
+    ----------
+    max_workers: symbols downloading at the same time
+    checkpoints_path: json file of the checkpoints by symbol
+    """
+
+    def __init__(self, max_workers: int = 8,
+                 checkpoints_path: str = os.path.join(conf.path_to_temp, 'historical_checkpoints.json')):
+        self.max_workers = max_workers
+        self.checkpoints = DownloadCheckpoints(checkpoints_path)
+        self.progress = DownloadProgress()
+        self.jobs = []
+        self._trading = {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def add(self, provider: str, symbols: List[str], interval: str = '1m',
+            start_date: dt.datetime = dt.datetime(2022, 7, 1), end_date: dt.datetime = None, unit: str = '',
+            clean_symbols_database: list = []) -> None:
+        """ Add the symbols of a provider to download"""
+        name_library = f'{provider}_historical_{interval}'
+        if len(clean_symbols_database) > 0:
+            deleted = clean_symbol(clean_symbols_database, name_library)
+            for symbol in set(clean_symbols_database) | set(deleted):  # downloaded again from start_date
+                self.checkpoints.reset(provider, interval, symbol)
+        end_date = dt.datetime.utcnow() if end_date is None else end_date
+        for symbol in symbols:
+            self.jobs.append({'provider': provider, 'symbol': symbol, 'interval': interval, 'unit': unit,
+                              'start_date': start_date, 'end_date': end_date, 'name_library': name_library})
+        if provider not in self._semaphores:
+            self._semaphores[provider] = threading.Semaphore(MAX_WORKERS_PROVIDER.get(provider, self.max_workers))
+
+    def run(self) -> Dict:
+        """ Download all the symbols added, returns the progress summary"""
+        self.progress.total_symbols += len(self.jobs)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._download, job): job for job in self.jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    future.result()
+                    self.progress.finished(job['symbol'])
+                except Exception as e:
+                    self.progress.error(job['symbol'])
+                    logger.error(f'Error downloading {job["provider"]} {job["symbol"]}: {e}')
+        self.jobs = []
+        summary = self.progress.summary()
+        logger.info(f'Historical download: {summary["done"]}/{summary["symbols"]} symbols, '
+                    f'{summary["failed"]} failed, {summary["rows"]} rows, {summary["rows_per_second"]:.0f} rows/s')
+        return summary
+
+    def _get_trading(self, provider: str):
+        with self._lock:
+            if provider not in self._trading:
+                self._trading[provider] = get_trading(provider)
+            return self._trading[provider]
+
+    def _download(self, job: Dict) -> None:
+        provider, symbol, interval = job['provider'], job['symbol'], job['interval']
+        if self.checkpoints.is_done(provider, interval, symbol, job['end_date']):
+            return
+        with self._semaphores[provider]:
+            trading = self._get_trading(provider)
+            last = self.checkpoints.get(provider, interval, symbol)
+            if last is None:  # without checkpoint, last data saved in DB
+                last = last_datetime_historical(symbol, job['name_library'])
+                last = None if last is None else last.to_pydatetime()
+            start_date = job['start_date'] if last is None else max(job['start_date'], last)
+            start = time.monotonic()
+            for data in self._pages(trading, job, start_date):
+                if last is not None:
+                    data = data[data.index > last]
+                if len(data) > 0:
+                    # change types to float for columns with numeric values
+                    for c in data.columns:
+                        if c not in ['symbol', 'datetime', 'exchange', 'ticker', 'dtime_zone', 'provider', 'freq']:
+                            data[c] = data[c].astype(float)
+                    save_historical(symbol, data, name_library=job['name_library'])
+                    last = data.index.max().to_pydatetime()
+                    self.checkpoints.update(provider, interval, symbol, last, job['end_date'])
+                self.progress.page(symbol, len(data), time.monotonic() - start, last)
+                start = time.monotonic()
+            if last is not None:
+                self.checkpoints.update(provider, interval, symbol, last, job['end_date'], done=True)
+        logger.info(f'Historical data for {symbol} saved until {last}')
+
+    @staticmethod
+    def _pages(trading, job: Dict, start_date: dt.datetime):
+        """ Generator of the data of the symbol by page (crypto), day (darwinex) or month (ib)"""
+        symbol, interval = job['symbol'], job['interval']
+        if job['provider'] == 'darwinex':
+            yield from trading.darwinex_bars(interval).iter_days(symbol, start_date, job['end_date'])
+            return
+        if job['provider'] != 'ib':
+            yield from trading.iter_historical_data(symbol, interval, start_date, job['end_date'], limit=1500)
+            return
+        for start, end in month_windows(start_date, job['end_date']):
+            yield trading.get_historical_data(timeframe=interval, start_date=start, end_date=end,
+                                              symbols=symbol, unit=job['unit'])
+
+
+def historical_downloader(symbols: List[str] = ["EURUSD"], start_date: dt.datetime = dt.datetime(2022, 7, 1),
+                          end_date: dt.datetime = dt.datetime.utcnow(),
+                          interval: str = '1m', provider: str = 'darwinex', clean_symbols_database: list = [],
+                          unit='', max_workers: int = 8) -> Dict:
+    """ Main function, download the symbols of a provider, returns the progress summary"""
+    downloader = HistoricalDownloader(max_workers=max_workers)
+    downloader.add(provider, symbols, interval=interval, start_date=start_date, end_date=end_date, unit=unit,
+                   clean_symbols_database=clean_symbols_database)
+    return downloader.run()
 
 
 if __name__ == '__main__':
@@ -1,6 +1,7 @@
 from src.infrastructure.database_handler import Universe
 import pandas as pd
 import datetime as dt
+from typing import Dict
 from src.domain.models.trading.bar import Bar
 from src.application import conf
 
@@ -9,6 +10,15 @@ from src.application import conf
  Doc: https://github.com/man-group/arctic/wiki/Chunkstore
 
 """
+_store = None
+
+
+def get_store() -> Universe:
+    """ Database handler shared by the reads and writes of the process"""
+    global _store
+    if _store is None:
+        _store = Universe(host=conf.MONGO_HOST, port=conf.MONGO_PORT)
+    return _store
 
 
 def read_historical(symbol: str, name_library: str = 'provider_historical_1min',
@@ -17,8 +27,7 @@ def read_historical(symbol: str, name_library: str = 'provider_historical_1min',
     """ Read historical data from initial month and end month.
         Symbols as save as :symbol_monthYear as a way to identify the data.
         """
-    store = Universe(host=conf.MONGO_HOST, port=conf.MONGO_PORT)
-    lib = store.get_library(name_library)
+    lib = get_store().get_library(name_library)
     if lib.has_symbol(symbol) is False:
         return pd.DataFrame()
     if last_month: # read last month of data
@@ -30,17 +39,62 @@ def read_historical(symbol: str, name_library: str = 'provider_historical_1min',
     return lib.read(symbol, chunk_range=pd.date_range(start_date, end_date))
 
 
+def last_datetime_historical(symbol: str, name_library: str = 'provider_historical_1min'):
+    """ Datetime of the last row saved of the symbol, None if the symbol doesn't exist.
+    It is kept in the metadata by append_historical, the tail chunk is read for symbols saved before."""
+    lib = get_store().get_library(name_library)
+    if lib.has_symbol(symbol) is False:
+        return None
+    metadata = lib.read_metadata(symbol)
+    if metadata is not None and 'last_index' in metadata:
+        return pd.Timestamp(metadata['last_index'])
+    data = read_historical(symbol, name_library, last_month=True)
+    return data.index.max() if len(data) > 0 else None
+
+
+def append_historical(data_by_symbol: Dict[str, pd.DataFrame],
+                      name_library: str = 'provider_historical_1min') -> Dict[str, int]:
+    """ Append the new rows of several symbols, returns the rows written by symbol.
+    The rows later than the last row saved are appended, so just the tail chunk of the symbol is touched. The rows at
+    or before the last one saved (corrections or backfills) are merged with the chunks they touch and only these
+    chunks are rewritten, update replaces a whole chunk with the rows given. Rows with the same index
+    are deduplicated keeping the last one."""
+    lib = get_store().get_library(name_library)
+    written = {}
+    for symbol, data in data_by_symbol.items():
+        if len(data) == 0:
+            written[symbol] = 0
+            continue
+        # save in chunks of 1 month of data, index have to be a datetime object with name date
+        data = data[~data.index.duplicated(keep='last')].sort_index()
+        data.index.name = 'date'
+        last = last_datetime_historical(symbol, name_library)
+        if last is None:
+            lib.write(symbol, data, metadata={'last_index': data.index.max().to_pydatetime()}, chunk_size='M')
+            written[symbol] = len(data)
+            continue
+        earlier = data[data.index <= last]
+        if len(earlier) > 0:
+            # whole chunks touched by the rows, not only the range of the rows
+            saved = lib.read(symbol, chunk_range=pd.DatetimeIndex([earlier.index.min(), earlier.index.max()]),
+                             filter_data=False)
+            merged = pd.concat([saved, earlier])
+            merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+            merged.index.name = 'date'
+            # the metadata is replaced by update, the last index is kept
+            lib.update(symbol, merged, metadata={'last_index': last.to_pydatetime()})
+        later = data[data.index > last]
+        if len(later) > 0:
+            lib.append(symbol, later, metadata={'last_index': later.index.max().to_pydatetime()})
+        written[symbol] = len(data)
+    return written
+
+
 def save_historical(symbol: str, data: pd.DataFrame, name_library: str = 'provider_historical_1min') -> None:
-    """ Save historical in database in the library."""
-    store = Universe(host=conf.MONGO_HOST, port=conf.MONGO_PORT)
-    lib = store.get_library(name_library)
-    # save in chunks of 1 month of data, index have to be a datetime object with name date
-    data.index.name = 'date'
-    if lib.has_symbol(symbol):
-        lib.update(symbol, data, chunk_size='M')
-    else:
-        lib.write(symbol, data, chunk_size='M')
-    print(f'Symbol {symbol} saved.')
+    """ Save historical in database in the library, appending the rows after the last one saved and updating
+    the earlier ones."""
+    rows = append_historical({symbol: data}, name_library=name_library)[symbol]
+    print(f'Symbol {symbol} saved, {rows} rows written.')
 
 
 def get_day_per_month(month, year):
@@ -57,14 +111,18 @@ def get_day_per_month(month, year):
     return max_day_value
 
 
-def clean_symbol(symbols, name_library):
+def clean_symbol(symbols, name_library) -> list:
+    """ Delete the symbols of the library containing any of symbols, returns the symbols deleted"""
     store = Universe(host=conf.MONGO_HOST, port=conf.MONGO_PORT)
     lib = store.get_library(name_library)
+    deleted = []
     for symbol in symbols:
         for _s in lib.list_symbols():
             if symbol in _s:
                 lib.delete(_s)
+                deleted.append(_s)
                 print(f'Symbol {_s} deleted.')
+    return deleted
 
 
 def dataframe_to_bars(symbol: str, frame: pd.DataFrame):
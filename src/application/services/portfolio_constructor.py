@@ -1,23 +1,56 @@
 import importlib
+import functools
+import copy
+import collections
+import threading
+import time
 from dataclasses import dataclass
-from src.infrastructure.brokerMQ import Emit_Events, receive_events
-from src.infrastructure import database_handler
 import datetime as dt
 import os
-from src.application import conf
 import pandas as pd
-from src.domain.services.equity_handler import Equity_Handler
-from src.infrastructure.database_handler import Universe
-from src.application.services.health_handler import Health_Handler
+from src.application import conf
+from src.domain.services.equity_handler import Equity_Handler, Equity
+from src.domain.services.stats.latency import LatencyStats
 from pathlib import Path
+# brokerMQ (pika) and database_handler (arctic) are imported when they are used, a portfolio in backtest doesn't
+# need pika and one in real time only needs arctic for the petitions
+
+
+@functools.lru_cache(maxsize=None)
+def get_strategy_class(asset_type: str, strategy_name: str, path_to_strategies: str = None):
+    """ Class of the strategy, registry of the strategies loaded by (asset_type, name, path).
+    The strategies of the repo are in domain/services/strategies (strategies_betting for betting), the others in
+    path_to_strategies (my_smartbots)"""
+    strategy_file = 'strategies_betting' if asset_type == 'betting' else 'strategies'
+    path_to_strategy = os.path.join(conf.path_modulo, 'domain', 'services', strategy_file,
+                                    strategy_name.lower() + '.py')
+    name = f'src.domain.services.{strategy_file}.{strategy_name.lower()}'
+    if not os.path.exists(path_to_strategy):
+        if path_to_strategies is None:
+            raise ValueError(f'Error, strategy {strategy_name} not found')
+        path_to_strategy = Path(os.path.join(path_to_strategies, strategy_name.lower() + '.py'))
+        parent = path_to_strategy.parent.parent.name  # get name last folder
+        name = f'my_smartbots.{parent}.strategies.{strategy_name.lower()}'
+    strategy_module = importlib.import_module(name)
+    return getattr(strategy_module, strategy_name)
+
+
+def _strategy_key(parameters: dict) -> tuple:
+    """ Strategy and parameters of a configuration, without the keys added when it is created"""
+    params = {k: v for k, v in parameters['params'].items() if k != 'tickers_feeder'}
+    return parameters['strategy'], repr(sorted(params.items()))
 
 
 class Portfolio_Constructor(object):
     def __init__(self, conf_portfolio: dict, run_real: bool = False, asset_type: str = None,
                  send_orders_to_broker: bool = False, start_date: dt.datetime = dt.datetime(2022, 1, 1),
                  end_date: dt.datetime = dt.datetime.utcnow(), inicial_cash: float = 0, path_to_strategies: str = None,
-                 routing_key: str = 'bar,petition,timer,webhook', list_events_backtest : list = None):
-        """ Run portfolio of strategies"""
+                 routing_key: str = 'bar,petition,timer,webhook', list_events_backtest : list = None,
+                 path_to_config: str = None, limit_recent_bars: int = 5000, config_brokermq: dict = None,
+                 perf_stats: bool = False, perf_stats_seconds: float = 60):
+        """ Run portfolio of strategies.
+        perf_stats: measure the time of add_event/add_timer of each strategy by event type and count its orders,
+        the stats are returned by get_perf_stats and published every perf_stats_seconds with the health events"""
         if asset_type is None:
             error_msg = 'asset_type is required'
             raise ValueError(error_msg)
@@ -32,9 +65,18 @@ class Portfolio_Constructor(object):
         self.list_events_backtest = list_events_backtest
         self.run_real = run_real
         self.asset_type = asset_type
+        self.path_to_config = path_to_config  # config file to reload the strategies
+        self.strategies = {}  # key: id strategy, value: (configuration, strategy object)
         self.ticker_to_strategies = {}  # fill with function load_strategies_conf()
         self.ticker_to_id_strategies = {}
         self.total_strategies_with_timer = []
+        self._warming_up = False  # new strategies of a reload are fed with history
+        self._pending_reload = False  # config file changed
+        # last bars received in real time by ticker, for warming up the strategies of a reload
+        self._recent_bars = collections.defaultdict(lambda: collections.deque(maxlen=limit_recent_bars))
+        # key: (id strategy, event type), value: seconds of add_event/add_timer, None if not measured
+        self.perf_stats = LatencyStats() if perf_stats else None
+        self.orders_by_strategy = collections.Counter()
         self._load_strategies_conf()
         self.send_orders_to_broker = send_orders_to_broker
         self.orders = []
@@ -42,16 +84,22 @@ class Portfolio_Constructor(object):
         self.bets_result = {}  # keys: match unique and values: result
         self.routing_key = routing_key
         # health log
-        self.config_brokermq = {'host': conf.RABBITMQ_HOST, 'port': conf.RABBITMQ_PORT, 'user': conf.RABBITMQ_USER,
-                                'password': conf.RABBITMQ_PASSWORD}
+        if config_brokermq is None:
+            config_brokermq = {'host': conf.RABBITMQ_HOST, 'port': conf.RABBITMQ_PORT, 'user': conf.RABBITMQ_USER,
+                               'password': conf.RABBITMQ_PASSWORD}
+        self.config_brokermq = config_brokermq
         if self.run_real:
+            from src.application.services.health_handler import Health_Handler
             self.health_handler = Health_Handler(n_check=10,
                                                  name_service=self.name,
-                                                 config=self.config_brokermq)
+                                                 config=self.config_brokermq,
+                                                 perf_stats=self.get_perf_stats if perf_stats else None,
+                                                 perf_stats_seconds=perf_stats_seconds)
         else:
             self.health_handler = None
 
         if self.send_orders_to_broker: # if send orders to broker, send orders to brokerMQ
+            from src.infrastructure.brokerMQ import Emit_Events
             self.emit_orders = Emit_Events(config=self.config_brokermq)
         # equity handler
         self.equity_handler = Equity_Handler(ticker_to_strategies=self.ticker_to_strategies,
@@ -60,66 +108,226 @@ class Portfolio_Constructor(object):
 
     def _load_strategies_conf(self):
         """ Load the strategies configuration """
-        list_stra = {}
         for parameters in self.conf_portfolio['Strategies']:
-            strategy_name = parameters['strategy']
-            _id = parameters['id']
-            ticker = parameters['params']['ticker']
-            if 'tickers_to_feeder' in parameters['params']:
-                tickers_feeder = parameters['params']['tickers_to_feeder'].split(',')  # set in list
-            else:
-                tickers_feeder = []
-            parameters['params']['tickers_feeder'] = tickers_feeder
-            set_basic = False
-            if strategy_name == 'Basic_Strategy':
-                set_basic = True
-            if strategy_name not in list_stra:  # import strategy only once
-                list_stra[strategy_name] = self._get_strategy(self.asset_type, strategy_name)
-            if ticker not in self.ticker_to_strategies:
-                self.ticker_to_strategies[ticker] = []
-                self.ticker_to_id_strategies[ticker] = []
-            for t in tickers_feeder: # add strategy to all tickers feeder
-                self.ticker_to_strategies[t] = []
-                self.ticker_to_id_strategies[t] = []
-
-            strategy_obj = list_stra[strategy_name](parameters['params'], id_strategy=_id,
-                                                    callback=self._callback_orders, set_basic = set_basic)
+            self.strategies[parameters['id']] = (copy.deepcopy(parameters), self._create_strategy(parameters))
+        self._index_strategies()
 
+    def _create_strategy(self, parameters: dict):
+        """ Strategy object of the configuration of one strategy"""
+        strategy_name = parameters['strategy']
+        if 'tickers_to_feeder' in parameters['params']:
+            tickers_feeder = parameters['params']['tickers_to_feeder'].split(',')  # set in list
+        else:
+            tickers_feeder = []
+        parameters['params']['tickers_feeder'] = tickers_feeder
+        set_basic = False
+        if strategy_name == 'Basic_Strategy':
+            set_basic = True
+        strategy_class = self._get_strategy(self.asset_type, strategy_name)  # imported only once
+        if self.perf_stats is None:
+            return strategy_class(parameters['params'], id_strategy=parameters['id'], callback=self._callback_orders,
+                                  set_basic=set_basic)
+        _id = parameters['id']
+
+        def _callback_orders(order_or_bet: dataclass):
+            if not self._warming_up:
+                self.orders_by_strategy[_id] += 1
+            self._callback_orders(order_or_bet)
+
+        strategy_obj = strategy_class(parameters['params'], id_strategy=_id, callback=_callback_orders,
+                                      set_basic=set_basic)
+        # the methods are replaced in the object, without perf_stats the events don't pay for the timers
+        strategy_obj.add_event = self._timed(_id, strategy_obj.add_event)
+        if hasattr(strategy_obj, 'add_timer'):
+            strategy_obj.add_timer = self._timed(_id, strategy_obj.add_timer)
+        return strategy_obj
+
+    def _timed(self, _id, method: callable) -> callable:
+        """ method of a strategy saving the seconds of each call in perf_stats by event type"""
+        perf_stats = self.perf_stats
+        perf_counter = time.perf_counter
+
+        def _method(event: dataclass):
+            start = perf_counter()
+            try:
+                return method(event)
+            finally:
+                if not self._warming_up:
+                    perf_stats.add((_id, event.event_type), perf_counter() - start)
+        return _method
+
+    def get_perf_stats(self) -> dict:
+        """ Seconds of add_event/add_timer (count, mean, p50, p99, max) by strategy, by event type of each strategy
+        and by event type of the portfolio, and orders sent by strategy. None if the portfolio is not measured"""
+        if self.perf_stats is None:
+            return None
+        by_key = self.perf_stats.summary()
+        by_strategy = self.perf_stats.merged(lambda key: key[0])
+        strategies = {}
+        for _id, (parameters, strategy_obj) in list(self.strategies.items()):
+            histogram = by_strategy.get(_id)
+            strategies[_id] = {'strategy': parameters['strategy'], 'ticker': strategy_obj.ticker,
+                               'orders': self.orders_by_strategy[_id],
+                               'seconds': histogram.total if histogram is not None else 0.0,
+                               'latency': histogram.summary() if histogram is not None else None,
+                               'event_types': {key[1]: summary for key, summary in by_key.items() if key[0] == _id}}
+        return {'portfolio': self.name, 'strategies': strategies,
+                'event_types': {k: h.summary() for k, h in self.perf_stats.merged(lambda key: key[1]).items()}}
+
+    def _index_strategies(self):
+        """ Build ticker_to_strategies, ticker_to_id_strategies and the strategies with timer from self.strategies.
+        The new dicts replace the old ones at once, so an event never sees a portfolio half updated"""
+        ticker_to_strategies = {}
+        ticker_to_id_strategies = {}
+        total_strategies_with_timer = []
+        for _id, (parameters, strategy_obj) in self.strategies.items():
+            tickers = [parameters['params']['ticker']]
+            if 'tickers_to_feeder' in parameters['params']:  # set strategies to feed with tickers_feeder
+                tickers += parameters['params']['tickers_to_feeder'].split(',')
+            for t in tickers:
+                ticker_to_strategies.setdefault(t, []).append(strategy_obj)
+                ticker_to_id_strategies.setdefault(t, []).append(_id)
             if hasattr(strategy_obj, 'add_timer'):
                 # if the strategy has this method, add timer
-                self.total_strategies_with_timer.append(strategy_obj)
-            self.ticker_to_strategies[ticker].append(strategy_obj)
-            self.ticker_to_id_strategies[ticker].append(_id)
-            for t in tickers_feeder: # set strategies to feed with tickers_feeder
-                self.ticker_to_strategies[t].append(strategy_obj)
-                self.ticker_to_id_strategies[t].append(_id)
+                total_strategies_with_timer.append(strategy_obj)
+        self.ticker_to_strategies = ticker_to_strategies
+        self.ticker_to_id_strategies = ticker_to_id_strategies
+        self.total_strategies_with_timer = total_strategies_with_timer
+        if hasattr(self, 'equity_handler'):
+            self.equity_handler.ticker_to_strategies = ticker_to_strategies
+
+    def reload_strategies(self, list_strategies: list = None) -> dict:
+        """ Add, remove or change the parameters of the strategies running without restarting the portfolio.
+        list_strategies: configuration of the strategies like 'Strategies' of the config file, if None the config
+        file is read again. The strategies added or changed are warmed up with the history of their tickers, then
+        the added ones start without position, the changed ones keep the position of the strategy they replace and
+        the positions of the removed ones are closed with market orders.
+        Returns the ids added, removed and changed."""
+        if list_strategies is None:
+            from src.domain.config_helper import get_config
+            list_strategies = get_config(self.path_to_config)['Strategies']
+        new_conf = {parameters['id']: copy.deepcopy(parameters) for parameters in list_strategies}
+        removed = [_id for _id in self.strategies if _id not in new_conf]
+        changed = [_id for _id in new_conf if _id in self.strategies and
+                   _strategy_key(self.strategies[_id][0]) != _strategy_key(new_conf[_id])]
+        added = [_id for _id in new_conf if _id not in self.strategies]
+        new_strategies = {_id: (new_conf[_id], self._create_strategy(copy.deepcopy(new_conf[_id])))
+                          for _id in added + changed}
+        self._warm_up([strategy_obj for _, strategy_obj in new_strategies.values()])
+        # the positions of the warm up were never sent to the broker: the changed strategies keep the position of
+        # the strategy they replace and the new ones start flat, the positions of the removed ones are closed
+        for _id, (_, strategy_obj) in new_strategies.items():
+            old = self.strategies[_id][1] if _id in changed else None
+            if old is not None and old.ticker == strategy_obj.ticker:
+                self._carry_position(strategy_obj, old)
+            else:
+                self._reset_position(strategy_obj)
+                if old is not None:
+                    self._close_position(old)
+        for _id in removed:
+            self._close_position(self.strategies[_id][1])
+        for _id in removed + changed:
+            self.strategies.pop(_id)
+        self.strategies.update(new_strategies)
+        self._index_strategies()
+        self.conf_portfolio['Strategies'] = [parameters for parameters, _ in self.strategies.values()]
+        result = {'added': added, 'removed': removed, 'changed': changed}
+        print(f'Strategies reloaded in {self.name}: {result}')
+        return result
+
+    @staticmethod
+    def _reset_position(strategy_obj):
+        """ Strategy without position and with its equity from zero"""
+        strategy_obj.number_of_contracts = 0
+        strategy_obj.position = 0
+        equity = strategy_obj.equity_hander_estrategy
+        strategy_obj.equity_hander_estrategy = Equity(
+            ticker=equity.ticker, asset_type=equity.asset_type, fees=equity.fees, slippage=equity.slippage,
+            point_value=equity.point_value, is_cost_percentage=equity.is_cost_percentage,
+            id_strategy=equity.id_strategy,
+            base_currency={'ticker': equity.ticker_currency_base, 'value': equity.change_to_currency_base})
+
+    @staticmethod
+    def _carry_position(strategy_obj, old):
+        """ Strategy with the position and the equity of the strategy it replaces"""
+        strategy_obj.number_of_contracts = old.number_of_contracts
+        strategy_obj.position = old.position
+        strategy_obj.equity_hander_estrategy = old.equity_hander_estrategy
+
+    @staticmethod
+    def _close_position(strategy_obj):
+        """ Send the market order closing the position of a strategy that stops running"""
+        quantity = abs(getattr(strategy_obj, 'number_of_contracts', 0))
+        if quantity == 0:
+            return
+        action = 'sell' if strategy_obj.number_of_contracts > 0 else 'buy'
+        print(f'Closing position {strategy_obj.number_of_contracts} of strategy {strategy_obj.id_strategy} in '
+              f'{strategy_obj.ticker}')
+        strategy_obj.send_order(ticker=strategy_obj.ticker, price=strategy_obj.equity_hander_estrategy.price,
+                                quantity=quantity, action=action, type='market', datetime=dt.datetime.utcnow())
+
+    def _warm_up(self, strategies: list):
+        """ Feed the new strategies with the history of their tickers, the orders are not sent to the broker"""
+        if len(strategies) == 0:
+            return
+        ticker_to_strategies = {}
+        for strategy_obj in strategies:
+            tickers = [strategy_obj.ticker] + strategy_obj.parameters.get('tickers_feeder', [])
+            for t in tickers:
+                ticker_to_strategies.setdefault(t, []).append(strategy_obj)
+        events = []
+        if self.data_sources is not None and self.asset_type in ['crypto', 'financial']:
+            from src.infrastructure import database_handler
+            data_sources = []
+            for info in self.data_sources:  # only the tickers of the new strategies
+                if 'tickers' in info:
+                    tickers = [t for t in info['tickers'] if t in ticker_to_strategies]
+                    if len(tickers) > 0:
+                        data_sources.append(dict(info, tickers=tickers))
+                elif info.get('ticker') in ticker_to_strategies:
+                    data_sources.append(info)
+            if len(data_sources) > 0:
+                events = database_handler.load_tickers_and_create_events(data_sources, start_date=self.start_date,
+                                                                         end_date=dt.datetime.utcnow(),
+                                                                         mongo_host=conf.MONGO_HOST,
+                                                                         mongo_port=conf.MONGO_PORT)
+        self._warming_up = True
+        try:
+            last = {}
+            for event in events:
+                if event.event_type in ['bar', 'tick']:
+                    last[event.ticker] = event.datetime
+                    for strategy_obj in ticker_to_strategies.get(event.ticker, []):
+                        strategy_obj.add_event(event)
+            # bars received in real time that are not in the database yet
+            for ticker, strategies_ticker in ticker_to_strategies.items():
+                for event in list(self._recent_bars.get(ticker, [])):
+                    if ticker not in last or event.datetime > last[ticker]:
+                        for strategy_obj in strategies_ticker:
+                            strategy_obj.add_event(event)
+        finally:
+            self._warming_up = False
+
+    def watch_config(self, interval: float = 5.0):
+        """ Reload the strategies when the config file changes, the reload is done by the thread of the events"""
+        def _watch():
+            last_mtime = os.path.getmtime(self.path_to_config)
+            while True:
+                time.sleep(interval)
+                try:
+                    mtime = os.path.getmtime(self.path_to_config)
+                    if mtime != last_mtime:
+                        last_mtime = mtime
+                        self._pending_reload = True
+                except Exception as e:
+                    print(f'Error watching {self.path_to_config} {e}')
+
+        threading.Thread(target=_watch, daemon=True).start()
 
     def _get_strategy(self, asset_type: str, strategy_name: str):
-        """ Load the strategy dinamically"""
+        """ Load the strategy dinamically, each strategy is imported once by process"""
         try:
-            # check if exist file with the strategy
-            path_to_strategy = os.path.join(conf.path_modulo, 'domain', 'services', 'strategies', strategy_name.lower() + '.py')
-            if asset_type == 'betting':
-                strategy_file = 'strategies_betting'
-                path_to_strategy = os.path.join(conf.path_modulo, 'domain', 'services', 'strategies_betting',
-                                                strategy_name.lower() + '.py')
-            else:
-                strategy_file = 'strategies'
-            name = f'src.domain.services.{strategy_file}.{strategy_name.lower()}'
-            if not os.path.exists(path_to_strategy):
-                path_to_strategy = Path(os.path.join(self.path_to_strategies, strategy_name.lower() + '.py'))
-                parent = path_to_strategy.parent.parent.name
-                # get name last folder
-
-                name = f'my_smartbots.{parent}.strategies.{strategy_name.lower()}'
-
-            elif os.path.exists(path_to_strategy) is False:
-                error_msg = f'Error, strategy {strategy_name} not found'
-                raise ValueError(error_msg)
-
-            strategy_module = importlib.import_module(name)
-            strategy_class = getattr(strategy_module, strategy_name)
-            return strategy_class
+            return get_strategy_class(asset_type, strategy_name, self.path_to_strategies)
         except Exception as e:
             raise ValueError(f'Error loading strategy {strategy_name}') from e
 
@@ -164,6 +372,7 @@ class Portfolio_Constructor(object):
     def run_simulation(self):
         """ Run Backtest portfolio"""
         self.in_real_time = False
+        from src.infrastructure import database_handler
         if self.data_sources is not None:
             if self.asset_type in ['crypto', 'financial']:
                 for event in database_handler.load_tickers_and_create_events(self.data_sources,
@@ -199,9 +408,18 @@ class Portfolio_Constructor(object):
                     data_to_save = self.get_saved_values_strategies_last()
                 elif event.function_to_run == 'close_all_positions':
                     self.close_all_positions()
+                elif event.function_to_run == 'reload_strategies':
+                    # parameters: {'Strategies': [...]} or None to read the config file
+                    parameters = event.parameters or {}
+                    data_to_save = self.reload_strategies(parameters.get('Strategies'))
+                elif event.function_to_run == 'get_perf_stats':
+                    data_to_save = self.get_perf_stats()
+                    if data_to_save is None:
+                        print(f'Portfolio {self.name} without perf_stats')
                 if data_to_save is not None:
                     name_library = event.path_to_saving
                     name = event.name_to_saving
+                    from src.infrastructure.database_handler import Universe
                     store = Universe(host=conf.MONGO_HOST, port=conf.MONGO_PORT)
                     lib = store.get_library(name_library, library_chunk_store=False)
                     lib.write(name, data_to_save)
@@ -210,6 +428,12 @@ class Portfolio_Constructor(object):
     def run_realtime(self):
         self.print_events_realtime = True
         self.in_real_time = True
+        if self.perf_stats is not None:  # only the events in real time, not the replay of run_simulation
+            self.perf_stats.reset()
+            self.orders_by_strategy.clear()
+        from src.infrastructure.brokerMQ import receive_events
+        if self.path_to_config is not None:
+            self.watch_config()
         print('running real  of the Portfolio, waitig Events')
         if self.asset_type in ['crypto', 'financial']:
             receive_events(routing_key=self.routing_key, callback=self._callback_datafeed, config=self.config_brokermq)
@@ -220,6 +444,8 @@ class Portfolio_Constructor(object):
 
     def _callback_orders(self, order_or_bet: dataclass):
         """ Order event from strategies"""
+        if self._warming_up:  # orders of the history fed to the new strategies, not recorded nor sent
+            return
         order_or_bet.portfolio_name = self.name
         order_or_bet.status = 'from_strategy'
         if self.asset_type == 'crypto' or self.asset_type == 'financial':
@@ -262,7 +488,15 @@ class Portfolio_Constructor(object):
         recieve  events"""
         if self.in_real_time:
             self.health_handler.check()
+            if self._pending_reload:
+                self._pending_reload = False
+                try:
+                    self.reload_strategies()
+                except Exception as e:
+                    print(f'Error reloading strategies {e}')
         if event.event_type == 'bar':  # bar event, most common.
+            if self.in_real_time:
+                self._recent_bars[event.ticker].append(event)
             try:
                 strategies = self.ticker_to_strategies[event.ticker]
             except:
@@ -0,0 +1,85 @@
+""" Time of the imports of a service at startup.
+ImportProfiler wraps the loaders of the modules imported while it is installed and keeps the time of each one,
+cumulative (with the modules it imports) and self (without them), like python -X importtime but callable from
+the services with --profile-startup.
+"""
+import sys
+import time
+from importlib.abc import MetaPathFinder, Loader
+from typing import List
+
+
+class _TimedLoader(Loader):
+    def __init__(self, loader, profiler, name):
+        self.loader = loader
+        self.profiler = profiler
+        self.name = name
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.profiler._enter(self.name)
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.profiler._exit(self.name)
+
+    def __getattr__(self, item):  # get_resource_reader, is_package...
+        return getattr(self.loader, item)
+
+
+class ImportProfiler(MetaPathFinder):
+    """ Import time by module, use as context manager or with start() and stop()"""
+
+    def __init__(self):
+        self.times = {}  # key: module, value: [cumulative seconds, self seconds]
+        self.started = None
+        self.elapsed = None
+        self._stack = []  # [module, start, seconds of the children]
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self, fullname)
+                return spec
+        return None
+
+    def _enter(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def _exit(self, name):
+        _, start, children = self._stack.pop()
+        cumulative = time.perf_counter() - start
+        self.times[name] = [cumulative, cumulative - children]
+        if self._stack:
+            self._stack[-1][2] += cumulative
+
+    def start(self) -> 'ImportProfiler':
+        self.started = time.perf_counter()
+        sys.meta_path.insert(0, self)
+        return self
+
+    def stop(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+        self.elapsed = time.perf_counter() - self.started
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def report(self, top: int = 25) -> List[str]:
+        """ Lines with the modules slower to import by self time, and the total time"""
+        elapsed = time.perf_counter() - self.started if self.elapsed is None else self.elapsed
+        lines = [f'Startup in {elapsed:.3f}s, {len(self.times)} modules imported',
+                 f'{"self (ms)":>10} {"cumulative (ms)":>16}  module']
+        for name, (cumulative, _self) in sorted(self.times.items(), key=lambda t: -t[1][1])[:top]:
+            lines.append(f'{_self * 1000:10.1f} {cumulative * 1000:16.1f}  {name}')
+        return lines
@@ -0,0 +1,64 @@
+""" Create unitest for the in memory store of actual off"""
+import unittest as ut
+import os
+import tempfile
+import time
+from src.infrastructure.betfair.actual_off import ActualOffStore
+
+
+class TestActualOffStore(ut.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'data_actual_off.json')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_update_journal_and_restart(self):
+        now = time.time()
+        store = ActualOffStore(self.path, background=False)
+        self.assertEqual(store.update('A v B', now + 60, now, False), now + 60)
+        self.assertEqual(store.update('A v B', now + 60, now + 120, True), now + 120)  # match starts late
+        self.assertEqual(store.update('A v B', now + 60, now + 180, True), now + 120)  # already in play
+        store.flush()
+        self.assertFalse(os.path.isfile(self.path))  # just the journal has been written
+        # restart replays the journal
+        store = ActualOffStore(self.path, background=False)
+        self.assertEqual(store.get('A v B'), now + 120)
+        self.assertTrue(store.start['A v B'])
+        # checkpoint writes the snapshot without expired matches and removes the journal
+        store.update('old match', now - 5 * 86400, now - 5 * 86400, True)
+        store.checkpoint()
+        self.assertFalse(os.path.isfile(store.journal_path))
+        store = ActualOffStore(self.path, background=False)
+        self.assertIn('A v B', store)
+        self.assertNotIn('old match', store)
+
+    def test_read_only(self):
+        now = time.time()
+        store = ActualOffStore(self.path, background=False)
+        store.update('A v B', now + 60, now, False)
+        store.flush()
+        reader = ActualOffStore(self.path, read_only=True)
+        self.assertIsNone(reader._thread)
+        self.assertEqual(reader.get('A v B'), now + 60)
+        reader.update('C v D', now + 60, now, False)  # just in memory
+        reader.close()
+        self.assertFalse(os.path.isfile(self.path))
+        self.assertTrue(os.path.isfile(store.journal_path))  # the journal of the writer is kept
+        self.assertNotIn('C v D', ActualOffStore(self.path, background=False))
+
+    def test_checkpoint_only_with_changes(self):
+        now = time.time()
+        store = ActualOffStore(self.path, background=False)
+        store.checkpoint()
+        self.assertFalse(os.path.isfile(self.path))
+        store.update('A v B', now + 60, now, False)
+        store.checkpoint()
+        os.remove(self.path)
+        store.checkpoint()  # nothing changed since the last snapshot
+        self.assertFalse(os.path.isfile(self.path))
+
+
+if __name__ == '__main__':
+    ut.main()
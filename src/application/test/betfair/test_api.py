@@ -0,0 +1,66 @@
+""" Create unitest for the http session of betfair Api with a local stub server"""
+import unittest as ut
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ Answer every json-rpc request with an empty result, keeping the connection alive"""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        body = json.dumps({'jsonrpc': '2.0', 'result': [], 'id': request['id']}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@ut.skipIf(requests is None, 'requests is not installed')
+class TestApiSession(ut.TestCase):
+    def setUp(self):
+        from src.infrastructure.betfair.api import Api
+        self.certs = tempfile.TemporaryDirectory()
+        open(os.path.join(self.certs.name, 'user.pem'), 'w').close()
+        self.api = Api(self.certs.name, ssl_prefix='user')
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.connections = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/exchange/betting/json-rpc/v1'
+
+    def tearDown(self):
+        self.api.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.certs.cleanup()
+
+    def test_connection_reused_and_latency(self):
+        req = json.dumps({'jsonrpc': '2.0', 'method': 'SportsAPING/v1.0/listMarketBook', 'params': {}, 'id': 1})
+        for _ in range(5):
+            self.assertEqual(self.api.send_http_request(self.url, req)['result'], [])
+        self.assertEqual(self.server.connections, 1)
+        stats = self.api.get_latency_stats()
+        self.assertEqual(stats['SportsAPING/v1.0/listMarketBook']['count'], 5)
+        self.assertGreater(stats['SportsAPING/v1.0/listMarketBook']['p99'], 0)
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,38 @@
+""" Create unitest for the bet status published by the Betfair handler and received from the bus"""
+import unittest as ut
+from types import SimpleNamespace
+
+try:
+    from src.infrastructure.betfair.betfair_handler import Trading
+    from src.infrastructure.brokerMQ import CallBack_Handler
+    from src.domain.models.betting.bet import Bet
+except (ImportError, SystemExit):  # pika, requests not installed
+    Trading = None
+
+
+class FakeEmit(object):
+    def __init__(self):
+        self.published = []
+
+    def publish_event(self, topic, msg):
+        self.published.append((topic, msg.to_json()))
+
+
+@ut.skipIf(Trading is None, 'dependencies not installed')
+class TestBetStatus(ut.TestCase):
+    def test_bet_status_received(self):
+        trading = Trading.__new__(Trading)  # without login
+        trading.send_orders_status = True
+        trading.emit_orders = FakeEmit()
+        trading._publish_bet_status(Bet(ticker='A v B', bet_id=123, status='Completed', quantity=10,
+                                        quantity_execute=10, filled_price=2.0))
+        topic, body = trading.emit_orders.published[0]
+        received = []
+        CallBack_Handler(callback=received.append).callback_recieved(None, SimpleNamespace(routing_key=topic),
+                                                                     None, body)
+        self.assertIsInstance(received[0], Bet)
+        self.assertEqual((received[0].bet_id, received[0].status), (123, 'Completed'))
+
+
+if __name__ == '__main__':
+    ut.main()
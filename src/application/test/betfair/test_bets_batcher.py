@@ -0,0 +1,26 @@
+""" Create unitest for the batcher of bets by market"""
+import unittest as ut
+import threading
+from types import SimpleNamespace
+from src.infrastructure.betfair.bets_batcher import BetsBatcher
+
+
+class TestBetsBatcher(ut.TestCase):
+    def test_group_by_market(self):
+        placed = []
+        done = threading.Event()
+
+        def place(ticker_id, bets):
+            placed.append((ticker_id, [bet.selection_id for bet in bets]))
+            if len(placed) == 2:
+                done.set()
+
+        batcher = BetsBatcher(place, window_seconds=0.1)
+        for ticker_id, selection_id in [('1.1', 1), ('1.2', 5), ('1.1', 2), ('1.1', 3)]:
+            batcher.add(SimpleNamespace(ticker_id=ticker_id, selection_id=selection_id))
+        self.assertTrue(done.wait(5))
+        self.assertEqual(sorted(placed), [('1.1', [1, 2, 3]), ('1.2', [5])])
+
+
+if __name__ == '__main__':
+    ut.main()
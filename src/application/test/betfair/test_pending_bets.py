@@ -0,0 +1,65 @@
+""" Create unitest for the scheduler of pending bets with a fake exchange"""
+import unittest as ut
+import threading
+from types import SimpleNamespace
+from src.infrastructure.betfair.pending_bets import PendingBets
+
+
+def _bet(bet_id, ticker_id, quantity=10):
+    return SimpleNamespace(bet_id=bet_id, ticker_id=ticker_id, quantity=quantity, quantity_execute=0,
+                           quantity_left=quantity, filled_price=None, status='Pending', match_name='A v B',
+                           cancel_seconds=0)
+
+
+class FakeExchange(object):
+    def __init__(self):
+        self.calls = []
+        self.current = {'1': {'betId': '1', 'sizeMatched': 10, 'averagePriceMatched': 2.0},
+                        '2': {'betId': '2', 'sizeMatched': 4, 'averagePriceMatched': 2.1},
+                        '3': {'betId': '3', 'sizeMatched': 0, 'averagePriceMatched': 0}}
+        self.cleared = {'4': {'betId': '4', 'priceMatched': 1.9}}
+
+    def get_current_orders(self, bet_ids):
+        self.calls.append(('listCurrentOrders', sorted(bet_ids)))
+        return [self.current[bet_id] for bet_id in bet_ids if bet_id in self.current]
+
+    def cancel_orders(self, market_id, bet_ids):
+        self.calls.append(('cancelOrders', market_id, sorted(bet_ids)))
+        return {'status': 'SUCCESS', 'instructionReports': [{'status': 'SUCCESS', 'instruction': {'betId': bet_id}}
+                                                            for bet_id in bet_ids]}
+
+    def get_cleared_orders(self, bet_ids):
+        self.calls.append(('listClearedOrders', sorted(bet_ids)))
+        return [self.cleared[bet_id] for bet_id in bet_ids if bet_id in self.cleared]
+
+
+class TestPendingBets(ut.TestCase):
+    def test_batch_check(self):
+        exchange = FakeExchange()
+        updated = []
+        done = threading.Event()
+
+        def on_update(bet):
+            updated.append(bet)
+            if len(updated) == 4:
+                done.set()
+
+        pending = PendingBets(exchange.get_current_orders, exchange.cancel_orders, exchange.get_cleared_orders,
+                              on_update=on_update, batch_seconds=0.5)
+        bets = [_bet('1', '1.1'), _bet('2', '1.1'), _bet('3', '1.1'), _bet('4', '1.2')]
+        for bet in bets:
+            pending.add(bet, delay=0.05)
+        self.assertTrue(done.wait(5))
+        pending.stop()
+        # one request of each type for all the bets
+        self.assertEqual(exchange.calls, [('listCurrentOrders', ['1', '2', '3', '4']),
+                                          ('cancelOrders', '1.1', ['2', '3']),
+                                          ('listClearedOrders', ['4'])])
+        self.assertEqual([bet.status for bet in bets], ['Completed', 'Cancelled', 'Cancelled', 'Completed'])
+        self.assertEqual(bets[1].quantity_left, 6)
+        self.assertEqual(bets[3].filled_price, 1.9)
+        self.assertEqual(len(pending), 0)
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,50 @@
+""" Create unitest for the bets of a market placed together by the Betfair handler"""
+import unittest as ut
+
+try:
+    from src.infrastructure.betfair.betfair_handler import Trading
+    from src.domain.models.betting.bet import Bet
+except (ImportError, SystemExit):  # pika, requests not installed
+    Trading = None
+
+
+class _Client(object):
+    """ placeOrders failing as a whole when an instruction has the size of invalid_size"""
+    def __init__(self, invalid_size):
+        self.invalid_size = invalid_size
+        self.requests = []
+
+    def place_bets(self, market_id, bets):
+        self.requests.append([bet['selectionId'] for bet in bets])
+        if any(bet['limitOrder']['size'] == self.invalid_size for bet in bets):
+            return {'status': 'FAILURE', 'errorCode': 'BET_ACTION_ERROR', 'instructionReports': [
+                {'status': 'FAILURE', 'errorCode': 'INVALID_BET_SIZE' if bet['limitOrder']['size'] == self.invalid_size
+                 else 'ERROR_IN_ORDER'} for bet in bets]}
+        return {'status': 'SUCCESS', 'instructionReports': [
+            {'status': 'SUCCESS', 'betId': int(bet['selectionId']) * 10, 'sizeMatched': bet['limitOrder']['size'],
+             'averagePriceMatched': bet['limitOrder']['price']} for bet in bets]}
+
+
+@ut.skipIf(Trading is None, 'dependencies not installed')
+class TestSendOrders(ut.TestCase):
+    def test_error_in_order(self):
+        trading = Trading.__new__(Trading)  # without login
+        trading.client = _Client(invalid_size=0.5)
+        bets = [Bet(ticker_id='1.1', selection_id=s, action='back', odds=2.0, quantity=q, match_name='A v B')
+                for s, q in [(1, 10.0), (2, 0.5), (3, 5.0)]]
+        trading.send_orders('1.1', bets)
+        self.assertEqual(trading.client.requests, [['1', '2', '3'], ['1'], ['3']])
+        self.assertEqual([(bet.status, bet.bet_id) for bet in bets], [('Completed', 10), ('Failed', None),
+                                                                     ('Completed', 30)])
+        self.assertEqual(bets[1].error_description, 'INVALID_BET_SIZE')
+
+    def test_single_bet_not_sent_again(self):
+        trading = Trading.__new__(Trading)
+        trading.client = _Client(invalid_size=0.5)
+        bet = Bet(ticker_id='1.1', selection_id=2, action='back', odds=2.0, quantity=0.5, match_name='A v B')
+        trading.send_orders('1.1', [bet])
+        self.assertEqual((trading.client.requests, bet.status), ([['2']], 'Failed'))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,131 @@
+""" Create unitest for Betfair Exchange Stream API with a local mock stream server"""
+import unittest as ut
+import json
+import socketserver
+import threading
+from src.infrastructure.betfair.stream import BetfairStream, MarketCache, StreamError
+
+MARKET_ID = '1.200'
+IMAGE = {'op': 'mcm', 'initialClk': 'a1', 'clk': 'b1', 'pt': 1672574400000, 'ct': 'SUB_IMAGE',
+         'mc': [{'id': MARKET_ID, 'img': True, 'tv': 100.0,
+                 'marketDefinition': {'status': 'OPEN', 'inPlay': False, 'numberOfActiveRunners': 2,
+                                      'numberOfWinners': 1,
+                                      'runners': [{'id': 10, 'status': 'ACTIVE'}, {'id': 11, 'status': 'ACTIVE'}]},
+                 'rc': [{'id': 10, 'batb': [[0, 1.5, 20], [1, 1.49, 10]], 'batl': [[0, 1.52, 5]], 'ltp': 1.51},
+                        {'id': 11, 'batb': [[0, 2.9, 3]], 'batl': [[0, 3.0, 4]], 'ltp': 2.95}]}]}
+DELTA = {'op': 'mcm', 'clk': 'b2', 'pt': 1672574401000,
+         'mc': [{'id': MARKET_ID, 'tv': 120.0, 'rc': [{'id': 10, 'batb': [[0, 1.51, 7], [1, 0, 0]], 'ltp': 1.52}]}]}
+HEARTBEAT = {'op': 'mcm', 'clk': 'b3', 'pt': 1672574402000, 'ct': 'HEARTBEAT'}
+
+
+class MockStreamHandler(socketserver.StreamRequestHandler):
+    """ Answer as the betfair stream server: connection, authentication and subscription"""
+
+    def send(self, msg):
+        self.wfile.write(json.dumps(msg).encode('utf-8') + b'\r\n')
+
+    def handle(self):
+        self.send({'op': 'connection', 'connectionId': 'mock-1'})
+        for line in self.rfile:
+            msg = json.loads(line)
+            self.server.received.append(msg)
+            if msg['op'] == 'authentication':
+                if msg['session'] == 'token':
+                    self.send({'op': 'status', 'id': msg['id'], 'statusCode': 'SUCCESS'})
+                else:
+                    self.send({'op': 'status', 'id': msg['id'], 'statusCode': 'FAILURE',
+                               'errorCode': 'NO_SESSION', 'connectionClosed': True})
+                    return
+            elif msg['op'] == 'marketSubscription':
+                self.send({'op': 'status', 'id': msg['id'], 'statusCode': 'SUCCESS'})
+                for mcm in [IMAGE, DELTA, HEARTBEAT]:
+                    self.send(dict(mcm, id=msg['id']))
+
+
+class MockStreamServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), MockStreamHandler)
+        self.received = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class TestMarketCache(ut.TestCase):
+    def test_image_and_delta(self):
+        cache = MarketCache()
+        books = cache.update(IMAGE)
+        self.assertEqual(len(books), 1)
+        self.assertEqual([r['selectionId'] for r in books[0]['runners']], [10, 11])
+        self.assertEqual(books[0]['runners'][0]['ex']['availableToBack'],
+                         [{'price': 1.5, 'size': 20}, {'price': 1.49, 'size': 10}])
+        # just the runner changed is returned
+        books = cache.update(DELTA)
+        self.assertEqual([r['selectionId'] for r in books[0]['runners']], [10])
+        runner = books[0]['runners'][0]
+        self.assertEqual(runner['ex']['availableToBack'], [{'price': 1.51, 'size': 7}])
+        self.assertEqual(runner['lastPriceTraded'], 1.52)
+        self.assertEqual(books[0]['totalMatched'], 120.0)
+        self.assertEqual(books[0]['lastMatchTime'], '2023-01-01T12:00:01.000Z')
+        self.assertEqual(cache.clk, 'b2')
+        # heartbeat does not change books
+        self.assertEqual(cache.update(HEARTBEAT), [])
+
+
+class TestBetfairStream(ut.TestCase):
+    def setUp(self):
+        self.server = MockStreamServer()
+        self.port = self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_subscribe_and_read(self):
+        stream = BetfairStream(app_key='key', session_token='token', host='127.0.0.1', port=self.port,
+                               use_ssl=False, timeout=5)
+        stream.connect()
+        self.assertEqual(stream.connection_id, 'mock-1')
+        stream.subscribe([MARKET_ID])
+        books = []
+        while len(books) < 2:
+            books.extend(stream.read())
+        stream.close()
+        self.assertEqual(books[0]['marketId'], MARKET_ID)
+        self.assertEqual(len(books[1]['runners']), 1)
+        subscription = self.server.received[1]
+        self.assertEqual(subscription['marketFilter']['marketIds'], [MARKET_ID])
+
+    def test_reconnect_with_clocks(self):
+        stream = BetfairStream(app_key='key', session_token='token', host='127.0.0.1', port=self.port,
+                               use_ssl=False, timeout=5)
+        stream.connect()
+        stream.subscribe([MARKET_ID])
+        for _ in range(3):  # status of the subscription, image and delta
+            stream.read()
+        stream.reconnect(session_token='token')
+        stream.read()
+        stream.close()
+        subscriptions = [msg for msg in self.server.received if msg['op'] == 'marketSubscription']
+        self.assertEqual(len(subscriptions), 2)
+        self.assertNotIn('initialClk', subscriptions[0])
+        self.assertEqual((subscriptions[1]['initialClk'], subscriptions[1]['clk']), ('a1', 'b2'))
+        self.assertEqual(subscriptions[1]['marketFilter']['marketIds'], [MARKET_ID])
+        self.assertIn(MARKET_ID, stream.cache.markets)  # the cache is kept
+
+    def test_authentication_error(self):
+        stream = BetfairStream(app_key='key', session_token='expired', host='127.0.0.1', port=self.port,
+                               use_ssl=False, timeout=5)
+        with self.assertRaises(StreamError) as error:
+            stream.connect()
+        self.assertEqual(error.exception.error_code, 'NO_SESSION')
+        stream.close()
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,56 @@
+""" Create unitest for the bars back filled with REST after a reconnection of the websocket"""
+import unittest as ut
+import datetime as dt
+from types import SimpleNamespace
+
+try:
+    import pytz
+    from src.application.bots.crypto_trading.ccxt.provider_ccxt import ProviderCCXT
+    from src.domain.services.bar_aggregator import BarAggregator
+except ImportError:  # ccxt, pika not installed
+    ProviderCCXT = None
+
+HOUR_MS = 3600 * 1000
+
+
+class _Exchange(object):
+    """ Closed candles every period from since"""
+    id = 'fake'
+
+    def __init__(self):
+        self.requests = []
+
+    def fetch_ohlcv(self, symbol, timeframe, since):
+        self.requests.append((timeframe, since))
+        period_ms = 60000 if timeframe == '1m' else HOUR_MS
+        return [[since + i * period_ms, 1.0, 1.0, 1.0, 1.0, 0.0] for i in range(2)]
+
+
+@ut.skipIf(ProviderCCXT is None, 'dependencies not installed')
+class TestBackFill(ut.TestCase):
+    def test_each_interval_from_its_last_bar(self):
+        provider = ProviderCCXT.__new__(ProviderCCXT)  # without connection
+        provider.symbols = ['BTC-USDT']
+        provider.timeframes = ['1m', '1h']
+        provider.last_bar = {'BTC-USDT': None}
+        provider.last_bars = {}
+        provider.trading = SimpleNamespace(client=_Exchange())
+        provider.bar_aggregator = BarAggregator(timeframes=provider.timeframes, symbols=provider.symbols)
+        published = []
+        provider.emit = SimpleNamespace(publish_event=lambda event, bar: published.append((bar.freq, bar.datetime)))
+        provider.health_handler = SimpleNamespace(check=lambda: None)
+        hour = dt.datetime(2023, 1, 2, 10, tzinfo=pytz.UTC)
+        provider._publish_bar('BTC-USDT', hour, '1h', 1.0, 1.0, 1.0, 1.0, 0.0, verbose=False)
+        provider._publish_bar('BTC-USDT', hour + dt.timedelta(minutes=59), '1m', 1.0, 1.0, 1.0, 1.0, 0.0,
+                              verbose=False)
+        published.clear()
+        provider._back_fill()
+        hour_ms = int(hour.timestamp() * 1000)
+        self.assertEqual(provider.trading.client.requests, [('1m', hour_ms + HOUR_MS), ('1h', hour_ms + HOUR_MS)])
+        # the hourly bar after the last one published is not skipped
+        self.assertIn(('1h', hour + dt.timedelta(hours=1)), published)
+        self.assertEqual(provider.last_bars[('BTC-USDT', '1h')].datetime, hour + dt.timedelta(hours=2))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,134 @@
+""" Create unitest for the pacing of the requests and the last bars of the exchanges with a virtual clock"""
+import unittest as ut
+import threading
+from src.infrastructure.crypto.pacing import RatePacer
+from src.domain.services.stats.latency import LatencyStats
+
+try:
+    import ccxt
+    from src.infrastructure.crypto.exchange_handler import Trading
+except ImportError:  # ccxt, pika not installed
+    Trading = None
+
+
+class _Clock(object):
+    """ Virtual time, sleeping advances the clock"""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.sleeps.append(round(seconds, 6))
+            self.now += seconds
+
+
+class _Exchange(object):
+    """ Client answering after latency seconds, the symbols of errors raise it always"""
+    id = 'fake'
+
+    def __init__(self, clock, latency=0.05, errors=None):
+        self.clock = clock
+        self.latency = latency
+        self.errors = {} if errors is None else errors
+        self.requests = []
+
+    def fetch_ohlcv(self, symbol, timeframe, since, limit):
+        self.requests.append((round(self.clock(), 6), symbol))
+        self.clock.now += self.latency
+        if symbol in self.errors:
+            raise self.errors[symbol]
+        return [[60000, 1.0, 2.0, 0.5, 1.5, 10.0], [120000, 1.5, 1.5, 1.5, 1.5, 0.0]][:limit]
+
+    @staticmethod
+    def iso8601(timestamp):
+        return f'1970-01-01T00:{timestamp // 60000:02d}:00.000Z'
+
+
+class TestRatePacer(ut.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.pacer = RatePacer(interval=0.5, max_interval=2.0, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_spacing(self):
+        for _ in range(4):
+            self.assertTrue(self.pacer.wait())
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5, 0.5])
+        self.assertEqual(self.clock(), 1.5)
+
+    def test_deadline(self):
+        self.assertTrue(self.pacer.wait(deadline=0.6))
+        self.assertTrue(self.pacer.wait(deadline=0.6))
+        self.assertFalse(self.pacer.wait(deadline=0.6))  # turn at 1.0, without waiting
+        self.assertEqual(self.clock(), 0.5)
+        self.assertTrue(self.pacer.wait(deadline=1.0))  # the turn missed is not reserved
+
+    def test_throttled(self):
+        self.pacer.wait()
+        self.pacer.throttled()
+        self.pacer.throttled()
+        self.pacer.throttled()
+        self.assertEqual(self.pacer.interval, 2.0)  # limited to max_interval
+        self.pacer.wait()
+        self.assertEqual(self.clock(), 2.0)
+        for _ in range(20):
+            self.pacer.success()
+        self.assertEqual(self.pacer.interval, 0.5)
+
+
+@ut.skipIf(Trading is None, 'dependencies not installed')
+class TestLastBars(ut.TestCase):
+    def _trading(self, **exchange):
+        self.clock = _Clock()
+        trading = Trading.__new__(Trading)  # without connection
+        trading.client = _Exchange(self.clock, **exchange)
+        trading.pacer = RatePacer(interval=0.1, clock=self.clock, sleep=self.clock.sleep)
+        trading.pool_ohlcv = None
+        trading.ohlcv_latency = LatencyStats()
+        trading.ohlcv_missed = {}
+        return trading
+
+    def test_last_bars(self):
+        trading = self._trading()
+        bars = list(trading.get_last_bars('1m', ['BTC-USDT', 'ETH-USDT', 'XRP-USDT'], max_workers=1))
+        self.assertEqual(sorted(bar['symbol'] for bar in bars), ['BTC-USDT', 'ETH-USDT', 'XRP-USDT'])
+        self.assertEqual(bars[0]['candle'], [60000, 1.0, 2.0, 0.5, 1.5, 10.0])  # the closed candle
+        self.assertEqual(bars[0]['datetime'], '1970-01-01T00:01:00.000Z')
+        times = [t for t, _ in trading.client.requests]
+        for before, after in zip(times, times[1:]):
+            self.assertGreaterEqual(after - before, 0.1 - 1e-9)
+        stats = trading.get_last_bars_stats()
+        self.assertEqual(stats['BTC-USDT']['missed'], 0)
+        self.assertAlmostEqual(stats['BTC-USDT']['latency']['max'], 0.05)
+
+    def test_missed_deadline(self):
+        trading = self._trading(errors={'ETH-USDT': ccxt.RateLimitExceeded('429'),
+                                        'XRP-USDT': ccxt.NetworkError('timeout')})
+        rounds = []
+        for _ in range(2):
+            start = trading.pacer.clock()
+            bars = list(trading.get_last_bars('1m', ['BTC-USDT', 'ETH-USDT', 'XRP-USDT'], max_workers=1,
+                                              deadline_seconds=3))
+            self.assertEqual([bar['symbol'] for bar in bars], ['BTC-USDT'])
+            rounds.append([(t - start, symbol) for t, symbol in trading.client.requests if t >= start])
+        self.assertEqual(trading.ohlcv_missed, {'ETH-USDT': 2, 'XRP-USDT': 2})
+        self.assertEqual(trading.get_last_bars_stats()['ETH-USDT'], {'latency': None, 'missed': 2})
+        # the requests stop at the deadline and the rate limit errors spread them
+        self.assertLessEqual(max(t for t, _ in rounds[0]), 3.0)
+        eth = [t for t, symbol in rounds[0] if symbol == 'ETH-USDT']
+        self.assertGreater(eth[-1] - eth[-2], eth[1] - eth[0])
+
+    def test_error_not_retried(self):
+        trading = self._trading(errors={'ETH-USDT': ccxt.BadSymbol('not listed')})
+        bars = list(trading.get_last_bars('1m', ['BTC-USDT', 'ETH-USDT'], max_workers=1, deadline_seconds=3))
+        self.assertEqual([bar['symbol'] for bar in bars], ['BTC-USDT'])
+        self.assertEqual([symbol for _, symbol in trading.client.requests].count('ETH-USDT'), 1)
+        self.assertEqual(trading.ohlcv_missed, {'ETH-USDT': 1})
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,54 @@
+""" Create unitest for the tracker of the status of the orders"""
+import unittest as ut
+import datetime as dt
+from types import SimpleNamespace
+from src.infrastructure.crypto.order_tracker import OrderTracker
+
+
+class _Client(object):
+    def __init__(self):
+        self.open = {}
+        self.closed = {}
+        self.requests = []
+
+    def fetch_open_orders(self, symbol):
+        self.requests.append(('open', symbol))
+        return [r for r in self.open.values() if r['symbol'] == symbol]
+
+    def fetch_closed_orders(self, symbol, since=None):
+        self.requests.append(('closed', symbol))
+        return [r for r in self.closed.values() if r['symbol'] == symbol]
+
+
+def _order(_id, ticker):
+    return SimpleNamespace(order_id_receiver=_id, order_id_sender=f's{_id}', ticker=ticker, status='open',
+                           quantity_execute=None, quantity_left=None, filled_price=None, commission_fee=None,
+                           fee_currency=None, datetime_in=dt.datetime(2023, 1, 1))
+
+
+class TestOrderTracker(ut.TestCase):
+    def test_only_transitions(self):
+        client = _Client()
+        changes = []
+        tracker = OrderTracker(client, on_change=lambda o: changes.append((o.order_id_receiver, o.status,
+                                                                           o.quantity_execute)))
+        for _id, ticker in [('1', 'BTC-USDT'), ('2', 'BTC-USDT'), ('3', 'ETH-USDT')]:
+            tracker.add(_order(_id, ticker))
+            client.open[_id] = {'id': _id, 'symbol': ticker, 'status': 'open', 'filled': 0.0, 'remaining': 1.0}
+        tracker.poll()
+        self.assertEqual(len(changes), 3)
+        # one request by symbol, nothing changed
+        client.requests.clear()
+        self.assertEqual(tracker.poll(), [])
+        self.assertEqual(sorted(client.requests), [('open', 'BTC-USDT'), ('open', 'ETH-USDT')])
+        # partial fill and a cancellation
+        client.open['1']['filled'], client.open['1']['remaining'] = 0.4, 0.6
+        client.closed['3'] = dict(client.open.pop('3'), status='canceled')
+        changes.clear()
+        tracker.poll()
+        self.assertEqual(sorted(changes), [('1', 'open', 0.4), ('3', 'cancelled', 0.0)])
+        self.assertEqual(sorted(o.order_id_receiver for o in tracker.get_open_orders()), ['1', '2'])
+
+
+if __name__ == '__main__':
+    ut.main()
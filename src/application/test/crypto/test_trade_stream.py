@@ -0,0 +1,75 @@
+""" Create unitest for the websocket stream of trades with a local websocket server"""
+import unittest as ut
+import base64
+import hashlib
+import json
+import socketserver
+import threading
+try:
+    import websocket
+    from src.infrastructure.crypto.stream import BinanceAdapter, TradeStream
+except ImportError:
+    websocket = None
+
+TRADES = [{'stream': 'btcusdt@trade', 'data': {'e': 'trade', 's': 'BTCUSDT', 'T': 1660000000000,
+                                                'p': '24000.5', 'q': '0.01'}},
+          {'stream': 'ethusdt@trade', 'data': {'e': 'trade', 's': 'ETHUSDT', 'T': 1660000000500,
+                                                'p': '1900.25', 'q': '2'}}]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """ Handshake and send the trades in unmasked text frames"""
+
+    def handle(self):
+        headers = {}
+        line = self.rfile.readline()
+        while line not in (b'\r\n', b''):
+            line = self.rfile.readline()
+            if b':' in line:
+                name, value = line.decode().split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] +
+                                                '258EAFA5-E914-47DA-95CA-C5AB0DC85B11').encode()).digest())
+        self.wfile.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                         b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        for msg in TRADES:
+            payload = json.dumps(msg).encode()
+            self.wfile.write(bytes([0x81, len(payload)]) + payload)
+        self.server.sent.wait(5)
+
+
+@ut.skipIf(websocket is None, 'websocket-client not installed')
+class TestTradeStream(ut.TestCase):
+    def setUp(self):
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.sent = threading.Event()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.sent.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_trades(self):
+        received = []
+        adapter = BinanceAdapter(['BTC-USDT', 'ETH-USDT'], base_url=f'ws://127.0.0.1:{self.server.server_address[1]}')
+        stream = None
+
+        def on_trades(trades):
+            received.extend(trades)
+            if len(received) == 2:
+                stream.stop()
+                self.server.sent.set()
+
+        stream = TradeStream(adapter, on_trades=on_trades, timeout=0.5)
+        thread = threading.Thread(target=stream.run, daemon=True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(received, [('BTC-USDT', 1660000000.0, 24000.5, 0.01),
+                                    ('ETH-USDT', 1660000000.5, 1900.25, 2.0)])
+
+
+if __name__ == '__main__':
+    ut.main()
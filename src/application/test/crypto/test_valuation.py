@@ -0,0 +1,44 @@
+""" Create unitest for the valuation of the crypto balances"""
+import unittest as ut
+from src.infrastructure.crypto.valuation import Valuation
+
+
+class _Client(object):
+    def __init__(self, prices):
+        self.prices = prices
+        self.requests = []
+
+    def load_markets(self):
+        return {symbol: {} for symbol in self.prices}
+
+    def fetch_ticker(self, symbol):
+        self.requests.append(symbol)
+        return {'symbol': symbol, 'last': self.prices[symbol], 'close': self.prices[symbol]}
+
+
+class TestValuation(ut.TestCase):
+    def setUp(self):
+        self.client = _Client({'BTC/USDT': 20000.0, 'ETH/USDT': 1500.0, 'XYZ/BTC': 0.001, 'USDT/TRY': 20.0,
+                               'DOGE/USDT': 0.1})
+        self.valuation = Valuation(self.client, ttl_seconds=60)
+
+    def test_routes(self):
+        values = self.valuation.value({'USDT': 100.0, 'BTC': 0.5, 'XYZ': 10.0, 'TRY': 200.0, 'ABC': 1.0,
+                                       'DOGE': 0.0})
+        self.assertEqual(values['USDT'], 100.0)
+        self.assertEqual(values['BTC'], 10000.0)
+        self.assertAlmostEqual(values['XYZ'], 200.0)  # through BTC
+        self.assertAlmostEqual(values['TRY'], 10.0)  # inverse market
+        self.assertIsNone(values['ABC'])
+        self.assertNotIn('DOGE', values)
+        # only the symbols needed are asked
+        self.assertEqual(sorted(self.client.requests), ['BTC/USDT', 'USDT/TRY', 'XYZ/BTC'])
+
+    def test_prices_cached(self):
+        self.valuation.total({'BTC': 1.0, 'ETH': 1.0})
+        self.assertAlmostEqual(self.valuation.total({'BTC': 1.0, 'ETH': 2.0}), 23000.0)
+        self.assertEqual(len(self.client.requests), 2)
+
+
+if __name__ == '__main__':
+    ut.main()
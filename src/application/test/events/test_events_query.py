@@ -0,0 +1,81 @@
+""" Create unitest for the queries over the events saved by event_keeper"""
+import unittest as ut
+import datetime as dt
+from src.infrastructure.events_query import EventsQuery
+
+
+class _Cursor(list):
+    def sort(self, key, direction):
+        return _Cursor(sorted(self, key=lambda d: d[key], reverse=direction < 0))
+
+    def limit(self, n):
+        return _Cursor(self[:n])
+
+
+class _Collection(object):
+    """ Equality and datetime range filters of find"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = 0
+
+    def find(self, query, projection=None):
+        self.queries += 1
+        return _Cursor(dict(d) for d in self.documents if self._match(d, query))
+
+    def distinct(self, field, query):
+        return sorted({d[field] for d in self.documents if self._match(d, query)})
+
+    @staticmethod
+    def _match(document, query):
+        for key, value in query.items():
+            if isinstance(value, dict):
+                if '$gte' in value and not document[key] >= value['$gte']:
+                    return False
+                if '$lt' in value and not document[key] < value['$lt']:
+                    return False
+            elif document.get(key) != value:
+                return False
+        return True
+
+
+class TestEventsQuery(ut.TestCase):
+    def setUp(self):
+        today = dt.datetime.utcnow()
+        self.today = dt.datetime(today.year, today.month, today.day)
+        self.yesterday = self.today - dt.timedelta(days=1)
+        documents = [{'event_type': 'bar', 'ticker': 'EURUSD', 'close': 1.0 + i / 10,
+                      'datetime': self.yesterday + dt.timedelta(hours=6 * i)} for i in range(6)]
+        documents += [{'event_type': 'order', 'ticker': 'EURUSD', 'status': 'filled', 'portfolio_name': 'p1',
+                       'datetime': self.yesterday + dt.timedelta(hours=1)},
+                      {'event_type': 'order', 'ticker': 'EURUSD', 'status': 'cancelled', 'portfolio_name': 'p1',
+                       'datetime': self.yesterday + dt.timedelta(hours=2)}]
+        self.collection = _Collection(documents)
+        self.events = EventsQuery(self.collection)
+
+    def test_range_and_filters(self):
+        bars = self.events.find_documents('bar', ticker='EURUSD', start=self.yesterday + dt.timedelta(hours=6))
+        self.assertEqual([b['close'] for b in bars], [1.1, 1.2, 1.3, 1.4, 1.5])
+        orders = self.events.find_documents('order', portfolio_name='p1', status='filled', start=self.yesterday)
+        self.assertEqual(len(orders), 1)
+        self.assertEqual(self.events.last('bar', ticker='EURUSD')['close'], 1.5)
+        self.assertIsNone(self.events.last('bar', ticker='GBPUSD'))
+
+    def test_cache_closed_days(self):
+        self.events.find_documents('bar', ticker='EURUSD', start=self.yesterday)
+        queries = self.collection.queries
+        bars = self.events.find_documents('bar', ticker='EURUSD', start=self.yesterday)
+        # yesterday from the cache, today from the database
+        self.assertEqual(self.collection.queries, queries + 1)
+        self.assertEqual((self.events.hits, self.events.misses), (1, 1))
+        self.assertEqual(len(bars), 6)
+
+    def test_distinct_without_cache(self):
+        self.assertEqual(self.events.distinct('status', 'order', start=self.yesterday), ['cancelled', 'filled'])
+        orders = self.events.find_documents('order', status='filled', start=self.yesterday, cache=False)
+        self.assertEqual(len(orders), 1)
+        self.assertEqual((self.events.misses, len(self.events._cache)), (0, 0))
+
+
+if __name__ == '__main__':
+    ut.main()
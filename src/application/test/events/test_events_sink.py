@@ -0,0 +1,73 @@
+""" Create unitest for the sink of events in batches"""
+import unittest as ut
+import datetime as dt
+from types import SimpleNamespace
+from src.infrastructure.events_sink import EventSink, ensure_ttl_index
+
+
+class _Collection(object):
+    def __init__(self):
+        self.batches = []
+
+    def insert_many(self, documents, ordered=True):
+        self.batches.append(documents)
+
+
+class TestEventSink(ut.TestCase):
+    def test_batches_flushed_on_close(self):
+        collection = _Collection()
+        sink = EventSink(collection, batch_size=3, flush_seconds=10)
+        for i in range(4):
+            sink.put(SimpleNamespace(event_type='bar', ticker='EURUSD', close=1.0 + i,
+                                     datetime=dt.datetime(2023, 1, 1, 0, i)))
+        sink.put(SimpleNamespace(event_type='health', ticker='provider', datetime=dt.datetime(2023, 1, 1),
+                                 extra=object()))
+        sink.close()
+        self.assertEqual(sink.inserted, 5)
+        self.assertEqual(len(collection.batches[0]), 3)
+        self.assertEqual([d['close'] for batch in collection.batches for d in batch if d['event_type'] == 'bar'],
+                         [1.0, 2.0, 3.0, 4.0])
+        health = [d for batch in collection.batches for d in batch if d['event_type'] == 'health'][0]
+        self.assertIsInstance(health['extra'], str)
+
+
+class _IndexedCollection(object):
+    name = 'events'
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+        self.commands = []
+        self.database = self
+
+    def index_information(self):
+        return dict(self.indexes)
+
+    def drop_index(self, name):
+        self.indexes.pop(name)
+
+    def create_index(self, keys, name, **options):
+        if name in self.indexes:  # as mongodb, same name with other options
+            raise ValueError('IndexOptionsConflict')
+        self.indexes[name] = dict(key=keys, **options)
+
+    def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+
+class TestTTLIndex(ut.TestCase):
+    def test_plain_index_replaced(self):
+        collection = _IndexedCollection({'datetime_1': {'key': [('datetime', 1)]}})
+        ensure_ttl_index(collection, 3600)
+        self.assertEqual(collection.indexes['datetime_1']['expireAfterSeconds'], 3600)
+        ensure_ttl_index(collection, 3600)  # nothing to do
+        self.assertEqual(collection.commands, [])
+
+    def test_retention_changed(self):
+        collection = _IndexedCollection({'datetime_1': {'key': [('datetime', 1)], 'expireAfterSeconds': 3600}})
+        ensure_ttl_index(collection, 7200)
+        self.assertEqual(collection.commands[0][0], ('collMod', 'events'))
+        self.assertEqual(collection.commands[0][1]['index']['expireAfterSeconds'], 7200)
+
+
+if __name__ == '__main__':
+    ut.main()
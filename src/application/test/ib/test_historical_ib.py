@@ -0,0 +1,103 @@
+""" Create unitest for the asynchronous historical downloader of IB"""
+import unittest as ut
+import asyncio
+import datetime as dt
+from types import SimpleNamespace
+from src.infrastructure.ib.historical_ib import HistoricalIB, IBPacing, windows, to_frame
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+
+class _Clock(object):
+    """ Virtual time, sleeping advances the clock"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+class _IB(object):
+    def __init__(self, clock, errors=None):
+        self.clock = clock
+        self.requests = []
+        self.errors = {} if errors is None else errors  # key: endDateTime, value: failed requests
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH,
+                                     formatDate):
+        self.requests.append((self.clock(), contract.symbol, endDateTime))
+        await asyncio.sleep(0)
+        if self.errors.get(endDateTime, 0) > 0:
+            self.errors[endDateTime] -= 1
+            raise ConnectionError('Historical Market Data Service error')
+        end = dt.datetime.strptime(endDateTime, "%Y%m%d %H:%M:%S")
+        return [SimpleNamespace(date=(end - dt.timedelta(days=d)).date(), open=1.0, high=2.0, low=0.5, close=1.5,
+                                volume=10.0) for d in range(int(durationStr.split()[0]))][::-1]
+
+
+class TestHistoricalIB(ut.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.client = _IB(self.clock)
+        self.pacing = IBPacing(max_requests=5, period=60, clock=self.clock, sleep=self.clock.sleep)
+        self.historical = HistoricalIB(self.client, pacing=self.pacing, window_days=10, max_concurrent=3)
+
+    def test_pages_in_order(self):
+        contracts = {s: SimpleNamespace(symbol=s, exchange='SMART') for s in ['AAPL', 'MSFT']}
+        start, end = dt.datetime(2023, 1, 1), dt.datetime(2023, 2, 1)
+        pages = asyncio.run(self.historical.get_pages(contracts, 1, 'day', start, end))
+        n_windows = len(windows(start, end, 10))
+        self.assertEqual(n_windows, 4)
+        for symbol in contracts:
+            dates = [b.date for bars in pages[symbol] for b in bars]
+            self.assertEqual(len(pages[symbol]), n_windows)
+            self.assertEqual(dates, sorted(dates))
+        # the symbols are interleaved and no more than 5 requests in 60 seconds
+        times = [r[0] for r in self.client.requests]
+        self.assertEqual([r[1] for r in self.client.requests[:2]], ['AAPL', 'MSFT'])
+        self.assertEqual(len(times), 2 * n_windows)
+        for i in range(len(times) - 5):
+            self.assertGreaterEqual(times[i + 5] - times[i], 60)
+
+    def test_retry_window(self):
+        contracts = {'AAPL': SimpleNamespace(symbol='AAPL', exchange='SMART')}
+        start, end = dt.datetime(2023, 1, 1), dt.datetime(2023, 1, 21)
+        self.client.errors = {'20230111 00:00:00': 2}
+        pages = asyncio.run(self.historical.get_pages(contracts, 1, 'day', start, end))
+        self.assertEqual([len(bars) for bars in pages['AAPL']], [10, 10, 1])
+        retries = [r[0] for r in self.client.requests if r[2] == '20230111 00:00:00']
+        self.assertEqual(len(retries), 3)
+        self.assertGreaterEqual(retries[2] - retries[1], 15)  # identical requests paced
+
+    def test_failed_window_raised(self):
+        contracts = {'AAPL': SimpleNamespace(symbol='AAPL', exchange='SMART')}
+        self.client.errors = {'20230111 00:00:00': 3}
+        with self.assertRaises(ConnectionError):
+            asyncio.run(self.historical.get_pages(contracts, 1, 'day', dt.datetime(2023, 1, 1),
+                                                  dt.datetime(2023, 1, 21)))
+
+    def test_pacing_rules(self):
+        pacing = IBPacing(clock=self.clock, sleep=self.clock.sleep)
+        turns = [pacing.next_turn(('ES', i), 'ES') for i in range(6)]
+        self.assertEqual(turns[:5], [0.0] * 5)
+        self.assertEqual(turns[5], 2.0)  # 6 requests of the same contract within 2 seconds
+        self.assertEqual(pacing.next_turn(('ES', 0), 'ES'), 15.0)  # identical request
+
+    @ut.skipIf(pandas is None, 'pandas not installed')
+    def test_to_frame(self):
+        bar = lambda h: SimpleNamespace(date=dt.datetime(2023, 1, 2, h, tzinfo=dt.timezone.utc), open=1.0, high=2.0,
+                                        low=0.5, close=1.5, volume=10.0)
+        df = to_frame([[bar(1), bar(2)], [bar(2), bar(3)]], 'AAPL', 'hour')
+        self.assertEqual(list(df.index), [dt.datetime(2023, 1, 2, h) for h in [1, 2, 3]])
+        self.assertEqual(df['freq'].iloc[0], 'hour')
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,58 @@
+""" Create unitest for the orders sent by the MT4 broker"""
+import unittest as ut
+from unittest import mock
+from types import SimpleNamespace
+
+try:
+    from src.application.bots.financial_trading.mt4 import broker_mt4
+except ImportError:  # zmq, pika, arctic not installed
+    broker_mt4 = None
+
+
+class FakeTrading(object):
+    def __init__(self, *args, **kwargs):
+        self.emit_orders = SimpleNamespace(publish_event=lambda topic, event: None)
+        self.trades = {}
+        self.sent = []
+
+    def start_update_orders_status(self):
+        pass
+
+    def get_trades(self):
+        return self.trades
+
+    def send_order(self, order):  # the order is changed between legs
+        self.sent.append((order.order_id_sender, order.action_mt4, order.quantity, order.order_id_receiver))
+
+
+def _order(order_id_sender, action, quantity):
+    return SimpleNamespace(event_type='order', ticker='EURUSD', contract='EURUSD', datetime=None, type='market',
+                           action=action, quantity=quantity, order_id_sender=order_id_sender, order_id_receiver=None)
+
+
+@ut.skipIf(broker_mt4 is None, 'dependencies not installed')
+class TestBrokerMT4(ut.TestCase):
+    def setUp(self):
+        patches = [mock.patch.object(broker_mt4, name) for name in ['Health_Handler', 'Emit_Events', 'Universe']]
+        patches += [mock.patch.object(broker_mt4, 'Trading', FakeTrading),
+                    mock.patch.multiple(broker_mt4.conf, NETTING_ORDERS=1, SEND_ORDERS_BROKER_MT4=1)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.broker = broker_mt4.BrokerMT4()
+
+    def test_orders_not_netted(self):
+        self.assertIsInstance(self.broker.trading.emit_orders, SimpleNamespace)
+        self.broker.send_broker(_order('1_0', 'buy', 2))
+        self.broker.send_broker(_order('2_0', 'sell', 1))
+        self.assertEqual(self.broker.trading.sent, [('1_0', 'normal', 2, None), ('2_0', 'normal', 1, None)])
+
+    def test_close_opposite_trades(self):
+        self.broker.trading.trades = {'10': {'_symbol': 'EURUSD', '_type': 1, '_lots': 1},
+                                      '11': {'_symbol': 'EURUSD', '_type': 1, '_lots': 3}}
+        self.broker.send_broker(_order('1_0', 'buy', 2))
+        self.assertEqual(self.broker.trading.sent, [('1_0', 'close_trade', 2, '10'), ('1_0', 'close_partial', 1, '11')])
+
+
+if __name__ == '__main__':
+    ut.main()
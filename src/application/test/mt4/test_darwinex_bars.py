@@ -0,0 +1,62 @@
+""" Create unitest for the resampler of the tick data of Darwinex"""
+import unittest as ut
+import datetime as dt
+from src.infrastructure.mt4.darwinex_bars import DarwinexBars, days
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+class _DarwinexTicks(object):
+    """ Ticks of 2023-01-02 and 2023-01-04, without files on 2023-01-03"""
+    def __init__(self, error_day=None):
+        self.requests = []
+        self.error_day = error_day
+
+    def list_of_files(self, asset):
+        return pd.DataFrame({'date': ['2023-01-02', '2023-01-02', '2023-01-04', '2023-01-04']})
+
+    def ticks_from_darwinex(self, ticker, start=None, end=None):
+        self.requests.append(start)
+        if start == self.error_day:
+            raise ConnectionError('Connection reset by peer')
+        index = pd.DatetimeIndex([f'{start} 10:00:05', f'{start} 10:00:40', f'{start} 10:02:10'], tz='UTC')
+        first_ask = None if start == '2023-01-04' else 1.2
+        return pd.DataFrame({'Ask': [first_ask, 1.4, None], 'Bid': [1.0, 1.2, 1.1], 'Ask_size': [1.0, 1.0, None],
+                             'Bid_size': [2.0, 2.0, 1.0]}, index=index)
+
+
+class TestDarwinexBars(ut.TestCase):
+    def test_days(self):
+        self.assertEqual(days(dt.datetime(2023, 1, 30, 12), dt.datetime(2023, 2, 1)),
+                         ['2023-01-30', '2023-01-31', '2023-02-01'])
+
+    @ut.skipIf(pd is None, 'pandas not installed')
+    def test_bars_by_day(self):
+        connection = _DarwinexTicks()
+        resampler = DarwinexBars(lambda: connection, timeframe='1min')
+        pages = list(resampler.iter_days('EURUSD', dt.datetime(2023, 1, 2), dt.datetime(2023, 1, 4, 23)))
+        self.assertEqual(connection.requests, ['2023-01-02', '2023-01-04'])  # 2023-01-03 without files
+        self.assertEqual(len(pages), 2)
+        bars = pages[0]
+        self.assertEqual(list(bars.index), [dt.datetime(2023, 1, 2, 10, m) for m in range(3)])
+        self.assertEqual(list(bars[['open', 'high', 'low', 'close']].iloc[0].round(6)), [1.1, 1.3, 1.1, 1.3])
+        self.assertEqual(bars['volume'].tolist(), [6.0, 0.0, 1.0])
+        self.assertEqual(list(bars[['open', 'close', 'ask']].iloc[1].round(6)), [1.3, 1.3, 1.4])  # minute without ticks
+        self.assertAlmostEqual(bars['close'].iloc[2], 1.25)
+        # the first tick of the second day without ask takes the last ask of the first day
+        self.assertAlmostEqual(pages[1]['open'].iloc[0], 1.2)
+
+    @ut.skipIf(pd is None, 'pandas not installed')
+    def test_error_raised(self):
+        resampler = DarwinexBars(lambda: _DarwinexTicks(error_day='2023-01-04'), timeframe='1min')
+        pages = resampler.iter_days('EURUSD', dt.datetime(2023, 1, 2), dt.datetime(2023, 1, 4, 23))
+        self.assertEqual(len(next(pages)), 3)
+        with self.assertRaises(ConnectionError):  # the day is not skipped
+            next(pages)
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,141 @@
+""" Create unitest for the correlation of the commands and responses of MT4 with fake PUSH/PULL sockets"""
+import unittest as ut
+import itertools
+import threading
+import time
+from collections import deque
+
+try:
+    import zmq
+    from src.infrastructure.mt4.mt_zeromq_connector import MTZeroMQConnector
+    from src.infrastructure.mt4.mt4_handler import Trading
+    from src.domain.services.stats.latency import LatencyStats
+except ImportError:  # zmq, darwinex_ticks, pika not installed
+    MTZeroMQConnector = None
+
+RESPONSES = {'GET_BALANCE': lambda n: {'_action': 'GET_BALANCE', '_info': {'_equity': 1000.0 + n}},
+             'GET_POSITION': lambda n: {'_action': 'GET_POSITION', 't': {str(n): ['EURUSD', 0.01, 0]}},
+             'GET_OPEN_TRADES': lambda n: {'_action': 'OPEN_TRADES', '_trades': {str(n): {'_lots': 0.01}}},
+             'OPEN': lambda n: {'_action': 'EXECUTION', '_ticket': n}}
+
+
+class _Pull(object):
+    def __init__(self):
+        self.messages = deque()
+
+    def recv_string(self, flags=0):
+        try:
+            return self.messages.popleft()
+        except IndexError:
+            raise zmq.error.Again()
+
+
+class _Poller(object):
+    def __init__(self, pull):
+        self.pull = pull
+
+    def poll(self, timeout):
+        if self.pull.messages:
+            return [(self.pull, zmq.POLLIN)]
+        time.sleep(0.001)
+        return []
+
+
+class _EA(object):
+    """ PUSH socket of the commands to MetaTrader.
+    The responses of every batch of commands are sent in reverse order, with the request id if echo_id."""
+    def __init__(self, pull, batch=1, echo_id=True, drop=()):
+        self.pull = pull
+        self.batch = batch
+        self.echo_id = echo_id
+        self.drop = list(drop)  # actions without response
+        self.commands = []
+        self._pending = []
+
+    def send_string(self, msg):
+        fields = msg.split(';')
+        action, _id = fields[1], fields[-1]
+        self.commands.append(action)
+        response = RESPONSES[action](int(_id))
+        if self.echo_id:
+            response['_id'] = int(_id)
+        if action in self.drop:
+            self.drop.remove(action)
+        else:
+            self._pending.append(response)
+        if len(self.commands) % self.batch == 0:
+            self.reply()
+
+    def reply(self):
+        for response in reversed(self._pending):
+            self.pull.messages.append(str(response))  # dict literal with single quotes, as the EA
+        self._pending = []
+
+
+@ut.skipIf(MTZeroMQConnector is None, 'dependencies not installed')
+class TestMT4Requests(ut.TestCase):
+    def _trading(self, **ea):
+        pull = _Pull()
+        self.ea = _EA(pull, **ea)
+        connector = MTZeroMQConnector.__new__(MTZeroMQConnector)
+        connector._ACTIVE = True
+        connector._verbose = False
+        connector._PUSH_SOCKET = self.ea
+        connector._PULL_SOCKET = pull
+        connector._SUB_SOCKET = None
+        connector._poller = _Poller(pull)
+        connector._poll_timeout = 10
+        connector._send_lock = threading.Lock()
+        connector._requests = deque()
+        connector._requests_lock = threading.Lock()
+        connector._request_ids = itertools.count(1)
+        connector._stale_seconds = 60
+        connector._thread_data_output = None
+        connector._callback_latency = LatencyStats()
+        thread = threading.Thread(target=connector._MT_ZMQ_Poll_Data, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(setattr, connector, '_ACTIVE', False)
+        trading = Trading.__new__(Trading)  # without connection
+        trading.client = connector
+        return trading
+
+    def test_out_of_order_with_id(self):
+        trading = self._trading(batch=3)
+        responses = trading._get_responses(['_info', 't', '_trades'])
+        self.assertEqual(self.ea.commands, ['GET_BALANCE', 'GET_POSITION', 'GET_OPEN_TRADES'])
+        self.assertEqual(responses, {'_info': {'_equity': 1001.0}, 't': {'2': ['EURUSD', 0.01, 0]},
+                                     '_trades': {'3': {'_lots': 0.01}}})
+
+    def test_out_of_order_without_id(self):
+        trading = self._trading(batch=3, echo_id=False)
+        responses = trading._get_responses(['_info', 't', '_trades'])
+        self.assertEqual(responses['_info'], {'_equity': 1001.0})
+        self.assertEqual(responses['t'], {'2': ['EURUSD', 0.01, 0]})
+
+    def test_same_key_by_id(self):
+        trading = self._trading(batch=2)
+        futures = [trading.client.MTX_NEW_TRADE_(), trading.client.MTX_NEW_TRADE_()]
+        self.assertEqual([f.result(timeout=1)['_ticket'] for f in futures], [1, 2])
+
+    def test_timeout(self):
+        trading = self._trading(echo_id=False, drop=['GET_BALANCE'])
+        responses = trading._get_responses(['_info', 't'], timeout=0.2)
+        self.assertEqual(responses, {'_info': None, 't': {'2': ['EURUSD', 0.01, 0]}})
+        # the late response is consumed by the request timed out, not by the next one
+        trading.client._PULL_SOCKET.messages.append(str(RESPONSES['GET_BALANCE'](1)))
+        time.sleep(0.05)
+        self.assertEqual(trading.get_total_balance(), 1003.0)
+        self.assertEqual(len(trading.client._requests), 0)
+
+    def test_stale_requests_removed(self):
+        trading = self._trading(drop=['GET_BALANCE'])
+        trading.client._stale_seconds = 0
+        self.assertIsNone(trading.get_total_balance(timeout=0.05))
+        self.assertEqual(len(trading.client._requests), 1)
+        self.assertIsNotNone(trading.get_trades())  # its response was never sent, it is forgotten
+        self.assertEqual(len(trading.client._requests), 0)
+
+
+if __name__ == '__main__':
+    ut.main()
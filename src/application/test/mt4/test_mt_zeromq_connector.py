@@ -0,0 +1,149 @@
+""" Create unitest for the parse of the responses and the market data of the ZeroMQ connector of MetaTrader"""
+import unittest as ut
+import itertools
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import Lock, Thread
+from src.domain.services.stats.latency import LatencyStats
+
+try:
+    import zmq
+    from src.infrastructure.mt4.mt_zeromq_connector import MTZeroMQConnector, TickCounter, parse_response
+except ImportError:  # zmq not installed
+    MTZeroMQConnector = None
+
+
+class _Push(object):
+    """ PUSH socket failing the sends of the ids in fail, on_send is called while the command is sent"""
+    def __init__(self, fail=(), on_send=None):
+        self.fail = fail
+        self.on_send = on_send
+        self.sent = []
+
+    def send_string(self, msg):
+        if self.on_send is not None:
+            self.on_send(msg)
+        if int(msg.split(';')[-1]) in self.fail:
+            raise zmq.error.Again()
+        self.sent.append(msg)
+
+
+def _connector(market_data_maxlen=3):
+    """ Connector without sockets nor poller thread"""
+    connector = MTZeroMQConnector.__new__(MTZeroMQConnector)
+    connector._verbose = False
+    connector._market_data_callback = None
+    connector._market_data_maxlen = market_data_maxlen
+    connector._Market_Data_DB = {}
+    connector._tick_counters = {}
+    connector._callback_latency = LatencyStats()
+    connector._thread_data_output = None
+    connector._requests = deque()
+    connector._requests_lock = Lock()
+    connector._stale_seconds = 60
+    connector._send_lock = Lock()
+    connector._request_ids = itertools.count(1)
+    return connector
+
+
+@ut.skipIf(MTZeroMQConnector is None, 'dependencies not installed')
+class TestParseResponse(ut.TestCase):
+    def test_json(self):
+        self.assertEqual(parse_response('{"_action": "OPEN", "_ticket": 12}'), {'_action': 'OPEN', '_ticket': 12})
+
+    def test_single_quotes(self):
+        self.assertEqual(parse_response("{'_action': 'CLOSE', '_close_lots': 0.01}"),
+                         {'_action': 'CLOSE', '_close_lots': 0.01})
+
+    def test_nested(self):
+        msg = "{'_action': 'OPEN_TRADES', '_trades': {'1234': {'_symbol': 'EURUSD', '_lots': 0.01, '_type': 0}}}"
+        self.assertEqual(parse_response(msg)['_trades']['1234'], {'_symbol': 'EURUSD', '_lots': 0.01, '_type': 0})
+
+    def test_literal(self):
+        # integer keys, booleans and quotes inside the values are not valid json
+        self.assertEqual(parse_response("{'t': {1234: ['EURUSD', 0.01, 0]}}"), {'t': {1234: ['EURUSD', 0.01, 0]}})
+        self.assertEqual(parse_response("{'_ok': True, '_comment': 'say \"hi\"'}"),
+                         {'_ok': True, '_comment': 'say "hi"'})
+        self.assertEqual(parse_response("{'_comment': 'it\\'s'}"), {'_comment': "it's"})
+
+    def test_malformed(self):
+        for msg in ["{'_action': 'OPEN'", "_action: OPEN", "{'_action': OPEN}"]:
+            with self.assertRaises((ValueError, SyntaxError)):
+                parse_response(msg)
+
+    def test_malformed_response_ignored(self):
+        connector = _connector()
+        connector._process_response("{'_action': 'OPEN', '_ticket'")  # partial message
+        connector._process_response('')
+        self.assertIsNone(connector._thread_data_output)
+        connector._process_response("{'_action': 'OPEN', '_ticket': 12}")
+        self.assertEqual(connector._thread_data_output, {'_action': 'OPEN', '_ticket': 12})
+
+
+@ut.skipIf(MTZeroMQConnector is None, 'dependencies not installed')
+class TestSendRequest(ut.TestCase):
+    def test_not_sent(self):
+        connector = _connector()
+        connector._PUSH_SOCKET = _Push(fail=[1])
+        failed = connector.MTX_GET_BALANCE_()
+        with self.assertRaises(FutureTimeoutError):
+            failed.result(timeout=0)
+        self.assertEqual(len(connector._requests), 0)
+        future = connector.MTX_GET_BALANCE_()
+        connector._process_response("{'_action': 'GET_BALANCE', '_info': {'_equity': 10.0}}")
+        self.assertEqual(future.result(timeout=0)['_info'], {'_equity': 10.0})  # not taken by the failed one
+
+    def test_responses_while_sending(self):
+        connector = _connector()
+        connector._PUSH_SOCKET = _Push()
+        previous = connector.MTX_GET_BALANCE_()
+
+        def respond(msg):  # the poller thread completes a request while the next one is being sent
+            thread = Thread(target=connector._process_response,
+                            args=("{'_action': 'GET_BALANCE', '_info': {'_equity': 1.0}}",))
+            thread.start()
+            thread.join(1)
+            self.assertFalse(thread.is_alive())
+
+        connector._PUSH_SOCKET.on_send = respond
+        connector.MTX_GET_BALANCE_()
+        self.assertEqual(previous.result(timeout=0)['_info'], {'_equity': 1.0})
+
+
+@ut.skipIf(MTZeroMQConnector is None, 'dependencies not installed')
+class TestMarketData(ut.TestCase):
+    def test_tick_counter(self):
+        counter = TickCounter()
+        for now in [10.1, 10.5, 10.9, 11.2]:
+            counter.add(now)
+        self.assertEqual((counter.count, counter.rate), (4, 3))
+        counter.add(11.7)
+        counter.add(14.0)  # seconds without ticks
+        self.assertEqual((counter.count, counter.rate), (6, 0.0))
+
+    def test_ticks_bounded(self):
+        connector = _connector(market_data_maxlen=3)
+        for i in range(5):
+            connector._process_market_data(f'EURUSD 1.0{i};1.1{i}')
+        ticks = connector._Market_Data_DB['EURUSD']
+        self.assertEqual([(bid, ask) for _, bid, ask in ticks], [(1.02, 1.12), (1.03, 1.13), (1.04, 1.14)])
+        self.assertEqual(connector._tick_counters['EURUSD'].count, 5)
+
+    def test_ticks_not_kept(self):
+        connector = _connector(market_data_maxlen=0)
+        events = []
+        connector._market_data_callback = events.append
+        connector._process_market_data('EURUSD 1.01;1.02')
+        self.assertEqual(connector._Market_Data_DB, {})
+        self.assertEqual((events[0]['Bid'], events[0]['Ask']), ('1.01', '1.02'))
+        self.assertEqual(connector.get_market_data_stats()['EURUSD']['latency']['count'], 1)
+
+    def test_malformed_market_data(self):
+        connector = _connector()
+        for msg in ['', 'EURUSD', 'EURUSD 1.01']:
+            connector._process_market_data(msg)
+        self.assertEqual((connector._Market_Data_DB, connector._tick_counters), ({}, {}))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,46 @@
+""" Create unitest for the incremental bar aggregator"""
+import unittest as ut
+from datetime import datetime, timezone
+from src.domain.services.bar_aggregator import BarAggregator, timeframe_seconds
+
+T0 = datetime(2023, 1, 2, 10, 0, tzinfo=timezone.utc).timestamp()
+
+
+class TestBarAggregator(ut.TestCase):
+    def test_timeframes(self):
+        self.assertEqual(timeframe_seconds('1min'), 60)
+        self.assertEqual(timeframe_seconds('5m'), 300)
+        self.assertEqual(timeframe_seconds('1h'), 3600)
+        with self.assertRaises(ValueError):
+            timeframe_seconds('1x')
+
+    def test_ohlc_boundary_and_carry_forward(self):
+        aggregator = BarAggregator(timeframes=['1min', '5min'], symbols=['EURUSD', 'GBPUSD'])
+        aggregator.add_tick('EURUSD', T0 + 1, 1.0, 1.5)  # 1.25
+        aggregator.add_tick('EURUSD', T0 + 20, 1.5, 2.0)  # 1.75
+        aggregator.add_tick('EURUSD', T0 + 40, 0.5, 1.0)  # 0.75
+        aggregator.add_tick('EURUSD', T0 + 59.999, 1.0, 1.0)  # 1.0, last tick of the minute
+        aggregator.add_tick('EURUSD', T0 + 60.001, 2.0, 2.0)  # first tick of the next minute
+        bars = aggregator.close(T0 + 60.5)
+        self.assertEqual(len(bars), 1)
+        bar = bars[0]
+        self.assertEqual((bar['open'], bar['high'], bar['low'], bar['close']), (1.25, 1.75, 0.75, 1.0))
+        self.assertEqual((bar['bid'], bar['ask'], bar['ticks']), (1.0, 1.0, 4))
+        self.assertEqual(bar['datetime'], datetime(2023, 1, 2, 10, 0, tzinfo=timezone.utc))
+        # minutes without ticks carry the close forward, the 5 minutes bar includes every tick
+        bars = aggregator.close(T0 + 300)
+        minutes = [b for b in bars if b['timeframe'] == '1min']
+        self.assertEqual([b['close'] for b in minutes], [2.0, 2.0, 2.0, 2.0])
+        self.assertEqual([b['ticks'] for b in minutes], [1, 0, 0, 0])
+        five = [b for b in bars if b['timeframe'] == '5min']
+        self.assertEqual(len(five), 1)
+        self.assertEqual((five[0]['open'], five[0]['high'], five[0]['close'], five[0]['ticks']), (1.25, 2.0, 2.0, 5))
+        # symbol without any tick has no bars
+        self.assertFalse(any(b['symbol'] == 'GBPUSD' for b in bars))
+        # ticks of closed periods are ignored
+        aggregator.add_tick('EURUSD', T0 + 10, 1.0, 1.0)
+        self.assertEqual(aggregator.late_ticks, 2)
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,84 @@
+""" Create unitest for the checkpoints and progress of the historical downloads"""
+import unittest as ut
+import os
+import tempfile
+import datetime as dt
+from unittest import mock
+from src.application.services.download_state import DownloadCheckpoints, DownloadProgress, month_windows
+
+try:
+    import pandas as pd
+    from src.application.services import historical_downloader_handler
+except ImportError:  # arctic, pandas not installed
+    historical_downloader_handler = None
+
+
+class _Exchange(object):
+    """ Pages of one hourly bar from the start date"""
+    def __init__(self):
+        self.starts = []
+
+    def iter_historical_data(self, symbol, interval, start_date, end_date, limit):
+        self.starts.append(start_date)
+        yield pd.DataFrame({'close': [1.0, 1.0]}, index=[start_date, start_date + dt.timedelta(hours=1)])
+
+
+class TestDownloadState(ut.TestCase):
+    def test_month_windows(self):
+        windows = month_windows(dt.datetime(2022, 11, 15), dt.datetime(2023, 1, 10))
+        self.assertEqual(windows, [(dt.datetime(2022, 11, 15), dt.datetime(2022, 12, 1)),
+                                   (dt.datetime(2022, 12, 1), dt.datetime(2023, 1, 1)),
+                                   (dt.datetime(2023, 1, 1), dt.datetime(2023, 1, 10))])
+
+    def test_resume_checkpoints(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'checkpoints.json')
+            end_date = dt.datetime(2023, 1, 1)
+            checkpoints = DownloadCheckpoints(path)
+            checkpoints.update('binance', '1m', 'BTC-USDT', dt.datetime(2022, 8, 1, 10), end_date)
+            checkpoints.update('binance', '1m', 'ETH-USDT', dt.datetime(2022, 12, 31, 23, 59), end_date, done=True)
+            # new process after a crash
+            checkpoints = DownloadCheckpoints(path)
+            self.assertEqual(checkpoints.get('binance', '1m', 'BTC-USDT'), dt.datetime(2022, 8, 1, 10))
+            self.assertFalse(checkpoints.is_done('binance', '1m', 'BTC-USDT', end_date))
+            self.assertTrue(checkpoints.is_done('binance', '1m', 'ETH-USDT', end_date))
+            self.assertFalse(checkpoints.is_done('binance', '1m', 'ETH-USDT', dt.datetime(2023, 2, 1)))
+            self.assertIsNone(checkpoints.get('kucoin', '1m', 'BTC-USDT'))
+
+    def test_progress(self):
+        progress = DownloadProgress(total_symbols=2)
+        progress.page('BTC-USDT', 1500, 0.5)
+        progress.page('BTC-USDT', 500, 0.2)
+        progress.finished('BTC-USDT')
+        progress.error('ETH-USDT')
+        summary = progress.summary()
+        self.assertEqual((summary['rows'], summary['pages'], summary['done'], summary['failed']), (2000, 2, 1, 1))
+        self.assertEqual(summary['by_symbol']['BTC-USDT']['pages'], 2)
+
+
+@ut.skipIf(historical_downloader_handler is None, 'dependencies not installed')
+class TestCleanSymbol(ut.TestCase):
+    def test_clean_then_download(self):
+        start_date, end_date = dt.datetime(2023, 1, 1), dt.datetime(2023, 1, 2)
+        module = historical_downloader_handler
+        with tempfile.TemporaryDirectory() as folder, \
+                mock.patch.object(module, 'save_historical'), \
+                mock.patch.object(module, 'last_datetime_historical', return_value=None), \
+                mock.patch.object(module, 'clean_symbol', return_value=['BTC-USDT']) as clean:
+            path = os.path.join(folder, 'checkpoints.json')
+            DownloadCheckpoints(path).update('binance', '1m', 'BTC-USDT', dt.datetime(2023, 1, 1, 23), end_date,
+                                             done=True)
+            downloader = module.HistoricalDownloader(max_workers=1, checkpoints_path=path)
+            downloader._trading['binance'] = _Exchange()
+            downloader.add('binance', ['BTC-USDT'], start_date=start_date, end_date=end_date,
+                           clean_symbols_database=['BTC'])
+            summary = downloader.run()
+            clean.assert_called_once_with(['BTC'], 'binance_historical_1m')
+            # downloaded again from the start date, not skipped as done
+            self.assertEqual(downloader._trading['binance'].starts, [start_date])
+            self.assertEqual(summary['rows'], 2)
+            self.assertEqual(DownloadCheckpoints(path).get('binance', '1m', 'BTC-USDT'), dt.datetime(2023, 1, 1, 1))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,99 @@
+""" Create unitest for the append and update of the historical data in the ChunkStore"""
+import unittest as ut
+import datetime as dt
+from unittest import mock
+
+try:
+    import pandas as pd
+    from src.application.services import historical_utils_handler
+except ImportError:  # arctic, pandas not installed
+    historical_utils_handler = None
+
+
+class _ChunkStore(object):
+    """ Symbols kept in memory by month chunks. As arctic, update replaces every chunk it touches with the rows
+    given, append combines them and both replace the metadata"""
+    def __init__(self):
+        self.data = {}
+        self.metadata = {}
+        self.calls = []
+
+    def has_symbol(self, symbol):
+        return symbol in self.data
+
+    def read_metadata(self, symbol):
+        return self.metadata.get(symbol)
+
+    def write(self, symbol, item, metadata=None, **kwargs):
+        self.calls.append(('write', len(item)))
+        self.data[symbol] = item.copy()
+        self.metadata[symbol] = metadata
+
+    def append(self, symbol, item, metadata=None, **kwargs):
+        self.calls.append(('append', len(item)))
+        self.data[symbol] = pd.concat([self.data[symbol], item])
+        self.metadata[symbol] = metadata
+
+    def update(self, symbol, item, metadata=None, **kwargs):
+        self.calls.append(('update', len(item)))
+        data = self.data[symbol]
+        months = set(item.index.to_period('M'))
+        data = data[~data.index.to_period('M').isin(months)]
+        self.data[symbol] = pd.concat([data, item]).sort_index()
+        self.metadata[symbol] = metadata
+
+    def read(self, symbol, chunk_range=None, filter_data=True, **kwargs):
+        data = self.data[symbol]
+        if filter_data:
+            return data[(data.index >= chunk_range.min()) & (data.index <= chunk_range.max())]
+        months = data.index.to_period('M')
+        return data[(months >= chunk_range.min().to_period('M')) & (months <= chunk_range.max().to_period('M'))]
+
+
+def _bars(hours, close):
+    return pd.DataFrame({'close': [close] * len(hours)}, index=[dt.datetime(2023, 1, 2, h) for h in hours])
+
+
+@ut.skipIf(historical_utils_handler is None, 'dependencies not installed')
+class TestAppendHistorical(ut.TestCase):
+    def setUp(self):
+        self.lib = _ChunkStore()
+        patch = mock.patch.object(historical_utils_handler, '_store', mock.Mock(get_library=lambda name: self.lib))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_append_new_rows(self):
+        append = historical_utils_handler.append_historical
+        self.assertEqual(append({'EURUSD': _bars([1, 2, 2], 1.0)}), {'EURUSD': 2})
+        self.assertEqual(append({'EURUSD': _bars([3, 4], 1.0)}), {'EURUSD': 2})
+        self.assertEqual(self.lib.calls, [('write', 2), ('append', 2)])
+        self.assertEqual(self.lib.metadata['EURUSD'], {'last_index': dt.datetime(2023, 1, 2, 4)})
+        self.assertEqual(len(self.lib.data['EURUSD']), 4)
+
+    def test_update_earlier_rows(self):
+        append = historical_utils_handler.append_historical
+        append({'EURUSD': _bars([1, 2, 3], 1.0)})
+        self.assertEqual(append({'EURUSD': _bars([0, 2, 4], 2.0)}), {'EURUSD': 3})
+        self.assertEqual(self.lib.calls, [('write', 3), ('update', 4), ('append', 1)])
+        self.assertEqual(self.lib.data['EURUSD']['close'].tolist(), [2.0, 1.0, 2.0, 1.0, 2.0])
+        self.assertEqual(historical_utils_handler.last_datetime_historical('EURUSD'), pd.Timestamp(2023, 1, 2, 4))
+
+    def test_update_keeps_month(self):
+        append = historical_utils_handler.append_historical
+        previous = pd.DataFrame({'close': [0.5]}, index=[dt.datetime(2022, 12, 30)])
+        append({'EURUSD': pd.concat([previous, _bars([1, 2, 3], 1.0)])})
+        later = pd.DataFrame({'close': [1.0]}, index=[dt.datetime(2023, 1, 20)])
+        append({'EURUSD': later})
+        append({'EURUSD': _bars([2], 2.0)})  # correction of a row of a month with other rows saved
+        self.assertEqual(self.lib.data['EURUSD']['close'].tolist(), [0.5, 1.0, 2.0, 1.0, 1.0])
+        self.assertEqual(self.lib.metadata['EURUSD'], {'last_index': dt.datetime(2023, 1, 20)})
+
+    def test_update_keeps_last_index(self):
+        append = historical_utils_handler.append_historical
+        append({'EURUSD': _bars([1, 2, 3], 1.0)})
+        append({'EURUSD': _bars([2], 2.0)})
+        self.assertEqual(self.lib.metadata['EURUSD'], {'last_index': dt.datetime(2023, 1, 2, 3)})
+
+
+if __name__ == '__main__':
+    ut.main()
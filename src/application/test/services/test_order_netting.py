@@ -0,0 +1,51 @@
+""" Create unitest for the netting of the orders of the strategies"""
+import unittest as ut
+import datetime as dt
+from types import SimpleNamespace
+from src.domain.services.order_netting import OrderNetting
+
+
+def _order(sender_id, action, quantity, price=100.0):
+    return SimpleNamespace(ticker='EURUSD', contract='EURUSD', datetime=dt.datetime(2023, 1, 2, 10, 5),
+                           type='market', action=action, quantity=quantity, price=price, sender_id=sender_id,
+                           order_id_sender=f'{sender_id}_1', order_id_receiver=None, status='from_strategy',
+                           quantity_execute=None, quantity_left=None, filled_price=None, commission_fee=None,
+                           fee_currency=None, error_description=None)
+
+
+class TestOrderNetting(ut.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.published = []
+        self.netting = OrderNetting(send_order=self.sent.append,
+                                    publish_event=lambda topic, event: self.published.append(
+                                        (event.order_id_sender, event.status, event.quantity_execute,
+                                         event.filled_price)),
+                                    window_seconds=60)
+
+    def test_net_and_allocate(self):
+        for order in [_order(1, 'buy', 3), _order(2, 'buy', 1), _order(3, 'sell', 2)]:
+            self.netting.add(order)
+        self.netting.flush()
+        self.assertEqual(len(self.sent), 1)
+        parent = self.sent[0]
+        self.assertEqual((parent.action, parent.quantity), ('buy', 2))
+        # the sell is crossed with the buys
+        self.assertEqual(self.published, [('3_1', 'closed', 2, 100.0)])
+        # fill of the net order by the broker
+        parent.status, parent.quantity_execute, parent.filled_price = 'closed', 2, 102.0
+        parent.order_id_receiver = 'x1'
+        self.netting.publish_event('order_status', parent)
+        self.assertEqual(self.published[1:], [('1_1', 'closed', 3.0, 101.0), ('2_1', 'closed', 1.0, 101.0)])
+
+    def test_offsetting_orders_not_sent(self):
+        for order in [_order(1, 'buy', 1), _order(2, 'sell', 1)]:
+            self.netting.add(order)
+        self.netting.flush()
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.netting.netted, 2)
+        self.assertEqual(sorted(p[:3] for p in self.published), [('1_1', 'closed', 1), ('2_1', 'closed', 1)])
+
+
+if __name__ == '__main__':
+    ut.main()
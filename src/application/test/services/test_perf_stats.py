@@ -0,0 +1,80 @@
+""" Create unitest for the time of the strategies of a portfolio by event type"""
+import unittest as ut
+from unittest import mock
+from types import SimpleNamespace
+from src.domain.services.stats.latency import LatencyStats
+
+try:
+    from src.application.services.portfolio_constructor import Portfolio_Constructor
+    from src.application.benchmarks.pipeline_benchmark import synthetic_bars
+except ImportError:  # dependencies of the strategies not installed
+    Portfolio_Constructor = None
+
+
+class TestLatencyMerged(ut.TestCase):
+    def test_merged(self):
+        stats = LatencyStats()
+        for key, value in [((1, 'bar'), 0.001), ((1, 'tick'), 0.003), ((2, 'bar'), 0.002)]:
+            stats.add(key, value)
+        by_strategy = stats.merged(lambda key: key[0])
+        self.assertEqual((by_strategy[1].count, by_strategy[1].max), (2, 0.003))
+        self.assertAlmostEqual(by_strategy[1].total, 0.004)
+        by_event = stats.merged(lambda key: key[1])
+        self.assertEqual(by_event['bar'].summary()['count'], 2)
+        self.assertEqual(stats.histograms[(1, 'bar')].count, 1)  # the histograms are not changed
+
+
+@ut.skipIf(Portfolio_Constructor is None, 'dependencies not installed')
+class TestPerfStats(ut.TestCase):
+    def _portfolio(self, perf_stats):
+        strategies = [{'id': i, 'strategy': 'Simple_Avg_Cross',
+                       'params': {'ticker': t, 'short_period': 5, 'long_period': 20, 'quantity': 1}}
+                      for i, t in enumerate(['EURUSD', 'GBPUSD'])]
+        return Portfolio_Constructor({'Name': 'test_perf', 'Data_Sources': None, 'Strategies': strategies},
+                                     asset_type='financial', perf_stats=perf_stats)
+
+    def test_perf_stats(self):
+        portfolio = self._portfolio(perf_stats=True)
+        for bar in synthetic_bars(['EURUSD', 'GBPUSD', 'USDJPY'], 200):
+            portfolio._callback_datafeed(bar)
+        stats = portfolio.get_perf_stats()
+        self.assertEqual(sorted(stats['strategies']), [0, 1])
+        strategy = stats['strategies'][0]
+        self.assertEqual(strategy['latency']['count'], 200)
+        self.assertEqual(list(strategy['event_types']), ['bar'])
+        self.assertGreater(strategy['seconds'], 0)
+        orders = len([o for o in portfolio.orders if o.ticker == 'EURUSD'])
+        self.assertGreater(orders, 0)
+        self.assertEqual(strategy['orders'], orders)
+        self.assertEqual(stats['event_types']['bar']['count'], 400)
+
+    def test_real_time_only(self):
+        portfolio = self._portfolio(perf_stats=True)
+        portfolio.list_events_backtest = synthetic_bars(['EURUSD', 'GBPUSD'], 200)
+        portfolio.run_real = True
+        portfolio.health_handler = SimpleNamespace(check=lambda: None)
+        real_time = synthetic_bars(['EURUSD'], 30, seed=2)
+
+        def receive_events(routing_key, callback, config):
+            for bar in real_time:
+                callback(bar)
+
+        with mock.patch('src.infrastructure.database_handler.load_event_from_list', new=iter), \
+                mock.patch('src.infrastructure.brokerMQ.receive_events', new=receive_events):
+            portfolio.run()
+        stats = portfolio.get_perf_stats()
+        # the replay of run_simulation is not measured
+        self.assertEqual(stats['strategies'][0]['latency']['count'], 30)
+        self.assertIsNone(stats['strategies'][1]['latency'])
+        self.assertEqual(stats['event_types']['bar']['count'], 30)
+        self.assertGreater(len([o for o in portfolio.orders if o.ticker == 'GBPUSD']), 0)  # sent in the replay
+        self.assertEqual(stats['strategies'][1]['orders'], 0)
+
+    def test_without_perf_stats(self):
+        portfolio = self._portfolio(perf_stats=False)
+        self.assertIsNone(portfolio.get_perf_stats())
+        self.assertNotIn('add_event', portfolio.strategies[0][1].__dict__)  # the strategies are not wrapped
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,59 @@
+""" Create unitest for the in-process broker and the replay benchmark of the pipeline"""
+import unittest as ut
+from src.infrastructure.local_broker import LocalBroker, topic_matches
+
+try:
+    from src.application.benchmarks.pipeline_benchmark import PipelineBenchmark, synthetic_bars, compare_results
+    from src.infrastructure.brokerMQ import Emit_Events
+except ImportError:  # pika, dataclasses_json not installed
+    PipelineBenchmark = None
+
+
+class TestLocalBroker(ut.TestCase):
+    def test_topic_matches(self):
+        self.assertTrue(topic_matches('#', 'bar'))
+        self.assertTrue(topic_matches('*.order', 'kucoin.order'))
+        self.assertTrue(topic_matches('a.#.c', 'a.b.b.c'))
+        self.assertFalse(topic_matches('bar', 'tick'))
+        self.assertFalse(topic_matches('*', 'kucoin.order'))
+
+    def test_consume_in_order(self):
+        broker = LocalBroker('test_broker')
+        channel = broker.connection().channel()
+        queue_name = channel.queue_declare('', exclusive=True).method.queue
+        channel.queue_bind(exchange='events', queue=queue_name, routing_key='bar')
+        received = []
+        channel.basic_consume(queue=queue_name, on_message_callback=lambda ch, method, properties, body:
+                              received.append((method.routing_key, body)))
+        for body in ['1', '2']:
+            channel.basic_publish(exchange='events', routing_key='bar', body=body)
+        channel.basic_publish(exchange='events', routing_key='tick', body='3')
+        self.assertEqual(channel.process_data_events(time_limit=0.1), 2)
+        self.assertEqual(received, [('bar', '1'), ('bar', '2')])
+
+
+@ut.skipIf(PipelineBenchmark is None, 'dependencies not installed')
+class TestPipelineBenchmark(ut.TestCase):
+    def setUp(self):
+        self.broker = LocalBroker('test_pipeline')
+        self.config = {'host': 'test_pipeline', 'port': None, 'user': None, 'password': None,
+                       'connection_factory': self.broker.connection}
+
+    def test_replay(self):
+        emit_orders = Emit_Events(config=self.config)
+
+        def consumer(bar):  # one order by bar, like a strategy
+            bar.action, bar.quantity = 'buy', 1
+            emit_orders.publish_event('order', bar)
+
+        benchmark = PipelineBenchmark(self.config, consumer=consumer)
+        results = benchmark.run(synthetic_bars(['EURUSD', 'GBPUSD'], 50), timeout=10)
+        self.assertEqual((results['events'], results['received'], results['orders']), (100, 100, 100))
+        self.assertEqual(results['stages']['tick_to_order']['count'], 100)
+        self.assertEqual(compare_results(results, results), [])
+        slower = dict(results, events_per_second=results['events_per_second'] * 2)
+        self.assertEqual(len(compare_results(slower, results)), 1)
+
+
+if __name__ == '__main__':
+    ut.main()
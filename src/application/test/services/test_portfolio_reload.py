@@ -0,0 +1,71 @@
+""" Create unitest for the hot reload of the strategies of a portfolio"""
+import unittest as ut
+import datetime as dt
+from types import SimpleNamespace
+
+try:
+    from src.application.services.portfolio_constructor import Portfolio_Constructor
+except ImportError:  # dependencies of the strategies not installed
+    Portfolio_Constructor = None
+
+
+def _strategy(_id, ticker, short_period=5, **params):
+    return {'id': _id, 'strategy': 'Simple_Avg_Cross',
+            'params': dict(ticker=ticker, short_period=short_period, long_period=20, quantity=1, **params)}
+
+
+@ut.skipIf(Portfolio_Constructor is None, 'dependencies not installed')
+class TestPortfolioReload(ut.TestCase):
+    def setUp(self):
+        conf_portfolio = {'Name': 'test_reload', 'Data_Sources': None,
+                          'Strategies': [_strategy(1, 'EURUSD'), _strategy(2, 'GBPUSD')]}
+        self.portfolio = Portfolio_Constructor(conf_portfolio, asset_type='financial')
+
+    def test_reload(self):
+        kept = self.portfolio.strategies[1][1]
+        bar = SimpleNamespace(event_type='bar', ticker='USDJPY', contract='USDJPY', close=140.0,
+                              datetime=dt.datetime(2023, 1, 2))
+        self.portfolio._recent_bars['USDJPY'].append(bar)
+        result = self.portfolio.reload_strategies([_strategy(1, 'EURUSD'), _strategy(2, 'GBPUSD', short_period=10),
+                                                   _strategy(3, 'USDJPY', tickers_to_feeder='EURJPY')])
+        self.assertEqual(result, {'added': [3], 'removed': [], 'changed': [2]})
+        self.assertIs(self.portfolio.strategies[1][1], kept)
+        self.assertEqual(self.portfolio.strategies[2][1].parameters['short_period'], 10)
+        self.assertEqual(self.portfolio.ticker_to_id_strategies,
+                         {'EURUSD': [1], 'GBPUSD': [2], 'USDJPY': [3], 'EURJPY': [3]})
+        self.assertIs(self.portfolio.equity_handler.ticker_to_strategies, self.portfolio.ticker_to_strategies)
+        # warmed up with the bars received in real time
+        self.assertTrue(self.portfolio.strategies[3][1].inicial_values)
+        self.assertFalse(self.portfolio.strategies[2][1].inicial_values)
+
+        result = self.portfolio.reload_strategies([_strategy(3, 'USDJPY', tickers_to_feeder='EURJPY')])
+        self.assertEqual(result['removed'], [1, 2])
+        self.assertEqual(sorted(self.portfolio.ticker_to_strategies), ['EURJPY', 'USDJPY'])
+
+    def test_reload_positions(self):
+        for close in [140.0, 141.0, 142.0]:  # the new strategy buys in the warm up
+            self.portfolio._recent_bars['USDJPY'].append(
+                SimpleNamespace(event_type='bar', ticker='USDJPY', contract='USDJPY', close=close,
+                                datetime=dt.datetime(2023, 1, 2, 0, int(close - 140))))
+        long_1, long_2 = self.portfolio.strategies[1][1], self.portfolio.strategies[2][1]
+        for strategy in [long_1, long_2]:
+            strategy.send_order(ticker=strategy.ticker, price=1.1, quantity=1, action='buy',
+                                datetime=dt.datetime(2023, 1, 2))
+        n_orders = len(self.portfolio.orders)
+        self.portfolio.reload_strategies([_strategy(2, 'GBPUSD', short_period=10), _strategy(3, 'USDJPY')])
+        new = self.portfolio.strategies[3][1]
+        self.assertEqual((new.position, new.number_of_contracts), (0, 0))
+        self.assertIsNone(new.equity_hander_estrategy.equity)
+        changed = self.portfolio.strategies[2][1]
+        self.assertEqual((changed.position, changed.number_of_contracts), (1, 1))
+        self.assertIs(changed.equity_hander_estrategy, long_2.equity_hander_estrategy)
+        # the position of the removed strategy is closed, the orders of the warm up are not counted
+        closing = self.portfolio.orders[-1]
+        self.assertEqual((closing.ticker, closing.action, closing.quantity), ('EURUSD', 'sell', 1))
+        self.assertEqual(long_1.number_of_contracts, 0)
+        self.assertEqual(len([o for o in self.portfolio.orders[n_orders:] if o.ticker == 'EURUSD']), 1)
+        self.assertEqual([o for o in self.portfolio.orders if o.ticker == 'USDJPY'], [])
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,60 @@
+""" Create unitest for the startup of the services: import profiler and strategies from csv"""
+import unittest as ut
+import os
+import sys
+import tempfile
+from src.application.services.startup_profile import ImportProfiler
+from src.domain.config_helper import get_strategies_from_csv
+
+
+class TestStartup(ut.TestCase):
+    def test_import_profiler(self):
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, 'startup_mod_a.py'), 'w') as f:
+                f.write('import startup_mod_b\n')
+            with open(os.path.join(path, 'startup_mod_b.py'), 'w') as f:
+                f.write('import time\ntime.sleep(0.02)\n')
+            sys.path.insert(0, path)
+            try:
+                with ImportProfiler() as profiler:
+                    import startup_mod_a
+            finally:
+                sys.path.remove(path)
+                sys.modules.pop('startup_mod_a', None)
+                sys.modules.pop('startup_mod_b', None)
+        cumulative_a, self_a = profiler.times['startup_mod_a']
+        cumulative_b, self_b = profiler.times['startup_mod_b']
+        self.assertGreaterEqual(cumulative_a, cumulative_b)
+        self.assertGreaterEqual(self_b, 0.02)
+        self.assertLess(self_a, 0.02)
+        self.assertIn('startup_mod_b', profiler.report()[2])
+        self.assertNotIn(profiler, sys.meta_path)
+
+    def test_strategies_from_csv(self):
+        with tempfile.TemporaryDirectory() as path:
+            path_csv = os.path.join(path, 'strategies.csv')
+            with open(path_csv, 'w') as f:
+                f.write('id,name,ticker,quantity,fast,use_filter\n1,Basic_Strategy,EURUSD,0.5,10,True\n')
+            strategies = get_strategies_from_csv(path_csv)
+        self.assertEqual(strategies, [{'id': 1, 'strategy': 'Basic_Strategy',
+                                       'params': {'ticker': 'EURUSD', 'quantity': 0.5, 'fast': 10,
+                                                  'use_filter': True}}])
+
+    def test_types_by_column(self):
+        with tempfile.TemporaryDirectory() as path:
+            path_csv = os.path.join(path, 'strategies.csv')
+            with open(path_csv, 'w') as f:
+                f.write('id,name,quantity,fast,code,use_filter\n1,Basic_Strategy,1,10,7,True\n'
+                        '2,Basic_Strategy,1.5,,A7,\n')
+            strategies = get_strategies_from_csv(path_csv)
+        params = [strategy['params'] for strategy in strategies]
+        self.assertEqual([p['quantity'] for p in params], [1.0, 1.5])
+        self.assertIsInstance(params[0]['quantity'], float)
+        self.assertIsInstance(params[0]['fast'], float)  # int column with empty cells
+        self.assertNotEqual(params[1]['fast'], params[1]['fast'])  # nan
+        self.assertEqual([p['code'] for p in params], ['7', 'A7'])
+        self.assertIs(params[0]['use_filter'], True)
+
+
+if __name__ == '__main__':
+    ut.main()
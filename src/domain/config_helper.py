@@ -5,4 +5,44 @@ def get_config(config_file_name: str) -> dict:
     import yaml
     with open(config_file_name, "r") as config_file:
         config = yaml.load(config_file, Loader=yaml.FullLoader)
-    return config
\ No newline at end of file
+    return config
+
+
+def _column_parser(values: list):
+    """ Parser of the cells of a csv column with the type pandas would give to the whole column: int, float
+    (int with empty cells), bool or str. Empty cells are nan."""
+    cells = [v for v in values if v != '']
+    _type = str
+    for _numeric in (int, float):
+        try:
+            for v in cells:
+                _numeric(v)
+        except ValueError:
+            continue
+        _type = float if _numeric is int and len(cells) < len(values) else _numeric
+        break
+    else:
+        if all(v in ['True', 'False'] for v in cells):
+            _type = lambda v: v == 'True'
+    return lambda value: float('nan') if value == '' else _type(value)
+
+
+def get_strategies_from_csv(path_to_csv: str) -> list:
+    """ Strategies of a csv file, one by row with the columns id, name and the params of the strategy """
+    import csv
+    with open(path_to_csv, "r", newline='') as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    columns = list(rows[0].keys()) if len(rows) > 0 else []
+    parsers = {k: _column_parser([row[k] for row in rows]) for k in columns}
+    strategies = []
+    for row in rows:
+        dict_strategy = {'params': {}}
+        for k, v in row.items():
+            if k == 'id':
+                dict_strategy['id'] = parsers[k](v)
+            elif k == 'name':
+                dict_strategy['strategy'] = v
+            else:
+                dict_strategy['params'][k] = parsers[k](v)
+        strategies.append(dict_strategy)
+    return strategies
@@ -0,0 +1,14 @@
+
+from dataclasses import dataclass
+from dataclasses_json import dataclass_json
+from typing import Dict, Any
+from src.domain.models.base import Base
+
+
+@dataclass_json
+@dataclass
+class PerfStats(Base):
+    """ Time of the strategies of a portfolio processing the events and orders sent """
+    event_type: str = 'perf_stats'
+    ticker: str = 'perf_stats'  # name of the portfolio
+    stats: Dict[str, Any] = None  # result of Portfolio_Constructor.get_perf_stats
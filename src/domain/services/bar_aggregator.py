@@ -0,0 +1,126 @@
+""" Incremental aggregation of ticks in OHLC bars.
+Each tick updates the open bar of every timeframe in O(1), the bar is closed when a tick of the next period
+arrives or when close(now) is called after the end of the period. Periods without ticks get a flat bar with
+the previous close.
+"""
+import re
+import threading
+from datetime import datetime, timezone
+
+_UNITS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 't': 60, 'h': 3600, 'H': 3600, 'd': 86400, 'D': 86400}
+
+
+def timeframe_seconds(timeframe: str) -> int:
+    """ Seconds of a timeframe like '1min', '5m', '1h' or '1d'"""
+    match = re.fullmatch(r'(\d*)\s*([a-zA-Z]+)', timeframe)
+    if match is None or match.group(2) not in _UNITS:
+        raise ValueError(f'Timeframe not supported: {timeframe}')
+    return int(match.group(1) or 1) * _UNITS[match.group(2)]
+
+
+class _OpenBar(object):
+    __slots__ = ['start', 'open', 'high', 'low', 'close', 'bid', 'ask', 'volume', 'ticks']
+
+    def __init__(self, start, price, bid, ask, volume, ticks=1):
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.bid = bid
+        self.ask = ask
+        self.volume = volume
+        self.ticks = ticks
+
+
+class BarAggregator(object):
+    """ OHLC, bid, ask and volume bars of several symbols and timeframes.
+
+    Parameters
+    ----------
+    timeframes: list of timeframes, e.g. ['1min', '5min', '1h']
+    symbols: symbols with carry forward bars from the start, the others are added with their first tick
+    carry_forward: emit flat bars with the previous close for periods without ticks
+    """
+
+    def __init__(self, timeframes: list = ['1min'], symbols: list = [], carry_forward: bool = True):
+        self.timeframes = {timeframe: timeframe_seconds(timeframe) for timeframe in timeframes}
+        self.carry_forward = carry_forward
+        self.late_ticks = 0  # ticks of periods already closed
+        self._bars = {}  # key: (symbol, timeframe), value: _OpenBar
+        self._last = {}  # key: (symbol, timeframe), value: (start of last closed bar, close, bid, ask)
+        self._closed = []
+        self._lock = threading.Lock()
+        for symbol in symbols:
+            for timeframe in self.timeframes:
+                self._bars.setdefault((symbol, timeframe), None)
+
+    def add_tick(self, symbol: str, timestamp: float, bid: float, ask: float, volume: float = 0.0) -> None:
+        """ Update the bars with a tick, timestamp in seconds UTC"""
+        price = (bid + ask) / 2
+        with self._lock:
+            for timeframe, seconds in self.timeframes.items():
+                key = (symbol, timeframe)
+                start = timestamp - timestamp % seconds
+                bar = self._bars.get(key)
+                if bar is None or bar.start != start:
+                    last = self._last.get(key)
+                    if (bar is not None and start < bar.start) or (last is not None and start <= last[0]):
+                        self.late_ticks += 1
+                        continue
+                    if bar is not None:
+                        self._close(key, bar)
+                    self._fill(key, start)
+                    self._bars[key] = _OpenBar(start, price, bid, ask, volume)
+                else:
+                    if price > bar.high:
+                        bar.high = price
+                    elif price < bar.low:
+                        bar.low = price
+                    bar.close = price
+                    bar.bid = bid
+                    bar.ask = ask
+                    bar.volume += volume
+                    bar.ticks += 1
+
+    def close(self, now: float) -> list:
+        """ Return the bars closed until now (seconds UTC), including the flat bars of periods without ticks"""
+        with self._lock:
+            for key, bar in self._bars.items():
+                seconds = self.timeframes[key[1]]
+                if bar is not None and bar.start + seconds <= now:
+                    self._close(key, bar)
+                    self._bars[key] = None
+                self._fill(key, now - now % seconds)
+            closed, self._closed = self._closed, []
+        closed.sort(key=lambda b: (b['datetime'], b['symbol'], b['timeframe']))
+        return closed
+
+    def seed(self, symbol: str, timeframe: str, start: float, close: float, bid: float = None,
+             ask: float = None) -> None:
+        """ Set the last closed bar of the symbol, e.g. with the bars back filled from other source after a gap.
+        The open bar is discarded if it is not later than this bar"""
+        key = (symbol, timeframe)
+        with self._lock:
+            bar = self._bars.get(key)
+            if bar is not None and bar.start <= start:
+                self._bars[key] = None
+            self._last[key] = (start, close, close if bid is None else bid, close if ask is None else ask)
+
+    def _close(self, key: tuple, bar: _OpenBar) -> None:
+        self._closed.append(self._to_dict(key, bar))
+        self._last[key] = (bar.start, bar.close, bar.bid, bar.ask)
+
+    def _fill(self, key: tuple, start: float) -> None:
+        """ Flat bars since the last closed bar until the period starting in start (not included)"""
+        last = self._last.get(key)
+        if not self.carry_forward or last is None:
+            return
+        seconds = self.timeframes[key[1]]
+        previous_start, close, bid, ask = last
+        for period_start in range(int(previous_start + seconds), int(start), seconds):
+            self._close(key, _OpenBar(period_start, close, bid, ask, 0.0, ticks=0))
+
+    @staticmethod
+    def _to_dict(key: tuple, bar: _OpenBar) -> dict:
+        return {'symbol': key[0], 'timeframe': key[1],
+                'datetime': datetime.fromtimestamp(bar.start, tz=timezone.utc),
+                'open': bar.open, 'high': bar.high, 'low': bar.low, 'close': bar.close,
+                'bid': bar.bid, 'ask': bar.ask, 'volume': bar.volume, 'ticks': bar.ticks}
@@ -0,0 +1,152 @@
+""" Netting of the market orders of several strategies on the same contract.
+The orders of a ticker with the same bar datetime received in a window are aggregated and only the net quantity
+is sent to the broker. The opposite orders are crossed internally at their own price and the fills of the net
+order are allocated back to each order_id_sender pro rata, so every strategy receives its own order_status.
+"""
+import copy
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUS = ('closed', 'cancelled', 'expired', 'rejected', 'error')
+
+
+def _signed(order) -> float:
+    return order.quantity if order.action.lower() == 'buy' else -order.quantity
+
+
+class _Group(object):
+    __slots__ = ['deadline', 'orders', 'same', 'opposite']
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.orders = []
+        self.same = []  # orders in the direction of the net order
+        self.opposite = []  # orders crossed internally
+
+
+class OrderNetting(object):
+    """ Aggregate the market orders by (ticker, contract, datetime) during window_seconds.
+
+    Parameters
+    ----------
+    send_order: callable(order) that executes an order in the broker
+    publish_event: callable(topic, event), publish_event of Emit_Events for the status of the strategies orders
+    window_seconds: time waiting for the orders of the other strategies on the same bar
+    """
+
+    def __init__(self, send_order: callable, publish_event: callable, window_seconds: float = 1.0):
+        self.send_order = send_order
+        self._publish_event = publish_event
+        self.window_seconds = window_seconds
+        self.netted = 0  # quantity not sent to the broker by crossing
+        self._groups = {}  # key: (ticker, contract, datetime), value: _Group waiting
+        self._sent = {}  # key: order_id_sender of the net order, value: _Group
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, order) -> None:
+        """ Order from the strategies, the limit orders are sent without netting"""
+        if order.type != 'market':
+            self.send_order(order)
+            return
+        key = (order.ticker, order.contract, order.datetime)
+        with self._condition:
+            # a new bar of the ticker closes the groups of the previous bars
+            for previous in [k for k in self._groups if k[0] == order.ticker and k != key]:
+                self._groups[previous].deadline = 0
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _Group(time.monotonic() + self.window_seconds)
+            group.orders.append(order)
+            self._condition.notify()
+
+    def publish_event(self, topic: str, event) -> None:
+        """ Same interface as Emit_Events, the status of the net orders is allocated to the strategies orders"""
+        group = self._sent.get(getattr(event, 'order_id_sender', None))
+        if topic != 'order_status' or group is None:
+            self._publish_event(topic, event)
+            return
+        self._allocate(event, group)
+        if event.status in FINAL_STATUS:
+            self._sent.pop(event.order_id_sender, None)
+
+    def flush(self) -> None:
+        """ Send the groups waiting"""
+        with self._condition:
+            groups, self._groups = list(self._groups.values()), {}
+        for group in groups:
+            self._send(group)
+
+    def _pop_due(self) -> list:
+        with self._condition:
+            while True:
+                if len(self._groups) == 0:
+                    self._condition.wait()
+                    continue
+                now = time.monotonic()
+                due = [key for key, group in self._groups.items() if group.deadline <= now]
+                if len(due) == 0:
+                    self._condition.wait(min(group.deadline for group in self._groups.values()) - now)
+                    continue
+                return [self._groups.pop(key) for key in due]
+
+    def _run(self) -> None:
+        while True:
+            for group in self._pop_due():
+                try:
+                    self._send(group)
+                except Exception as e:
+                    logger.error(f'Error sending net order of {group.orders[0].ticker}: {e}')
+
+    def _send(self, group: _Group) -> None:
+        net = sum(_signed(order) for order in group.orders)
+        if len(group.orders) == 1:
+            self.send_order(group.orders[0])
+            return
+        group.same = [order for order in group.orders if net != 0 and _signed(order) * net > 0]
+        group.opposite = [order for order in group.orders if order not in group.same]
+        self.netted += sum(order.quantity for order in group.orders) - abs(net)
+        # orders crossed internally are filled at their price
+        for order in group.opposite:
+            self._fill(order, order.quantity, order.price, 'closed')
+        if net == 0:
+            return
+        parent = copy.copy(group.same[0])
+        parent.quantity = abs(net)
+        parent.action = 'buy' if net > 0 else 'sell'
+        parent.order_id_sender = f'net_{group.same[0].order_id_sender}'
+        parent.sender_id = None
+        logger.info(f'Net order {parent.ticker} {parent.action} {parent.quantity} of {len(group.orders)} orders')
+        self._sent[parent.order_id_sender] = group
+        self.send_order(parent)
+
+    def _allocate(self, parent, group: _Group) -> None:
+        """ Fills of the net order to the orders in its direction, pro rata of their quantity"""
+        total_same = sum(order.quantity for order in group.same)
+        crossed = sum(order.quantity for order in group.opposite)
+        executed = parent.quantity_execute or 0
+        for order in group.same:
+            share = order.quantity / total_same
+            internal = crossed * share
+            external = executed * share
+            price = order.price
+            if internal + external > 0 and parent.filled_price is not None:
+                price = (internal * (order.price or parent.filled_price) + external * parent.filled_price) / \
+                        (internal + external)
+            order.order_id_receiver = parent.order_id_receiver
+            order.error_description = parent.error_description
+            if parent.commission_fee is not None:
+                order.commission_fee = parent.commission_fee * share
+                order.fee_currency = parent.fee_currency
+            self._fill(order, internal + external, price, parent.status)
+
+    def _fill(self, order, quantity_execute: float, price: float, status: str) -> None:
+        order.quantity_execute = quantity_execute
+        order.quantity_left = order.quantity - quantity_execute
+        order.filled_price = price
+        order.status = status
+        self._publish_event('order_status', order)
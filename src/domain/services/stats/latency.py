@@ -0,0 +1,90 @@
+""" Latency histograms with fixed log spaced buckets.
+Recording a value is O(1) and does not keep the samples, percentiles are approximated by the bucket bound.
+"""
+import bisect
+import math
+import threading
+
+
+def _bounds(min_value: float = 1e-6, max_value: float = 100.0, buckets_per_decade: int = 20) -> list:
+    """ Upper bounds of the buckets in seconds, from 1 microsecond to 100 seconds by default"""
+    n = int(round(math.log10(max_value / min_value) * buckets_per_decade))
+    return [min_value * 10 ** (i / buckets_per_decade) for i in range(n + 1)]
+
+
+BOUNDS = _bounds()
+
+
+class LatencyHistogram(object):
+    """ Histogram of latencies in seconds"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)  # last bucket for values over the max bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        """ Add the values of other histogram to this one"""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, q: float) -> float:
+        """ Upper bound of the bucket where the percentile q (0-100) is"""
+        if self.count == 0:
+            return None
+        rank = q / 100 * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= rank and n > 0:
+                return min(BOUNDS[i], self.max) if i < len(BOUNDS) else self.max
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count > 0 else None
+
+    def summary(self) -> dict:
+        return {'count': self.count, 'mean': self.mean, 'p50': self.percentile(50),
+                'p99': self.percentile(99), 'max': self.max}
+
+
+class LatencyStats(object):
+    """ LatencyHistogram by key, thread safe"""
+
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: str, value: float) -> None:
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = LatencyHistogram()
+            self.histograms[key].add(value)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {k: h.summary() for k, h in self.histograms.items()}
+
+    def merged(self, group: callable) -> dict:
+        """ Histograms of the keys merged by group(key)"""
+        merged = {}
+        with self._lock:
+            for k, h in self.histograms.items():
+                merged.setdefault(group(k), LatencyHistogram()).merge(h)
+        return merged
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms = {}
@@ -0,0 +1,173 @@
+""" Actual off (real start) of the matches.
+The matches are kept in memory, the changes are appended to a journal file by a background thread and
+the full snapshot is written every checkpoint_seconds, so the processing of books never waits for the disk.
+On restart the snapshot is loaded and the journal is replayed over it.
+Only the provider writes the files, the other processes sharing them (broker, telegram bot) open the store read only.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ActualOffStore(object):
+    """ In memory store of the actual off by match name.
+
+    Parameters
+    ----------
+    path: json file of the snapshot, the journal is the same path with the suffix .journal
+    ttl_days: matches with actual off older than this are evicted in the checkpoints
+    flush_seconds: time between appends to the journal
+    checkpoint_seconds: time between snapshots, only if there are changes not included in the snapshot
+    background: thread writing the journal and the snapshots
+    read_only: load the files without writing them, the updates are kept just in memory
+    """
+
+    def __init__(self, path: str, ttl_days: float = 4, flush_seconds: float = 1.0, checkpoint_seconds: float = 600.0,
+                 background: bool = True, read_only: bool = False):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.ttl_seconds = ttl_days * 86400
+        self.flush_seconds = flush_seconds
+        self.checkpoint_seconds = checkpoint_seconds
+        self.datetime_real_off = {}  # key: match, value: timestamp of the actual off
+        self.start = {}  # key: match, value: True if the match is in play
+        self._journal = []  # changes not saved yet, [match, timestamp, in play]
+        self._dirty = False  # changes or evictions not included in the snapshot
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.load()
+        self._thread = None
+        if background and not read_only:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def __len__(self):
+        return len(self.datetime_real_off)
+
+    def __contains__(self, match: str):
+        return match in self.datetime_real_off
+
+    def load(self) -> None:
+        """ Load snapshot and replay the journal"""
+        data = {'datetime_real_off': {}, 'start': {}}
+        try:
+            if os.path.isfile(self.path):
+                with open(self.path, 'r') as json_data:
+                    data = json.load(json_data)
+        except ValueError:
+            logger.error(f'Actual off file {self.path} corrupted, starting empty')
+        self.datetime_real_off = data.get('datetime_real_off', {})
+        self.start = data.get('start', {})
+        if os.path.isfile(self.journal_path):
+            with open(self.journal_path, 'r') as journal:
+                for line in journal:
+                    try:
+                        match, timestamp, in_play = json.loads(line)
+                    except ValueError:  # last line partially written
+                        continue
+                    self.datetime_real_off[match] = timestamp
+                    self.start[match] = in_play
+                    self._dirty = True
+        self.evict()
+
+    def update(self, match: str, scheduled_off: float, timestamp: float, in_play: bool) -> float:
+        """ Save actual off of the match and return it.
+        The first time it is the scheduled off, when the match goes in play it is the time of the book
+        (or the scheduled off if the book is earlier).
+        """
+        with self._lock:
+            if match not in self.datetime_real_off:  # new match
+                self.datetime_real_off[match] = scheduled_off
+                self.start[match] = in_play
+                self._changed([match, scheduled_off, in_play])
+            elif in_play and not self.start[match]:  # starting match
+                self.datetime_real_off[match] = max(timestamp, scheduled_off)
+                self.start[match] = in_play
+                self._changed([match, self.datetime_real_off[match], in_play])
+            return self.datetime_real_off[match]
+
+    def _changed(self, change: list) -> None:
+        if not self.read_only:
+            self._journal.append(change)
+            self._dirty = True
+
+    def get(self, match: str) -> float:
+        return self.datetime_real_off.get(match)
+
+    def evict(self, now: float = None) -> None:
+        """ Delete matches older than ttl to avoid a very large file"""
+        delete_from = (time.time() if now is None else now) - self.ttl_seconds
+        with self._lock:
+            for match in [m for m, t in self.datetime_real_off.items() if t <= delete_from]:
+                self.datetime_real_off.pop(match)
+                self.start.pop(match, None)
+                self._dirty = True
+
+    def flush(self) -> None:
+        """ Append the changes to the journal"""
+        if self.read_only:
+            return
+        with self._lock:
+            changes, self._journal = self._journal, []
+        if len(changes) == 0:
+            return
+        with self._io_lock:
+            with open(self.journal_path, 'a') as journal:
+                journal.write(''.join(json.dumps(change) + '\n' for change in changes))
+
+    def checkpoint(self) -> None:
+        """ Write the snapshot and truncate the journal, if there are changes since the last snapshot"""
+        if self.read_only:
+            return
+        self.evict()
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {'datetime_real_off': dict(self.datetime_real_off), 'start': dict(self.start)}
+            self._journal = []  # included in the snapshot
+            self._dirty = False
+        with self._io_lock:
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+            if os.path.isfile(self.journal_path):
+                os.remove(self.journal_path)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.checkpoint()
+
+    def _run(self) -> None:
+        last_checkpoint = time.monotonic()
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                if time.monotonic() - last_checkpoint >= self.checkpoint_seconds:
+                    self.checkpoint()
+                    last_checkpoint = time.monotonic()
+                else:
+                    self.flush()
+            except OSError as e:
+                logger.error(f'Error saving actual off in {self.path}: {e}')
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_actual_off_store(path: str, read_only: bool = False) -> ActualOffStore:
+    """ Store shared by all the Trading objects of the process (provider and its restarts)"""
+    with _stores_lock:
+        if (path, read_only) not in _stores:
+            _stores[(path, read_only)] = ActualOffStore(path, read_only=read_only)
+        return _stores[(path, read_only)]
@@ -1,12 +1,16 @@
 __version__ = 0.06
 
 import os
+import re
 import json
+import time
 from os.path import join
 import datetime as dt
+from src.domain.services.stats.latency import LatencyStats
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
 except:
     msg = 'ERROR: Requests module not installed.\n'
     msg += 'INSTALLATION (run as admin):\n'
@@ -15,17 +19,27 @@ except:
     print(msg)
     exit()
 
+try:
+    import orjson  # faster json decoder if it is installed
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+_method_regex = re.compile(r'"method": "([^"]+)"')
+
 
 class Api(object):
     """betfair api-ng library"""
 
-    def __init__(self, path_ssl_certs, aus=False, ssl_prefix='', locale='', ):
+    def __init__(self, path_ssl_certs, aus=False, ssl_prefix='', locale='', pool_maxsize=10):
         """initiate the api-ng library.
         @aus: type = boolean. if True, use australian endpoints (default = UK exchange)
         @ssl_prefix: type = string. prefix for ssl certs, e.g. 'USERNAME' if certs
             are named 'USERNAME.key', 'USERNAME.crt' or 'USERNAME.pem'
         @locale: type = string. if empty, defaults to your account language.
             ISO codes: http://en.wikipedia.org/wiki/List_of_ISO_639-1_codes
+        @pool_maxsize: type = integer. connections kept alive by host, one for each thread
+            asking at the same time (the pool of market books has 10 threads).
         """
         self.abs_path = os.path.abspath(os.path.dirname(__file__))
         self.certs_paths = self.load_ssl_cert_paths(path_ssl_certs, ssl_prefix)
@@ -33,6 +47,21 @@ class Api(object):
         self.app_key = ''  # Use create_app_keys() or see online api docs.
         self.locale = locale
         self.session_token = ''
+        self.latency = LatencyStats()  # latency by endpoint
+        self.session = self.create_session(pool_maxsize)
+
+    @staticmethod
+    def create_session(pool_maxsize=10):
+        """returns a requests session reusing the connections (keep-alive, one TLS handshake by connection)"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get_latency_stats(self):
+        """returns dict with count, mean, p50, p99 and max latency in seconds by endpoint"""
+        return self.latency.summary()
 
     def load_ssl_cert_paths(self, path_ssl_certs, ssl_prefix=''):
         """loads the ssl cert filepaths.
@@ -86,15 +115,20 @@ class Api(object):
         # check if we need to send app_key
         if 'DeveloperAppKeys' not in data:  # NOT a get/createDeveloperAppKeys request
             headers['X-Application'] = self.app_key
+        # endpoint for latency stats, method of json-rpc or path of the url
+        endpoint = _method_regex.search(data) if data else None
+        endpoint = endpoint.group(1) if endpoint else url.split('.com', 1)[-1]
         # send request
+        start = time.perf_counter()
         if data:  # POST
-            resp = requests.post(url, data, cert=ssl_cert, headers=headers, timeout=60)
+            resp = self.session.post(url, data, cert=ssl_cert, headers=headers, timeout=60)
         else:  # GET
-            resp = requests.get(url, cert=ssl_cert, headers=headers, timeout=60)
+            resp = self.session.get(url, cert=ssl_cert, headers=headers, timeout=60)
         # check response
         if resp.status_code == 200:
             # save session token
-            resp_json = resp.json()
+            resp_json = _json_loads(resp.content)
+            self.latency.add(endpoint, time.perf_counter() - start)
             if 'sessionToken' in resp_json:
                 self.session_token = resp_json['sessionToken']
             # return json
@@ -406,9 +440,10 @@ class Api(object):
             return resp
 
     def get_settled_bets(self, group_by='BET', req_id=1, fecha_inicial=dt.datetime(2014, 1, 1),
-                         fecha_final=dt.datetime.now()):
+                         fecha_final=dt.datetime.now(), bet_ids=None):
         """returns settled bets for given market ids.
         @market_id: type = string
+        @bet_ids: type = list. OPTIONAL just these bets
         @group_by: type = string. either 'MARKET' OR 'BET'
             'MARKET' = group response as market total including commission.
                 Individual bets are NOT included!
@@ -436,6 +471,8 @@ class Api(object):
         params['betStatus'] = 'SETTLED'  # settled bets only
         params['groupBy'] = group_by
         params['includeItemDescription'] = True
+        if bet_ids is not None:
+            params['betIds'] = bet_ids
         req = {
             'jsonrpc': '2.0',
             'method': 'SportsAPING/v1.0/listClearedOrders',
@@ -526,7 +563,8 @@ class Api(object):
         url = 'https://api.betfair.com/exchange/betting/json-rpc/v1'
         if self.aus: url = 'https://api-au.betfair.com/exchange/betting/json-rpc/v1'
         params = {}
-        params['betId'] = betIds
+        if betIds is not None:
+            params['betIds'] = betIds if type(betIds) is list else [betIds]
         req = {
             'jsonrpc': '2.0',
             'method': 'SportsAPING/v1.0/listCurrentOrders',
@@ -563,12 +601,15 @@ class Api(object):
             raise Exception(str(resp))
 
     def cancelOrders(self, betId=None, market_id=None, req_id=1):
-        """cancelo las apuestas que no hayan cumplido las condiciones"""
+        """cancelo las apuestas que no hayan cumplido las condiciones
+        @betId: type = string or list of strings to cancel several bets of the market in one request
+        """
         url = 'https://api.betfair.com/exchange/betting/json-rpc/v1'
         if self.aus: url = 'https://api-au.betfair.com/exchange/betting/json-rpc/v1'
         params = {}
         params['marketId'] = market_id
-        params["instructions"] = [{"betId": betId, "sizeReduction": None}]
+        bet_ids = betId if type(betId) is list else [betId]
+        params["instructions"] = [{"betId": bet_id, "sizeReduction": None} for bet_id in bet_ids]
         req = {
             'jsonrpc': '2.0',
             'method': 'SportsAPING/v1.0/cancelOrders',
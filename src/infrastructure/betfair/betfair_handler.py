@@ -4,14 +4,17 @@ from time import sleep
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import os
 from os.path import join
 from pathlib import Path
 from src.infrastructure.betfair.api import Api
+from src.infrastructure.betfair.stream import BetfairStream, StreamError, STREAM_HOST, STREAM_HOST_AUS, \
+    STREAM_PORT, SESSION_ERRORS
+from src.infrastructure.betfair.pending_bets import PendingBets
+from src.infrastructure.betfair.bets_batcher import BetsBatcher
+from src.infrastructure.betfair.actual_off import ActualOffStore, get_actual_off_store
+from src.infrastructure.brokerMQ import Emit_Events
 from concurrent.futures import ThreadPoolExecutor, wait
 from src.domain.models.betting.odds import Odds
-import json
-import threading
 from src.application.base_logger import logger
 from src.domain.abstractions.abstract_trading_betting import Abstract_Trading
 
@@ -88,25 +91,6 @@ def _get_parameters(settings: dict, minutes: int, live: bool):
     return parameters
 
 
-def _load_actual_off():
-    """Load actual off file"""
-    # if it not exists we create an empty file
-    if not os.path.isfile(file_real_actual_off):
-        with open(file_real_actual_off, 'w') as f:
-            json.dump({'datetime_real_off': {}, 'start': {}}, f)  # key: match
-
-    try:
-        with open(file_real_actual_off, 'r') as json_data:
-            data = json.load(json_data)
-    except:
-        os.remove(file_real_actual_off)
-        with open(file_real_actual_off, 'w') as f:
-            json.dump({'datetime_real_off': {}, 'start': {}}, f)  # key: match
-        with open(file_real_actual_off, 'r') as json_data:
-            data = json.load(json_data)
-    return data
-
-
 class Trading(Abstract_Trading):
     """Class for trading Betting on Betfair.
 
@@ -117,12 +101,27 @@ class Trading(Abstract_Trading):
     """
 
     def __init__(self, settings_real_time: dict = {}, callback_real_time: callable = _callable,
-                 exchange_or_broker: str = 'betfair', config_broker: Dict = {}):
+                 exchange_or_broker: str = 'betfair', config_broker: Dict = {}, send_orders_status: bool = False,
+                 config_brokermq: Dict = {}, batch_seconds: float = 0.2, actual_off_writer: bool = False):
         """Initialize class."""
         super().__init__(settings_real_time=settings_real_time, callback_real_time=callback_real_time,
                          exchange_or_broker=exchange_or_broker, config_broker=config_broker)
         self.client = self.get_client()
-        self.data_actual_off = _load_actual_off()
+        # the provider writes the actual off, the other services open the file read only when they need it
+        self.actual_off_writer = actual_off_writer
+        self._data_actual_off = None
+        self.send_orders_status = send_orders_status
+        if self.send_orders_status:
+            self.emit_orders = Emit_Events(config=config_brokermq)
+        else:
+            self.emit_orders = None
+        # bets of the same market are placed together by queue_order
+        self.batch_seconds = batch_seconds
+        self.bets_batcher = None
+        # one thread checks all the pending bets
+        self.pending_bets = PendingBets(get_current_orders=self.get_current_bets, cancel_orders=self.cancel_bets,
+                                        get_cleared_orders=self._get_settled_bets_by_id,
+                                        on_update=self._publish_bet_status)
 
     def get_client(self):
         """Get Betfair client.
@@ -156,28 +155,62 @@ class Trading(Abstract_Trading):
         ----------
         bet: event bet
         """
+        self.send_orders(bet.ticker_id, [bet])
+
+    def queue_order(self, bet: dataclasses.dataclass) -> None:
+        """Send order with the other bets of the same market received in batch_seconds.
+
+        Parameters
+        ----------
+        bet: event bet
+        """
+        if self.bets_batcher is None:
+            self.bets_batcher = BetsBatcher(self.send_orders, window_seconds=self.batch_seconds)
+        self.bets_batcher.add(bet)
+
+    def send_orders(self, ticker_id, bets: list) -> None:
+        """Send orders of the same market in one placeOrders.
+        placeOrders fails as a whole when one instruction fails and reports the others with ERROR_IN_ORDER, these
+        bets are sent again one by one.
 
-        logger.info(f'Bet received: {bet.match_name}')
-        bet_info = bet.bet_prepare()
+        Parameters
+        ----------
+        ticker_id: market id
+        bets: list of events bet
+        """
+        for bet in bets:
+            logger.info(f'Bet received: {bet.match_name}')
+        bet_info = [instruction for bet in bets for instruction in bet.bet_prepare()]
         msg = 'PLACING %d BETS...\n' % len(bet_info)
         msg += '%s' % bet_info
         print(msg)
-        resp = self.client.place_bets(bet.ticker_id, bet_info)
+        resp = self.client.place_bets(ticker_id, bet_info)
         print(resp)
+        reports = []
         if type(resp) is dict and 'status' in resp:
-            if resp['status'] == 'SUCCESS':
-                # updated bets field
-                bet.bet_id = resp['instructionReports'][0]['betId']
-                logger.info(f'Bet placed correctly: {bet.match_name} with betiId: {bet.bet_id}')
-                if resp['instructionReports'][0]['sizeMatched'] == bet.quantity:
-                    bet.quantity_execute = bet.quantity
-                    bet.quantity_left = 0
-                else:
-                    bet.quantity_execute = float(resp['instructionReports'][0]['sizeMatched'])
-                    bet.quantity_left = bet.quantity - bet.quantity_execute
-                bet_failed = False
+            reports = resp.get('instructionReports', [])
+        # reports are in the same order than the instructions
+        for n, bet in enumerate(bets):
+            report = reports[n] if n < len(reports) else None
+            if report is not None and report.get('errorCode') == 'ERROR_IN_ORDER' and len(bets) > 1:
+                logger.info(f'Bet not placed by the error of other bet, sending it alone: {bet.match_name}')
+                self.send_orders(ticker_id, [bet])
+                continue
+            self._update_bet(bet, report)
+
+    def _update_bet(self, bet: dataclasses.dataclass, report: Dict) -> None:
+        """Update bet with the instruction report of placeOrders"""
+        if report is not None and report.get('status') == 'SUCCESS':
+            # updated bets field
+            bet.bet_id = report['betId']
+            logger.info(f'Bet placed correctly: {bet.match_name} with betiId: {bet.bet_id}')
+            if report['sizeMatched'] == bet.quantity:
+                bet.quantity_execute = bet.quantity
+                bet.quantity_left = 0
             else:
-                bet_failed = True
+                bet.quantity_execute = float(report['sizeMatched'])
+                bet.quantity_left = bet.quantity - bet.quantity_execute
+            bet_failed = False
         else:
             bet_failed = True
         # raise error if bet placement failed
@@ -186,6 +219,8 @@ class Trading(Abstract_Trading):
             bet.status = 'Failed'
             bet.quantity_execute = 0
             bet.quantity_left = bet.quantity
+            if report is not None:
+                bet.error_description = report.get('errorCode')
 
         elif not bet_failed:  # the bet is good
             if bet.quantity_execute < bet.quantity:
@@ -198,83 +233,48 @@ class Trading(Abstract_Trading):
 
                 except Exception as e:
                     logger.error(f'Error manage pending bet in {bet.match_name} with betiId: {bet.bet_id}')
-                    print('Fail to cancel bet ' + e)
+                    print('Fail to cancel bet ' + str(e))
 
             else:
                 # completed bets
                 logger.info(f'Bet Completed: {bet.match_name} with betiId: {bet.bet_id}')
                 bet.status = 'Completed'
                 print('BET COMPLETED :' + str(bet))
-                bet.filled_price = float(resp['instructionReports'][0]['averagePriceMatched'])
+                bet.filled_price = float(report['averagePriceMatched'])
 
         print(bet)
 
     def _manage_pending_bet(self, bet):
         """
-        launch a thread to manage the pending bet
+        schedule the check of the pending bet after bet.cancel_seconds
         :param bet:
         :return:
         """
-
-        def run_pending_bets(_bet):
-            """
-            Run pending bet
-            :return:
-            """
-            print('Manage this pending bet: '+_bet)
-            sleep(_bet.cancel_seconds)
-            no_found = True
-            disc_mens = {'betId': []}
-            for currentOrder in self.get_current_bets():
-                if len(currentOrder) > 0:
-                    disc_mens['betId'].append(currentOrder['betId'])
-                    if currentOrder['betId'] == _bet.bet_id:
-                        no_found = False
-                        _bet.quantity_execute = currentOrder['sizeMatched']
-                        # if it has not been executed after x minutes we cancel
-                        if _bet.quantity > _bet.quantity_execute:  # cancel
-                            _bet.quantity_left = _bet.quantity - _bet.quantity_execute
-                            self.cancel_bet(_bet)
-                        else:  # if it executed
-                            logger.info(f'Bet Completed: {_bet.match_name} with betiId: {_bet.bet_id}')
-                            print('BETS COMPLETED IN' + str(_bet.cancel_seconds) + ' SECONDS')
-                            _bet.quantity_left = 0
-                            _bet.filled_price = float(currentOrder['averagePriceMatched'])
-
-            if no_found:
-                try:
-                    bets_market_id = self.get_settled_bets(init_datetime=datetime.now() - timedelta(days=1))
-                    for bet_settled in bets_market_id:
-                        if bet_settled['betId'] == _bet.bet_id:
-                            _bet.quantity_execute = _bet.quantity
-                            _bet.quantity_left = 0
-                            print('BETS COMPLETED IN' + str(_bet.cancel_seconds) + ' SECONDS')
-                            logger.info(f'Bet Completed: {_bet.match_name} with betiId: {_bet.bet_id}')
-                            _bet.filled_price = float(bet_settled['priceMatched'])
-                            no_found = False
-
-                except Exception as e:
-                    print('Error to get_settled_bets_market_id')
-                    logger.error(f'Error get settled betd in {_bet.match_name} with betiId: {_bet.bet_id}')
-
-            if no_found:
-                logger.info(f'Bet dont found: {_bet.match_name} with betiId: {_bet.bet_id}')
-                msg = 'manage_pending_bet dont match ' + str(_bet.bet_id) + ' :' + str(disc_mens)
-                print(msg)
-
-        t = threading.Thread(target=run_pending_bets, args=(bet,))
-        t.daemon = True
-        t.start()
-
-    def get_current_bets(self):
+        self.pending_bets.add(bet)
+
+    def _publish_bet_status(self, bet):
+        """ publish the bet with the status updated"""
+        logger.debug(f'Bet status {bet}')
+        if self.send_orders_status:
+            bet.datetime = datetime.utcnow()
+            self.emit_orders.publish_event('bet_status', bet)
+
+    def _get_settled_bets_by_id(self, bet_ids):
+        """ settled bets of the last day with these bet ids"""
+        end_datetime = datetime.now()
+        return self.get_settled_bets(init_datetime=end_datetime - timedelta(days=1), end_datetime=end_datetime,
+                                     bet_ids=bet_ids)
+
+    def get_current_bets(self, bet_ids=None):
         """
         get current bets
+        :param bet_ids: list of bet ids, by default all the current bets
         :return:
             list of currents bets
         """
 
         _datetime = datetime.now()
-        resp = self.client.get_current_bets()
+        resp = self.client.get_current_bets(betIds=bet_ids)
         list_result = []
         if type(resp) is dict and 'result' in resp:
             if len(resp['result']['currentOrders']) > 0:
@@ -294,12 +294,14 @@ class Trading(Abstract_Trading):
             logger.error('Fail get_current_bets')
         return list_result
 
-    def get_settled_bets(self, init_datetime=datetime(2022, 8, 1), end_datetime=datetime.now(), req_id=1):
+    def get_settled_bets(self, init_datetime=datetime(2022, 8, 1), end_datetime=datetime.now(), req_id=1,
+                         bet_ids=None):
         """
         get settled bets
         :param init_datetime:
         :param end_datetime:
         :param req_id: by default is 1
+        :param bet_ids: list of bet ids, by default all the settled bets
         :return:
             list of settled bets between 2 two dates
         """
@@ -314,7 +316,7 @@ class Trading(Abstract_Trading):
                 any_bets = False
             print('downloading from : ' + str(minimum) + 'to : ' + str(maximum))
             resp = self.client.get_settled_bets(group_by='BET', req_id=req_id, fecha_inicial=minimum,
-                                                fecha_final=maximum)
+                                                fecha_final=maximum, bet_ids=bet_ids)
 
             if type(resp) is dict and 'clearedOrders' in resp:
                 if len(resp['clearedOrders']) == 0:
@@ -372,6 +374,20 @@ class Trading(Abstract_Trading):
             logger.error(f'Error Cancel bet in {bet.match_name} with betiId {bet.bet_id}')
             print(resp)
 
+    def cancel_bets(self, market_id, bet_ids):
+        """Cancel several bets of a market in one request.
+
+        Parameters
+        ----------
+        market_id: market of the bets
+        bet_ids: list of bet ids
+        """
+        logger.info(f'Cancel bets in market {market_id} with betIds {bet_ids}')
+        resp = self.client.cancelOrders(betId=bet_ids, market_id=market_id)
+        if type(resp) is not dict or resp.get('status') != 'SUCCESS':
+            logger.error(f'Error Cancel bets in market {market_id} with betIds {bet_ids}: {resp}')
+        return resp
+
     def get_account_details(self) -> Dict:
         """ get details from account"""
         try:
@@ -478,34 +494,22 @@ class Trading(Abstract_Trading):
 
         return False
 
+    @property
+    def data_actual_off(self) -> ActualOffStore:
+        if getattr(self, '_data_actual_off', None) is None:
+            self._data_actual_off = get_actual_off_store(file_real_actual_off,
+                                                         read_only=not getattr(self, 'actual_off_writer', False))
+        return self._data_actual_off
+
+    @data_actual_off.setter
+    def data_actual_off(self, store: ActualOffStore) -> None:
+        self._data_actual_off = store
+
     def _save_dt_actual_off(self, odd):
         """Save actual off"""
-
         # Save dt_actual_off to use this info in all selections of the same match
-        key = odd.match_name
-        if key not in self.data_actual_off:  # if we don't have the match saved
-            print('Saving new match: ' + key)
-            delete_from = (datetime.today() - timedelta(days=4)).timestamp()
-            self.data_actual_off['datetime_real_off'][key] = odd.datetime_scheduled_off.timestamp()
-            self.data_actual_off['start'][key] = odd.in_play
-            # We delete matchs older than two days to avoid a very large file
-            for match in list(self.data_actual_off['datetime_real_off']):
-                if self.data_actual_off['datetime_real_off'][match] <= delete_from:
-                    self.data_actual_off['datetime_real_off'].pop(match)
-                    self.data_actual_off['start'].pop(match)
-            with open(file_real_actual_off, 'w') as f:  # saving in json
-                json.dump(self.data_actual_off, f)
-        elif odd.in_play:  # if we have the match and is in play
-            if not self.data_actual_off['start'][key]:  # not in play
-                print('Starting match: ' + key)
-                if odd.datetime >= odd.datetime_scheduled_off:
-                    self.data_actual_off['datetime_real_off'][key] = odd.datetime.timestamp()
-                else:
-                    self.data_actual_off['datetime_real_off'][key] = odd.datetime_scheduled_off.timestamp()
-                self.data_actual_off['start'][key] = odd.in_play
-                with open(file_real_actual_off, 'w') as f:  # saving updated info in json
-                    json.dump(self.data_actual_off, f)
-        return self.data_actual_off['datetime_real_off'][key]
+        return self.data_actual_off.update(odd.match_name, odd.datetime_scheduled_off.timestamp(),
+                                           odd.datetime.timestamp(), odd.in_play)
 
     def processing_data(self, books: list):
         """Processing data and create events odds with the info"""
@@ -684,7 +688,8 @@ def get_realtime_data(settings: dict, callback: callable = _callable, config_bro
 
     """
 
-    trading = Trading(settings_real_time=settings, callback_real_time=callback, config_broker=config_broker)
+    trading = Trading(settings_real_time=settings, callback_real_time=callback, config_broker=config_broker,
+                      actual_off_writer=True)
     total = 100000
     sum_seg = 0
     # if session is True
@@ -710,4 +715,73 @@ def get_realtime_data(settings: dict, callback: callable = _callable, config_bro
                     time_books = settings['time_books_play']  # if there are live events
             sum_seg += time_books
             print(sum_seg)
-        sleep(time_books)
\ No newline at end of file
+        sleep(time_books)
+
+
+def get_realtime_data_stream(settings: dict, callback: callable = _callable, config_broker={},
+                             stream_host: str = None, stream_port: int = STREAM_PORT, use_ssl: bool = True) -> None:
+    """Return realtime data for a list of tickers (Events) from the Exchange Stream API. [Source: Betfair]
+    Markets are still searched with the api every time_events seconds, the books are pushed by the stream
+    and odds are sent just for the selections that have changed.
+
+    Parameters
+    ----------
+    settings: dict
+        Parameters to get info
+    callback: callable (data: Dict) -> None
+
+    """
+
+    trading = Trading(settings_real_time=settings, callback_real_time=callback, config_broker=config_broker,
+                      actual_off_writer=True)
+    if stream_host is None:
+        stream_host = STREAM_HOST_AUS if trading.client.aus else STREAM_HOST
+    stream = None
+    connected = False
+    last_events = None
+    subscribed = []
+    while True:
+        try:
+            if last_events is None or (datetime.utcnow() - last_events).total_seconds() >= settings['time_events']:
+                last_events = datetime.utcnow()
+                # Search live events and next events
+                trading.get_events()
+            if stream is None:
+                stream = BetfairStream(app_key=trading.client.app_key, session_token=trading.client.session_token,
+                                       host=stream_host, port=stream_port, use_ssl=use_ssl,
+                                       heartbeat_ms=settings.get('heartbeat_ms', 5000),
+                                       conflate_ms=settings.get('conflate_ms', 0))
+                stream.connect()
+                connected = True
+            elif not connected:  # reconnection with the same cache, ask just for the deltas missed
+                stream.reconnect(session_token=trading.client.session_token)
+                connected = True
+            # list of ticker ids
+            ticker_ids = sorted(trading.next_events.keys())
+            if ticker_ids != subscribed:
+                subscribed = ticker_ids
+                stream.subscribe(subscribed)
+            if len(subscribed) == 0:
+                sleep(settings['time_books_not_play'])
+                continue
+            market_books = stream.read()
+            if len(market_books) > 0:
+                trading.processing_data(market_books)
+                for book in market_books:
+                    if book['status'] == 'CLOSED':
+                        stream.cache.remove(book['marketId'])
+
+        except StreamError as e:
+            logger.error(f'Error in Betfair stream {e}')
+            if e.error_code in SESSION_ERRORS:  # login again
+                trading.client = trading.get_client()
+            if stream is not None:
+                stream.close()
+            connected = False
+            sleep(1)
+        except (ConnectionError, OSError) as e:
+            logger.error(f'Betfair stream disconnected {e}')
+            if stream is not None:
+                stream.close()
+            connected = False
+            sleep(1)
\ No newline at end of file
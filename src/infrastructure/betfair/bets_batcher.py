@@ -0,0 +1,60 @@
+""" Coalesce the bets of the same market received in a short window.
+Betfair accepts up to 200 instructions of one market in each placeOrders, so the bets that the strategies
+fire on several selections of the same market in the same poll are placed in one round trip.
+"""
+import logging
+import threading
+import time
+
+MAX_INSTRUCTIONS = 200  # limit of instructions by placeOrders
+
+logger = logging.getLogger(__name__)
+
+
+class BetsBatcher(object):
+    """ Group bets by ticker_id (market) and call place(ticker_id, bets) window_seconds after the first one.
+
+    Parameters
+    ----------
+    place: callable(ticker_id, bets) that places the bets of a market
+    window_seconds: time waiting for more bets of the same market
+    """
+
+    def __init__(self, place: callable, window_seconds: float = 0.2):
+        self.place = place
+        self.window_seconds = window_seconds
+        self._batches = {}  # key: ticker_id, value: [deadline, list of bets]
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, bet) -> None:
+        with self._condition:
+            batch = self._batches.get(bet.ticker_id)
+            if batch is None:
+                self._batches[bet.ticker_id] = [time.monotonic() + self.window_seconds, [bet]]
+                self._condition.notify()
+            else:
+                batch[1].append(bet)
+
+    def _pop_due(self) -> list:
+        with self._condition:
+            while True:
+                if len(self._batches) == 0:
+                    self._condition.wait()
+                    continue
+                now = time.monotonic()
+                due = [ticker_id for ticker_id, (deadline, _) in self._batches.items() if deadline <= now]
+                if len(due) == 0:
+                    self._condition.wait(min(deadline for deadline, _ in self._batches.values()) - now)
+                    continue
+                return [(ticker_id, self._batches.pop(ticker_id)[1]) for ticker_id in due]
+
+    def _run(self) -> None:
+        while True:
+            for ticker_id, bets in self._pop_due():
+                for i in range(0, len(bets), MAX_INSTRUCTIONS):
+                    try:
+                        self.place(ticker_id, bets[i:i + MAX_INSTRUCTIONS])
+                    except Exception as e:
+                        logger.error(f'Error placing bets in market {ticker_id}: {e}')
@@ -0,0 +1,165 @@
+""" Manage the bets not fully matched when they are placed.
+A single thread keeps a heap of bets ordered by the time when they must be checked (placed + cancel_seconds).
+The bets due at the same time are checked together: one listCurrentOrders filtered by their betIds, one
+cancelOrders by market for the bets not fully matched and one listClearedOrders for the bets not found.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PendingBets(object):
+    """ Scheduler of pending bets.
+
+    Parameters
+    ----------
+    get_current_orders: callable(bet_ids) -> list of currentOrders of listCurrentOrders
+    cancel_orders: callable(market_id, bet_ids) -> result of cancelOrders
+    get_cleared_orders: callable(bet_ids) -> list of clearedOrders of listClearedOrders
+    on_update: callable(bet) called when the status of the bet is known
+    batch_seconds: bets due in this window are checked in the same requests
+    """
+
+    def __init__(self, get_current_orders: callable, cancel_orders: callable, get_cleared_orders: callable,
+                 on_update: callable = None, batch_seconds: float = 1.0):
+        self.get_current_orders = get_current_orders
+        self.cancel_orders = cancel_orders
+        self.get_cleared_orders = get_cleared_orders
+        self.on_update = on_update
+        self.batch_seconds = batch_seconds
+        self._heap = []  # (due time, sequence, bet)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stop = False
+
+    def __len__(self):
+        with self._condition:
+            return len(self._heap)
+
+    def add(self, bet, delay: float = None) -> None:
+        """ Schedule the check of the bet after delay seconds, by default bet.cancel_seconds"""
+        delay = bet.cancel_seconds if delay is None else delay
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._sequence), bet))
+            if self._thread is None:
+                self._stop = False
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stop = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _pop_due(self) -> list:
+        """ Wait until the first bet is due and return it with the bets due in the batch window"""
+        with self._condition:
+            while not self._stop:
+                if len(self._heap) == 0:
+                    self._condition.wait()
+                    continue
+                wait = self._heap[0][0] - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                limit = time.monotonic() + self.batch_seconds
+                bets = []
+                while len(self._heap) > 0 and self._heap[0][0] <= limit:
+                    bets.append(heapq.heappop(self._heap)[2])
+                return bets
+            return []
+
+    def _run(self) -> None:
+        while not self._stop:
+            bets = self._pop_due()
+            if len(bets) > 0:
+                try:
+                    self.check(bets)
+                except Exception as e:
+                    logger.error(f'Error checking pending bets {[bet.bet_id for bet in bets]}: {e}')
+
+    def check(self, bets: list) -> None:
+        """ Update the bets with the current orders, cancel the part not matched and search the not found
+        bets in the cleared orders"""
+        bets_by_id = {bet.bet_id: bet for bet in bets}
+        current = {order['betId']: order for order in self.get_current_orders(list(bets_by_id.keys()))}
+        to_cancel = {}  # key: market_id, value: list of bets
+        updated = []
+        not_found = []
+        for bet_id, bet in bets_by_id.items():
+            order = current.get(bet_id)
+            if order is None:
+                not_found.append(bet)
+                continue
+            bet.quantity_execute = float(order['sizeMatched'])
+            if order.get('averagePriceMatched'):
+                bet.filled_price = float(order['averagePriceMatched'])
+            if bet.quantity > bet.quantity_execute:  # not matched after cancel_seconds, cancel
+                bet.quantity_left = bet.quantity - bet.quantity_execute
+                to_cancel.setdefault(bet.ticker_id, []).append(bet)
+            else:
+                logger.info(f'Bet Completed: {bet.match_name} with betiId: {bet.bet_id}')
+                bet.quantity_left = 0
+                bet.status = 'Completed'
+                updated.append(bet)
+
+        for market_id, market_bets in to_cancel.items():
+            updated.extend(self._cancel(market_id, market_bets))
+
+        if len(not_found) > 0:
+            updated.extend(self._search_cleared(not_found))
+
+        if self.on_update is not None:
+            for bet in updated:
+                self.on_update(bet)
+
+    def _cancel(self, market_id: str, bets: list) -> list:
+        """ Cancel the bets of a market in one request"""
+        try:
+            resp = self.cancel_orders(market_id, [bet.bet_id for bet in bets])
+        except Exception as e:
+            logger.error(f'Error Cancel bets in market {market_id}: {e}')
+            return []
+        reports = {}
+        if type(resp) is dict:
+            reports = {report['instruction']['betId']: report for report in resp.get('instructionReports', [])}
+        updated = []
+        for bet in bets:
+            report = reports.get(bet.bet_id)
+            if report is not None and report.get('status') == 'SUCCESS':
+                logger.info(f'Bet Cancelled: {bet.match_name} with betiId: {bet.bet_id}')
+                bet.status = 'Cancelled'
+                updated.append(bet)
+            else:
+                logger.error(f'Error Cancel bet in {bet.match_name} with betiId {bet.bet_id}: {report}')
+        return updated
+
+    def _search_cleared(self, bets: list) -> list:
+        """ Bets not in the current orders have been matched and settled"""
+        try:
+            cleared = {order['betId']: order for order in self.get_cleared_orders([bet.bet_id for bet in bets])}
+        except Exception as e:
+            logger.error(f'Error get settled bets {[bet.bet_id for bet in bets]}: {e}')
+            return []
+        updated = []
+        for bet in bets:
+            order = cleared.get(bet.bet_id)
+            if order is None:
+                logger.info(f'Bet dont found: {bet.match_name} with betiId: {bet.bet_id}')
+                continue
+            logger.info(f'Bet Completed: {bet.match_name} with betiId: {bet.bet_id}')
+            bet.quantity_execute = bet.quantity
+            bet.quantity_left = 0
+            bet.filled_price = float(order['priceMatched'])
+            bet.status = 'Completed'
+            updated.append(bet)
+        return updated
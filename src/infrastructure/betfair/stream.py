@@ -0,0 +1,250 @@
+""" Betfair Exchange Stream API.
+Docs: https://docs.developer.betfair.com/display/1smk3cen4v3lu3yomq5qye0ni/Exchange+Stream+API
+
+Messages are CRLF delimited json over a TLS socket. The server pushes a full image of every subscribed
+market first and then only the deltas, so the MarketCache keeps the books in memory and returns the
+markets changed by each message in the same format as listMarketBook.
+"""
+import json
+import logging
+import socket
+import ssl
+from datetime import datetime
+
+STREAM_HOST = 'stream-api.betfair.com'
+STREAM_HOST_AUS = 'stream-api.betfair.com.au'
+STREAM_PORT = 443
+STREAM_FIELDS = ['EX_BEST_OFFERS', 'EX_MARKET_DEF', 'EX_LTP', 'EX_TRADED_VOL']
+SESSION_ERRORS = ['NO_SESSION', 'INVALID_SESSION_INFORMATION', 'NOT_AUTHORIZED']
+
+logger = logging.getLogger(__name__)
+
+
+class StreamError(ConnectionError):
+    """ Error sent by betfair in a status message"""
+    def __init__(self, error_code: str = None, error_message: str = None):
+        super().__init__(f'Betfair stream {error_code}: {error_message}')
+        self.error_code = error_code
+
+
+def _pt_to_iso(pt: int) -> str:
+    """ Publish time of betfair (milliseconds) to the format used by lastMatchTime in listMarketBook"""
+    return datetime.utcfromtimestamp(pt / 1000).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def _update_ladder(ladder: dict, deltas: list) -> None:
+    """ Update level based ladder, delta is [level, price, size], size 0 removes the level"""
+    for level, price, size in deltas:
+        if size == 0:
+            ladder.pop(level, None)
+        else:
+            ladder[level] = (price, size)
+
+
+class MarketCache(object):
+    """ In memory books of the markets subscribed, updated with the deltas of the stream"""
+
+    def __init__(self, ladder_levels: int = 3):
+        self.ladder_levels = ladder_levels
+        self.markets = {}  # key: market_id, value: dict with the state of the market
+        self.initial_clk = None
+        self.clk = None
+
+    def _new_market(self, market_id: str) -> dict:
+        market = {'marketId': market_id, 'status': 'OPEN', 'inplay': False, 'totalMatched': 0.0,
+                  'numberOfActiveRunners': None, 'numberOfWinners': None, 'lastMatchTime': None,
+                  'runners': {}}
+        self.markets[market_id] = market
+        return market
+
+    @staticmethod
+    def _new_runner(market: dict, selection_id: int) -> dict:
+        runner = {'selectionId': selection_id, 'status': 'ACTIVE', 'totalMatched': 0.0,
+                  'back': {}, 'lay': {}}
+        market['runners'][selection_id] = runner
+        return runner
+
+    def update(self, msg: dict) -> list:
+        """ Apply a mcm message, returns a list of market books with the runners that have changed"""
+        if 'initialClk' in msg:
+            self.initial_clk = msg['initialClk']
+        if 'clk' in msg:
+            self.clk = msg['clk']
+        if msg.get('ct') == 'HEARTBEAT' or 'mc' not in msg:
+            return []
+        last_match_time = _pt_to_iso(msg['pt']) if 'pt' in msg else None
+        books = []
+        for mc in msg['mc']:
+            market_id = mc['id']
+            if mc.get('img') or market_id not in self.markets:  # full image replace the market
+                market = self._new_market(market_id)
+            else:
+                market = self.markets[market_id]
+            changed = set()
+            definition = mc.get('marketDefinition')
+            if definition is not None:
+                market['status'] = definition.get('status', market['status'])
+                market['inplay'] = definition.get('inPlay', market['inplay'])
+                market['numberOfActiveRunners'] = definition.get('numberOfActiveRunners',
+                                                                 market['numberOfActiveRunners'])
+                market['numberOfWinners'] = definition.get('numberOfWinners', market['numberOfWinners'])
+                for runner_def in definition.get('runners', []):
+                    runner = market['runners'].get(runner_def['id'])
+                    if runner is None:
+                        runner = self._new_runner(market, runner_def['id'])
+                    runner['status'] = runner_def.get('status', runner['status'])
+                # status of market could affect all the selections
+                changed.update(market['runners'].keys())
+            if 'tv' in mc:
+                market['totalMatched'] = mc['tv']
+            for rc in mc.get('rc', []):
+                runner = market['runners'].get(rc['id'])
+                if runner is None:
+                    runner = self._new_runner(market, rc['id'])
+                if 'batb' in rc:
+                    _update_ladder(runner['back'], rc['batb'])
+                if 'batl' in rc:
+                    _update_ladder(runner['lay'], rc['batl'])
+                if 'ltp' in rc:
+                    runner['lastPriceTraded'] = rc['ltp']
+                if 'tv' in rc:
+                    runner['totalMatched'] = rc['tv']
+                changed.add(rc['id'])
+            if last_match_time is not None:
+                market['lastMatchTime'] = last_match_time
+            if len(changed) > 0:
+                books.append(self.get_market_book(market_id, selection_ids=changed))
+        return books
+
+    def get_market_book(self, market_id: str, selection_ids: set = None) -> dict:
+        """ Return the market as a listMarketBook result, just with selection_ids if they are given"""
+        market = self.markets[market_id]
+        book = {k: v for k, v in market.items() if k not in ['runners', 'lastMatchTime']}
+        if market['lastMatchTime'] is not None:
+            book['lastMatchTime'] = market['lastMatchTime']
+        book['runners'] = []
+        for selection_id, runner in market['runners'].items():
+            if selection_ids is not None and selection_id not in selection_ids:
+                continue
+            runner_book = {'selectionId': selection_id, 'status': runner['status'],
+                           'totalMatched': runner['totalMatched'],
+                           'ex': {'availableToBack': [{'price': p, 'size': s} for _, (p, s) in
+                                                      sorted(runner['back'].items())[:self.ladder_levels]],
+                                  'availableToLay': [{'price': p, 'size': s} for _, (p, s) in
+                                                     sorted(runner['lay'].items())[:self.ladder_levels]]}}
+            if 'lastPriceTraded' in runner:
+                runner_book['lastPriceTraded'] = runner['lastPriceTraded']
+            book['runners'].append(runner_book)
+        return book
+
+    def remove(self, market_id: str) -> None:
+        """ Remove a market from the cache"""
+        self.markets.pop(market_id, None)
+
+
+class BetfairStream(object):
+    """ Client for the Exchange Stream API"""
+
+    def __init__(self, app_key: str, session_token: str, host: str = STREAM_HOST, port: int = STREAM_PORT,
+                 use_ssl: bool = True, heartbeat_ms: int = 5000, conflate_ms: int = 0, ladder_levels: int = 3,
+                 timeout: float = 30):
+        self.app_key = app_key
+        self.session_token = session_token
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.heartbeat_ms = heartbeat_ms
+        self.conflate_ms = conflate_ms
+        self.ladder_levels = ladder_levels
+        self.timeout = timeout
+        self.cache = MarketCache(ladder_levels=ladder_levels)
+        self.connection_id = None
+        self.market_ids = []
+        self._socket = None
+        self._buffer = b''
+        self._id = 0
+
+    def connect(self) -> None:
+        """ Open socket and authenticate"""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        if self.use_ssl:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+        self._socket = sock
+        self._buffer = b''
+        msg = self._receive()
+        if msg.get('op') != 'connection':
+            raise ConnectionError(f'Betfair stream unexpected message on connect: {msg}')
+        self.connection_id = msg.get('connectionId')
+        logger.info(f'Betfair stream connected: {self.connection_id}')
+        self._check_status(self._request({'op': 'authentication', 'appKey': self.app_key,
+                                          'session': self.session_token}))
+
+    def reconnect(self, session_token: str = None) -> None:
+        """ Connect again keeping the cache, the markets subscribed are asked with the clocks of the cache so
+            the server sends just the deltas missed and not the full image"""
+        self.close()
+        if session_token is not None:
+            self.session_token = session_token
+        self.connect()
+        if len(self.market_ids) > 0:
+            self.subscribe(self.market_ids, resubscribe=True)
+
+    def subscribe(self, market_ids: list, resubscribe: bool = False) -> None:
+        """ Subscribe to market ids, it replaces the previous subscription.
+            With resubscribe the clocks of the cache are sent to receive just the deltas missed"""
+        self.market_ids = list(market_ids)
+        msg = {'op': 'marketSubscription', 'marketFilter': {'marketIds': self.market_ids},
+               'marketDataFilter': {'fields': STREAM_FIELDS, 'ladderLevels': self.ladder_levels},
+               'heartbeatMs': self.heartbeat_ms, 'conflateMs': self.conflate_ms}
+        if resubscribe and self.cache.initial_clk is not None:
+            msg['initialClk'] = self.cache.initial_clk
+            msg['clk'] = self.cache.clk
+        else:
+            self.cache = MarketCache(ladder_levels=self.ladder_levels)
+        self._send(msg)
+
+    def read(self) -> list:
+        """ Read next message from the stream and return the market books changed"""
+        msg = self._receive()
+        op = msg.get('op')
+        if op == 'mcm':
+            return self.cache.update(msg)
+        elif op == 'status':
+            self._check_status(msg)
+        return []
+
+    def close(self) -> None:
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+            self._socket = None
+
+    def _request(self, msg: dict) -> dict:
+        """ Send a message and wait for its status"""
+        _id = self._send(msg)
+        while True:
+            response = self._receive()
+            if response.get('op') == 'status' and response.get('id') == _id:
+                return response
+
+    def _send(self, msg: dict) -> int:
+        self._id += 1
+        msg['id'] = self._id
+        self._socket.sendall(json.dumps(msg).encode('utf-8') + b'\r\n')
+        return self._id
+
+    def _receive(self) -> dict:
+        while b'\r\n' not in self._buffer:
+            data = self._socket.recv(65536)
+            if not data:
+                raise ConnectionError('Betfair stream connection closed by server')
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b'\r\n', 1)
+        return json.loads(line)
+
+    @staticmethod
+    def _check_status(msg: dict) -> None:
+        if msg.get('statusCode') == 'FAILURE' or msg.get('connectionClosed'):
+            raise StreamError(msg.get('errorCode'), msg.get('errorMessage'))
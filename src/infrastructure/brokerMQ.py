@@ -8,7 +8,7 @@ import logging
 from src.domain.decorators import log_start_end
 from src.domain.models.trading import bar, tick, timer, order, webhook, petition
 from src.domain.models.betting import odds, bet
-from src.domain.models import health, positions
+from src.domain.models import health, positions, balance, perf_stats
 from dataclasses import dataclass
 import datetime as dt
 import pytz
@@ -18,7 +18,9 @@ warnings.filterwarnings("ignore", category=RuntimeWarning)
 events_type = {'bar': bar.Bar, 'order': order.Order, 'petition': petition.Petition,
                'health': health.Health, 'tick': tick.Tick, 'odds': odds.Odds, 'bet': bet.Bet,
                'financial_order': order.Order, 'positions': positions.Positions, 'order_status': order. Order,
-               'timer': timer.Timer, 'webhook': webhook.WebHook}  #define types of events
+               'bet_status': bet.Bet,
+               'timer': timer.Timer, 'webhook': webhook.WebHook, 'balance': balance.Balance,
+               'perf_stats': perf_stats.PerfStats}  #define types of events
 
 
 logger = logging.getLogger(__name__)
@@ -67,12 +69,20 @@ def get_client(host:str = None, port: int = None, user: str = None, password: st
     Client
         RabbitMQ client.
     """
-
     return pika.BlockingConnection(pika.ConnectionParameters(host=host, port=port,
                                                              credentials=pika.PlainCredentials(user,
                                                                                                password)))
 
 
+def connect(config: dict):
+    """ Connection of the config of brokerMQ: config['connection_factory']() if it is given (the in-process
+    LocalBroker of the benchmarks and tests), RabbitMQ with host, port, user and password otherwise"""
+    connection_factory = config.get('connection_factory')
+    if connection_factory is not None:
+        return connection_factory()
+    return get_client(host=config['host'], port=config['port'], user=config['user'], password=config['password'])
+
+
 class Emit_Events():
     """ Publish MQ for publishing events by topic"""
     def __init__(self, config: dict = None):
@@ -81,8 +91,7 @@ class Emit_Events():
 
     @log_start_end(log=logger)
     def _connect_client(self):
-        self.connection = get_client(host=self.config['host'], port=self.config['port'],
-                                     user=self.config['user'], password=self.config['password'])
+        self.connection = connect(self.config)
         self.properties = pika.BasicProperties(content_type='application/json')
         self.channel = self.connection.channel()
         self.channel.exchange_declare(exchange='events', exchange_type='topic')
@@ -124,8 +133,7 @@ def receive_events(routing_key: str = "#", topic: str ='events', callback: calla
     else:
         callback = _callback
     # Conenect to MQ
-    connection = get_client(host=config['host'], port=config['port'],
-                            user=config['user'], password=config['password'])
+    connection = connect(config)
     channel = connection.channel()
     channel.exchange_declare(exchange=topic, exchange_type='topic')
     result = channel.queue_declare('', exclusive=True)
@@ -10,7 +10,12 @@ from src.infrastructure.brokerMQ import Emit_Events
 import os
 import ccxt
 import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from src.application.base_logger import logger
+from src.infrastructure.crypto.pacing import RatePacer
+from src.infrastructure.crypto.order_tracker import OrderTracker, FINAL_STATUS
+from src.infrastructure.crypto.valuation import Valuation
+from src.domain.services.stats.latency import LatencyStats
 print('CCXT Version:', ccxt.__version__)
 
 
@@ -74,6 +79,15 @@ class Trading(Abstract_Trading):
             self.emit_orders = Emit_Events(config=config_brokermq)
         else:
             self.emit_orders = None
+        # pacing of the requests of the pool of threads asking the last bars
+        self.pacer = RatePacer(interval=self.client.rateLimit / 1000)
+        self.pool_ohlcv = None
+        self.ohlcv_latency = LatencyStats()  # seconds to get the last bar by symbol
+        self.ohlcv_missed = {}  # key: symbol, value: number of deadlines missed
+        # status of the orders sent, the dicts of orders are shared with the tracker thread
+        self._orders_lock = threading.Lock()
+        self.order_tracker = OrderTracker(self.client, on_change=self._on_order_change, pacer=self.pacer)
+        self.valuation = Valuation(self.client, quote='USDT', pacer=self.pacer)
 
     def get_client(self):
         return get_client(exchange=self.exchange_or_broker)
@@ -91,77 +105,130 @@ class Trading(Abstract_Trading):
         setting: dict (default: {'symbols': List[str]})
             Symbols of the assets. Example: BTC-USDT, ETH-USDT, etc.
         """
-        def get_ohlcv_last(symbol, timeframe):
-            ohlcv = self.client.fetch_ohlcv(symbol, timeframe, None, 2)
-            if len(ohlcv):
-                first_candle = ohlcv[0]
-                datetime = self.client.iso8601(first_candle[0])
-                return {'datetime': datetime, 'exchange': self.client.id, 'symbol': symbol,
-                                 'candle': first_candle}
-
-        def get_ohlcv(symbol, timeframe, limit=1500,since=None):
-            ohlcv = self.client.fetch_ohlcv(symbol, timeframe, since, limit)
-            if len(ohlcv):
-                return ohlcv
-
         if type(symbols) is str:
             symbols = [symbols]
         bars = []
         if limit == 2: # last ohlcv
-            for symbol in symbols:
-                    try:
-                        bars.append(get_ohlcv_last(symbol, timeframe))
-                    except Exception as e:
-                        print(type(e).__name__, str(e))
-                        time.sleep(0.1)
-                        bars.append(get_ohlcv_last(symbol, timeframe))
+            for bar in self.get_last_bars(timeframe=timeframe, symbols=symbols):
+                bars.append(bar)
             return bars
         else: # historical data
-            bars = {s: [] for s in symbols}
-            for symbol in symbols:
-                _to_date = self.client.parse8601(str(end_date))  # milliseconds
-                _since = self.client.parse8601(str(start_date))
-                keep_going = True
-                while keep_going:
-                    try:
-                        _df = get_ohlcv(symbol, timeframe, limit=1500, since=_since)
-                        if _df is not None:
-                            df = pd.DataFrame(_df, columns=['datetime', 'open', 'high', 'low', 'close', 'volume'])
-                            df.index = pd.to_datetime(df['datetime'], unit='ms')
-                            df['symbol'] = symbol
-                            df['exchange'] = self.exchange_or_broker
-                            bars[symbol].append(df)
-                            _since = _df[-1][0] + 60000 # 1 min
-                            print(f'{symbol} Since: {self.client.iso8601(_since)}')
-                            if _since >= _to_date:
-                                keep_going = False
-                        if _df is None and timeframe != '1m':
-                            keep_going = False
-                    except Exception as e:
-                        print(type(e).__name__, str(e))
-                        time.sleep(1)
-            if len(bars) > 0:
-                return {s: pd.concat(bars[s]) for s in symbols if s in bars}
-            else:
-                return {}
+            bars = {s: list(self.iter_historical_data(s, timeframe, start_date, end_date, limit=limit))
+                    for s in symbols}
+            return {s: pd.concat(bars[s]) for s in symbols if len(bars[s]) > 0}
+
+    def iter_historical_data(self, symbol: str, timeframe: str = '1m', start_date: dt.datetime = None,
+                             end_date: dt.datetime = None, limit: int = 1500, max_retries: int = 5):
+        """Generator of the pages of candles (DataFrame) of a symbol from start_date until end_date.
+        The requests are paced by the rate limit of the exchange, a page is retried max_retries times
+        before raising the error.
+        """
+        if end_date is None:
+            end_date = dt.datetime.utcnow()
+        period = self.client.parse_timeframe(timeframe) * 1000  # milliseconds
+        _to_date = self.client.parse8601(str(end_date))  # milliseconds
+        _since = self.client.parse8601(str(start_date))
+        retries = 0
+        while _since < _to_date:
+            self.pacer.wait()
+            try:
+                ohlcv = self.client.fetch_ohlcv(symbol, timeframe, _since, limit)
+            except (ccxt.RateLimitExceeded, ccxt.DDoSProtection) as e:
+                logger.warning(f'{symbol} {type(e).__name__} {e}')
+                self.pacer.throttled()
+                continue
+            except Exception as e:
+                retries += 1
+                logger.warning(f'{symbol} {type(e).__name__} {e}, retry {retries}')
+                if retries >= max_retries:
+                    raise
+                time.sleep(retries)
+                continue
+            self.pacer.success()
+            retries = 0
+            ohlcv = [candle for candle in ohlcv if candle[0] < _to_date]
+            if len(ohlcv) == 0:  # gap without trades or before the listing, next window
+                _since += limit * period
+                continue
+            df = pd.DataFrame(ohlcv, columns=['datetime', 'open', 'high', 'low', 'close', 'volume'])
+            df.index = pd.to_datetime(df['datetime'], unit='ms')
+            df['symbol'] = symbol
+            df['exchange'] = self.exchange_or_broker
+            yield df
+            _since = ohlcv[-1][0] + period
+
+    def get_last_bars(self, timeframe: str = '1m', symbols: List[str] = ['BTC-USDT'], max_workers: int = 8,
+                      deadline_seconds: float = 50):
+        """Generator of the last closed bar of each symbol, fetched concurrently.
+        The bars are yielded as each symbol completes, the requests are paced by the rate limit of the exchange
+        and a symbol is retried until deadline_seconds.
+        Parameters
+        ----------
+        timeframe: str (default: '1m')
+        symbols: list of symbols
+        max_workers: threads asking at the same time
+        deadline_seconds: seconds from now to get the bars, the symbols not received are skipped
+        """
+        if self.pool_ohlcv is None:
+            self.pool_ohlcv = ThreadPoolExecutor(max_workers=max_workers)
+        deadline = self.pacer.clock() + deadline_seconds
+        futures = {self.pool_ohlcv.submit(self._fetch_last_bar, symbol, timeframe, deadline): symbol
+                   for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            bar = future.result()
+            if bar is None:
+                self.ohlcv_missed[symbol] = self.ohlcv_missed.get(symbol, 0) + 1
+                logger.error(f'Last bar of {symbol} not received')
+                continue
+            yield bar
+
+    def _fetch_last_bar(self, symbol: str, timeframe: str, deadline: float):
+        """ Last closed candle of the symbol, None if it is not received before the deadline or the error is not
+        temporary"""
+        start = self.pacer.clock()
+        while self.pacer.wait(deadline):
+            try:
+                ohlcv = self.client.fetch_ohlcv(symbol, timeframe, None, 2)
+            except (ccxt.RateLimitExceeded, ccxt.DDoSProtection) as e:
+                logger.warning(f'Rate limit in the last bar of {symbol}: {type(e).__name__} {e}')
+                self.pacer.throttled()
+                continue
+            except ccxt.NetworkError as e:  # temporary, retried until the deadline
+                logger.warning(f'Network error in the last bar of {symbol}: {type(e).__name__} {e}')
+                continue
+            except Exception as e:  # e.g. symbol not listed, asking again gets the same error
+                logger.error(f'Error in the last bar of {symbol}: {type(e).__name__} {e}')
+                return None
+            self.pacer.success()
+            if len(ohlcv):
+                first_candle = ohlcv[0]
+                self.ohlcv_latency.add(symbol, self.pacer.clock() - start)
+                return {'datetime': self.client.iso8601(first_candle[0]), 'exchange': self.client.id,
+                        'symbol': symbol, 'candle': first_candle}
+            return None
+        return None
+
+    def get_last_bars_stats(self) -> Dict:
+        """ Latency to get the last bar and deadlines missed by symbol"""
+        latency = self.ohlcv_latency.summary()
+        return {symbol: {'latency': latency.get(symbol), 'missed': self.ohlcv_missed.get(symbol, 0)}
+                for symbol in set(latency) | set(self.ohlcv_missed)}
 
     def start_update_orders_status(self) -> None:
-        """Start update orders status."""
-
-        def run_status_orders():
-            while True:
-                try:
-                    if len(self.dict_open_orders) > 0:  # if there are open orders
-                        self._check_order()
-                        time.sleep(30)
-                    else:
-                        time.sleep(1)
-                except Exception as ex:
-                    logger.error(
-                        f'Error check_order Exception: {ex}')
-
-        x = threading.Thread(target=run_status_orders)
-        x.start()
+        """Start update orders status, only the changes of the open orders are published."""
+        self.order_tracker.start()
+
+    def _on_order_change(self, order: dataclasses.dataclass) -> None:
+        """ Send changes to Portfolio and for saving in the database"""
+        if order.status in FINAL_STATUS:
+            with self._orders_lock:
+                # eliminate from dict_open_orders and create in dict_cancel_and_close_orders
+                self.dict_open_orders.pop(order.order_id_sender, None)
+                self.dict_cancel_and_close_orders[order.order_id_sender] = order
+        if self.send_orders_status:  # publish order status
+            self.emit_orders.publish_event('order_status', order)
+        print(f'Order {order.status} {order}')
 
     def send_order(self, order: dataclasses.dataclass) -> None:
         """Send order.
@@ -171,7 +238,8 @@ class Trading(Abstract_Trading):
         order: event order
         """
         logger.info(f'Sending Order to {self.exchange_or_broker} in ticker: {order.ticker} quantity: {order.quantity}')
-        self.dict_from_strategies[order.order_id_sender] = order  # save order in dict_from_strategies
+        with self._orders_lock:
+            self.dict_from_strategies[order.order_id_sender] = order  # save order in dict_from_strategies
         try:
             self._send_order(order)
         except ConnectionError as e:
@@ -191,8 +259,10 @@ class Trading(Abstract_Trading):
 
         else:
             # eliminate from dict_from_strategies and create it in dict_open_orders
-            self.dict_from_strategies.pop(order.order_id_sender)
-            self.dict_open_orders[order.order_id_sender] = order
+            with self._orders_lock:
+                self.dict_from_strategies.pop(order.order_id_sender)
+                self.dict_open_orders[order.order_id_sender] = order
+            self.order_tracker.add(order)
 
     def _send_order(self, order: dataclasses.dataclass) -> None:
         # place order
@@ -283,23 +353,6 @@ class Trading(Abstract_Trading):
                 order.commission_fee = float(fills['fees'][0]['cost'])
                 order.fee_currency = str(fills['fees'][0]['currency'])
 
-    def _check_order(self):
-        """ Check open order and send changes to Portfolio  and for saving in the database"""
-        list_changing = []
-        for order_id in self.dict_open_orders.keys():
-            order = self.dict_open_orders[order_id]
-            self.get_info_order(order)
-            if order.status == 'closed' or order.status == 'cancelled':
-                list_changing.append(order_id)
-            if self.send_orders_status: # publish order status
-                self.emit_orders.publish_event('order_status', order)
-            print(f'Order {order.status} {order}')
-
-        for order_id in list_changing:
-            # eliminate from dict_open_orders and create in dict_cancel_and_close_orders
-            self.dict_open_orders.pop(order_id)
-            self.dict_cancel_and_close_orders[order_id] = order
-
     def get_total_balance(self, currency: str = 'USDT') -> float:
         """Get total balance.
 
@@ -313,7 +366,7 @@ class Trading(Abstract_Trading):
         float
             Total balance
         """
-        if currency == 'USDT':
+        if currency.upper() in ['USDT', 'USD']:
             return self._get_total_balance_usd()
         else:
             raise NotImplementedError
@@ -323,16 +376,7 @@ class Trading(Abstract_Trading):
             :param fiat: optional Fiat code
         """
         balance = self.client.fetch_balance()
-        tickers = self.client.fetch_tickers()
-        balance_usd = 0
-        for currency in balance['total']:
-            if balance['total'][currency] > 0 and currency != 'USDT':
-                price = tickers[f'{currency}/USDT']['close']
-                balance_usd += balance['total'][currency] * price
-            elif currency == 'USDT':
-                balance_usd += balance['total'][currency]
-
-        return balance_usd
+        return self.valuation.total(balance['total'])
 
     def close_all_positions(self):
         pass
@@ -0,0 +1,122 @@
+""" Status of the open orders of a ccxt exchange.
+Each round asks the open orders of every symbol with orders tracked in one fetch_open_orders, the orders
+that are no longer open are looked up in fetch_closed_orders (or fetch_order if the exchange hasn't listed it
+yet). on_change is only called when the status, filled or remaining of an order change.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUS = ('closed', 'cancelled', 'expired', 'rejected')
+
+
+class OrderTracker(object):
+    """ Track the orders sent until they are closed or cancelled.
+
+    Parameters
+    ----------
+    client: ccxt client
+    on_change: callable(order) called with the order updated after each change of status or fill
+    interval: seconds between rounds while there are open orders
+    pacer: RatePacer shared with the other requests to the exchange
+    """
+
+    def __init__(self, client, on_change: callable, interval: float = 2.0, pacer=None):
+        self.client = client
+        self.on_change = on_change
+        self.interval = interval
+        self.pacer = pacer
+        self.open_orders = {}  # key: order_id_receiver, value: order
+        self.final_orders = {}  # key: order_id_receiver, value: order closed or cancelled
+        self._state = {}  # key: order_id_receiver, value: (status, filled, remaining)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._active = True
+        self._thread = None
+
+    def add(self, order) -> None:
+        """ Track an order sent to the exchange, order_id_receiver must be set"""
+        with self._lock:
+            self.open_orders[order.order_id_receiver] = order
+            self._state[order.order_id_receiver] = (order.status, order.quantity_execute, order.quantity_left)
+        self._wake.set()
+
+    def get_open_orders(self) -> list:
+        with self._lock:
+            return list(self.open_orders.values())
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._active = False
+        self._wake.set()
+
+    def _run(self) -> None:
+        while self._active:
+            with self._lock:
+                has_orders = len(self.open_orders) > 0
+            if not has_orders:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f'Error checking the status of the orders: {e}')
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _request(self, method: str, *args):
+        if self.pacer is not None:
+            self.pacer.wait()
+        return getattr(self.client, method)(*args)
+
+    def poll(self) -> list:
+        """ One round over the symbols with open orders, returns the orders changed"""
+        by_symbol = {}
+        for order in self.get_open_orders():
+            by_symbol.setdefault(order.ticker, {})[order.order_id_receiver] = order
+        changed = []
+        for symbol, orders in by_symbol.items():
+            reports = {r['id']: r for r in self._request('fetch_open_orders', symbol)}
+            missing = [_id for _id in orders if _id not in reports]
+            if len(missing) > 0:
+                since = min((o.datetime_in for o in orders.values() if o.datetime_in is not None), default=None)
+                since = None if since is None else int(since.timestamp() * 1000)
+                closed = {r['id']: r for r in self._request('fetch_closed_orders', symbol, since)}
+                for _id in missing:
+                    if _id in closed:
+                        reports[_id] = closed[_id]
+                    else:  # not listed yet
+                        reports[_id] = self._request('fetch_order', _id, symbol)
+            for _id, order in orders.items():
+                if self._update(order, reports[_id]):
+                    changed.append(order)
+        for order in changed:
+            self.on_change(order)
+        return changed
+
+    def _update(self, order, report: dict) -> bool:
+        """ Update the order with the report of the exchange, returns True if something changed"""
+        status = report.get('status')
+        status = 'cancelled' if status == 'canceled' else status
+        state = (status, report.get('filled'), report.get('remaining'))
+        with self._lock:
+            if self._state.get(order.order_id_receiver) == state:
+                return False
+            self._state[order.order_id_receiver] = state
+            order.status, order.quantity_execute, order.quantity_left = state
+            order.filled_price = report.get('average')
+            fees = report.get('fees') or ([report['fee']] if report.get('fee') else [])
+            if len(fees) > 0 and fees[0].get('cost') is not None:
+                order.commission_fee = float(fees[0]['cost'])
+                order.fee_currency = str(fees[0]['currency'])
+            if status in FINAL_STATUS:
+                self.open_orders.pop(order.order_id_receiver, None)
+                self._state.pop(order.order_id_receiver, None)
+                self.final_orders[order.order_id_receiver] = order
+        return True
@@ -0,0 +1,51 @@
+""" Pacing of the requests to an exchange shared by several threads.
+The requests are spaced by the rateLimit of ccxt (milliseconds between requests). The interval is doubled when
+the exchange answers with a rate limit error and goes back to the base interval after successful requests.
+"""
+import threading
+import time
+
+
+class RatePacer(object):
+    """ Space the requests of several threads.
+
+    Parameters
+    ----------
+    interval: seconds between requests
+    max_interval: limit of the interval after rate limit errors
+    recovery: factor applied to the interval by each successful request
+    clock: monotonic clock, sleep: function sleeping seconds (replaced in the tests)
+    """
+
+    def __init__(self, interval: float, max_interval: float = 10.0, recovery: float = 0.9,
+                 clock: callable = time.monotonic, sleep: callable = time.sleep):
+        self.base_interval = interval
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.recovery = recovery
+        self.clock = clock
+        self.sleep = sleep
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, deadline: float = None) -> bool:
+        """ Wait the turn of the request, returns False if the turn is after the deadline (in time of clock)"""
+        with self._lock:
+            now = self.clock()
+            turn = max(now, self._next)
+            if deadline is not None and turn > deadline:
+                return False
+            self._next = turn + self.interval
+        if turn > now:
+            self.sleep(turn - now)
+        return True
+
+    def success(self) -> None:
+        with self._lock:
+            self.interval = max(self.base_interval, self.interval * self.recovery)
+
+    def throttled(self) -> None:
+        """ The exchange has rejected a request by rate limit"""
+        with self._lock:
+            self.interval = min(self.max_interval, max(self.interval, 0.05) * 2)
+            self._next = self.clock() + self.interval
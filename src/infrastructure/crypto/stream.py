@@ -0,0 +1,168 @@
+""" Trades of crypto exchanges by websocket.
+The adapters know the url, the subscription and the format of the messages of each exchange, TradeStream keeps
+the connection, reconnects with backoff and calls on_trades with the trades of every message.
+"""
+import json
+import time
+import itertools
+import logging
+import websocket
+
+logger = logging.getLogger(__name__)
+
+
+class BinanceAdapter(object):
+    """ Trade streams of Binance, https://binance-docs.github.io/apidocs/spot/en/#trade-streams"""
+
+    def __init__(self, symbols: list, base_url: str = 'wss://stream.binance.com:9443'):
+        self.base_url = base_url
+        # 'BTC-USDT' or 'BTC/USDT' is btcusdt in the streams
+        self.symbols_by_id = {s.replace('-', '').replace('/', '').lower(): s for s in symbols}
+        self.ping_interval = None  # the server sends the pings
+
+    def url(self) -> str:
+        return self.base_url + '/stream?streams=' + '/'.join(f'{_id}@trade' for _id in self.symbols_by_id)
+
+    def subscribe_messages(self) -> list:
+        return []  # streams are in the url
+
+    def ping_message(self) -> str:
+        return None
+
+    def parse(self, msg: dict) -> list:
+        data = msg.get('data', msg)
+        if data.get('e') != 'trade':
+            return []
+        symbol = self.symbols_by_id.get(data['s'].lower())
+        if symbol is None:
+            return []
+        return [(symbol, data['T'] / 1000, float(data['p']), float(data['q']))]
+
+
+class KucoinAdapter(object):
+    """ Match execution data of Kucoin, https://docs.kucoin.com/#match-execution-data
+    A token is asked by REST (bullet-public) for each connection."""
+
+    def __init__(self, symbols: list, client=None):
+        self.client = client
+        self.symbols = [s.replace('/', '-') for s in symbols]
+        self.symbols_by_id = dict(zip(self.symbols, symbols))
+        self.ping_interval = 18
+        self._ids = itertools.count(1)
+
+    def url(self) -> str:
+        bullet = self.client.publicPostBulletPublic()['data']
+        server = bullet['instanceServers'][0]
+        self.ping_interval = server.get('pingInterval', 18000) / 1000 * 0.9
+        return f"{server['endpoint']}?token={bullet['token']}&connectId={next(self._ids)}"
+
+    def subscribe_messages(self) -> list:
+        return [{'id': next(self._ids), 'type': 'subscribe', 'topic': '/market/match:' + ','.join(self.symbols),
+                 'privateChannel': False, 'response': True}]
+
+    def ping_message(self) -> dict:
+        return {'id': next(self._ids), 'type': 'ping'}
+
+    def parse(self, msg: dict) -> list:
+        if msg.get('type') != 'message' or msg.get('subject') != 'trade.l3match':
+            return []
+        data = msg['data']
+        symbol = self.symbols_by_id.get(data['symbol'])
+        if symbol is None:
+            return []
+        return [(symbol, int(data['time']) / 1e9, float(data['price']), float(data['size']))]
+
+
+ADAPTERS = {'binance': BinanceAdapter, 'kucoin': KucoinAdapter}
+
+
+def get_adapter(exchange: str, symbols: list, client=None):
+    """ Adapter of the exchange, client is the ccxt client used by the exchanges that need REST to connect"""
+    if exchange == 'kucoin':
+        return KucoinAdapter(symbols, client=client)
+    elif exchange in ADAPTERS:
+        return ADAPTERS[exchange](symbols)
+    raise NotImplementedError(f'Websocket stream not implemented for {exchange}')
+
+
+class TradeStream(object):
+    """ Websocket connection with reconnection.
+
+    Parameters
+    ----------
+    adapter: adapter of the exchange
+    on_trades: callable(list of (symbol, timestamp in seconds, price, amount))
+    on_idle: callable() called after every message and every timeout seconds without messages
+    on_reconnect: callable() called after a reconnection, before reading messages
+    timeout: seconds waiting for a message
+    max_backoff: maximum seconds between reconnections
+    """
+
+    def __init__(self, adapter, on_trades: callable, on_idle: callable = None, on_reconnect: callable = None,
+                 timeout: float = 1.0, max_backoff: float = 30.0):
+        self.adapter = adapter
+        self.on_trades = on_trades
+        self.on_idle = on_idle
+        self.on_reconnect = on_reconnect
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.reconnections = 0
+        self._ws = None
+        self._active = True
+
+    def connect(self) -> None:
+        self._ws = websocket.create_connection(self.adapter.url(), timeout=self.timeout)
+        for msg in self.adapter.subscribe_messages():
+            self._ws.send(json.dumps(msg))
+
+    def stop(self) -> None:
+        self._active = False
+
+    def close(self) -> None:
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except (websocket.WebSocketException, OSError):
+                pass
+            self._ws = None
+
+    def run(self) -> None:
+        """ Read messages until stop, reconnecting when the connection is lost"""
+        backoff = 1.0
+        connected_before = False
+        while self._active:
+            try:
+                self.connect()
+                if connected_before:
+                    self.reconnections += 1
+                    if self.on_reconnect is not None:
+                        self.on_reconnect()
+                connected_before = True
+                backoff = 1.0
+                self._read()
+            except (websocket.WebSocketException, OSError, ValueError) as e:
+                logger.error(f'Websocket stream disconnected: {e}')
+            finally:
+                self.close()
+            if self._active:
+                time.sleep(backoff)
+                backoff = min(self.max_backoff, backoff * 2)
+
+    def _read(self) -> None:
+        last_ping = time.monotonic()
+        while self._active:
+            try:
+                raw = self._ws.recv()
+            except websocket.WebSocketTimeoutException:
+                raw = None
+            if raw:
+                trades = self.adapter.parse(json.loads(raw))
+                if len(trades) > 0:
+                    self.on_trades(trades)
+            elif raw is not None:  # empty frame, connection closed
+                raise websocket.WebSocketConnectionClosedException('Connection closed by server')
+            if self.on_idle is not None:
+                self.on_idle()
+            if self.adapter.ping_interval and time.monotonic() - last_ping >= self.adapter.ping_interval:
+                self._ws.send(json.dumps(self.adapter.ping_message()))
+                last_ping = time.monotonic()
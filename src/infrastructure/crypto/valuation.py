@@ -0,0 +1,109 @@
+""" Valuation of the balances of a crypto exchange in a quote currency (USDT).
+Only the prices of the currencies held are asked, in parallel, and kept ttl_seconds. Currencies without a
+market against the quote are priced through a bridge currency (BTC, ETH): currency/BTC * BTC/USDT.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Valuation(object):
+    """ Value of balances in the quote currency.
+
+    Parameters
+    ----------
+    client: ccxt client
+    quote: currency of the valuation
+    ttl_seconds: seconds a price is reused
+    bridges: currencies used to price the currencies without a market against the quote
+    max_workers: prices asked at the same time
+    pacer: RatePacer shared with the other requests to the exchange
+    """
+
+    def __init__(self, client, quote: str = 'USDT', ttl_seconds: float = 30, bridges: tuple = ('BTC', 'ETH'),
+                 max_workers: int = 8, pacer=None):
+        self.client = client
+        self.quote = quote
+        self.ttl_seconds = ttl_seconds
+        self.bridges = bridges
+        self.pacer = pacer
+        self._prices = {}  # key: symbol, value: (monotonic time, price)
+        self._routes = {}  # key: currency, value: list of (symbol, inverse)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def route(self, currency: str) -> list:
+        """ Markets to convert the currency to the quote, list of (symbol, inverse), None if there is no route"""
+        if currency not in self._routes:
+            markets = self.client.load_markets()
+
+            def step(base, quote):
+                if f'{base}/{quote}' in markets:
+                    return f'{base}/{quote}', False
+                if f'{quote}/{base}' in markets:
+                    return f'{quote}/{base}', True
+                return None
+
+            route = None
+            direct = step(currency, self.quote)
+            if direct is not None:
+                route = [direct]
+            else:
+                for bridge in self.bridges:
+                    first, second = step(currency, bridge), step(bridge, self.quote)
+                    if first is not None and second is not None:
+                        route = [first, second]
+                        break
+            self._routes[currency] = route
+        return self._routes[currency]
+
+    def _fetch_price(self, symbol: str) -> float:
+        if self.pacer is not None:
+            self.pacer.wait()
+        ticker = self.client.fetch_ticker(symbol)
+        price = ticker['last'] if ticker.get('last') is not None else ticker['close']
+        with self._lock:
+            self._prices[symbol] = (time.monotonic(), price)
+        return price
+
+    def get_prices(self, symbols: list) -> dict:
+        """ Prices of the symbols, the ones older than ttl_seconds are asked in parallel"""
+        now = time.monotonic()
+        with self._lock:
+            prices = {s: self._prices[s][1] for s in symbols
+                      if s in self._prices and now - self._prices[s][0] < self.ttl_seconds}
+        missing = [s for s in set(symbols) if s not in prices]
+        for symbol, future in [(s, self._pool.submit(self._fetch_price, s)) for s in missing]:
+            try:
+                prices[symbol] = future.result()
+            except Exception as e:
+                logger.error(f'Error getting the price of {symbol}: {e}')
+        return prices
+
+    def value(self, balances: dict) -> dict:
+        """ Value of each currency of balances (currency: amount) in the quote, None if it can't be priced"""
+        balances = {c: a for c, a in balances.items() if a}
+        routes = {c: self.route(c) for c in balances if c != self.quote}
+        prices = self.get_prices([symbol for route in routes.values() if route for symbol, _ in route])
+        values = {}
+        for currency, amount in balances.items():
+            if currency == self.quote:
+                values[currency] = amount
+                continue
+            route = routes[currency]
+            if route is None or any(symbol not in prices for symbol, _ in route):
+                logger.warning(f'{currency} without price in {self.quote}')
+                values[currency] = None
+                continue
+            value = amount
+            for symbol, inverse in route:
+                value = value / prices[symbol] if inverse else value * prices[symbol]
+            values[currency] = value
+        return values
+
+    def total(self, balances: dict) -> float:
+        """ Total value of the balances in the quote"""
+        return sum(v for v in self.value(balances).values() if v is not None)
@@ -0,0 +1,115 @@
+""" Queries over the events saved by event_keeper in the collection of events.
+The lookups by event_type, ticker, portfolio_name, status and time range use the indexes of the collection.
+The results of closed days (before today UTC) don't change, they are kept in a LRU cache by day and filters
+(cache=False for the queries read once, like the odds of a finished event).
+"""
+import datetime as dt
+import threading
+from collections import OrderedDict
+
+_PROJECTION = {'_id': False}
+
+
+def _start_of_day(day: dt.datetime) -> dt.datetime:
+    return dt.datetime(day.year, day.month, day.day)
+
+
+class EventsQuery(object):
+    """ Time series of events.
+
+    Parameters
+    ----------
+    collection: collection of the events, see events_sink.get_events_collection
+    cache_size: days (by filters) kept in the cache
+    """
+
+    def __init__(self, collection, cache_size: int = 64):
+        self.collection = collection
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _query(event_type: str, ticker: str = None, portfolio_name: str = None, status: str = None,
+               **filters) -> dict:
+        query = {'event_type': event_type}
+        for key, value in (('ticker', ticker), ('portfolio_name', portfolio_name), ('status', status)):
+            if value is not None:
+                query[key] = value
+        query.update(filters)
+        return query
+
+    def find_documents(self, event_type: str, ticker: str = None, portfolio_name: str = None, status: str = None,
+                       start: dt.datetime = None, end: dt.datetime = None, cache: bool = True, **filters) -> list:
+        """ Events in [start, end) sorted by datetime, as dicts. Filters are other fields of the event"""
+        query = self._query(event_type, ticker, portfolio_name, status, **filters)
+        today = _start_of_day(dt.datetime.utcnow())
+        if not cache or start is None or (end is not None and end <= start):
+            return self._find(query, start, end)
+        documents = []
+        # closed days from the cache, today from the database
+        day = _start_of_day(start)
+        while day < today and (end is None or day < end):
+            next_day = day + dt.timedelta(days=1)
+            day_documents = self._find_day(query, day)
+            if start > day or (end is not None and end < next_day):
+                day_documents = [d for d in day_documents if d['datetime'] >= start and
+                                 (end is None or d['datetime'] < end)]
+            documents.extend(day_documents)
+            day = next_day
+        if end is None or end > today:
+            documents.extend(self._find(query, max(start, today), end))
+        return documents
+
+    def find(self, event_type: str, ticker: str = None, portfolio_name: str = None, status: str = None,
+             start: dt.datetime = None, end: dt.datetime = None, cache: bool = True, **filters):
+        """ Events in [start, end) as DataFrame indexed by datetime"""
+        import pandas as pd
+        data = pd.DataFrame(self.find_documents(event_type, ticker, portfolio_name, status, start, end, cache,
+                                                **filters))
+        if len(data) > 0:
+            data.index = pd.to_datetime(data['datetime'])
+        return data
+
+    def last(self, event_type: str, ticker: str = None, portfolio_name: str = None, status: str = None,
+             **filters) -> dict:
+        """ Last event by datetime, None if there is no one"""
+        query = self._query(event_type, ticker, portfolio_name, status, **filters)
+        documents = list(self.collection.find(query, _PROJECTION).sort('datetime', -1).limit(1))
+        return documents[0] if len(documents) > 0 else None
+
+    def distinct(self, field: str, event_type: str, start: dt.datetime = None, end: dt.datetime = None,
+                 **filters) -> list:
+        """ Values of a field in the events in [start, end), without reading the events"""
+        return self.collection.distinct(field, self._range(self._query(event_type, **filters), start, end))
+
+    @staticmethod
+    def _range(query: dict, start: dt.datetime = None, end: dt.datetime = None) -> dict:
+        query = dict(query)
+        if start is not None or end is not None:
+            query['datetime'] = {}
+            if start is not None:
+                query['datetime']['$gte'] = start
+            if end is not None:
+                query['datetime']['$lt'] = end
+        return query
+
+    def _find(self, query: dict, start: dt.datetime = None, end: dt.datetime = None) -> list:
+        return list(self.collection.find(self._range(query, start, end), _PROJECTION).sort('datetime', 1))
+
+    def _find_day(self, query: dict, day: dt.datetime) -> list:
+        key = (day, tuple(sorted((k, repr(v)) for k, v in query.items())))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+        documents = self._find(query, day, day + dt.timedelta(days=1))
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = documents
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return documents
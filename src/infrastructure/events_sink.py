@@ -0,0 +1,142 @@
+""" Sink of the events saved by event_keeper.
+The events are queued by the consumer and written by one thread in batches with insert_many, one document by
+event in a collection indexed by (event_type, ticker, datetime). The queue is bounded, when the database
+is slower than the events the consumer blocks (backpressure) instead of growing the memory.
+"""
+import atexit
+import datetime as dt
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INDEXES = [[('event_type', 1), ('ticker', 1), ('datetime', 1)],
+           [('event_type', 1), ('portfolio_name', 1), ('datetime', 1)],
+           [('event_type', 1), ('status', 1), ('datetime', 1)],
+           [('event_type', 1), ('unique_name', 1), ('datetime', 1)]]
+_BSON_TYPES = (str, int, float, bool, dt.datetime, type(None))
+
+
+def get_events_collection(host: str, port: int, database: str = 'events_keeper', collection: str = 'events',
+                          retention_days: int = 7):
+    """ Collection of the events with its indexes, the events are deleted after retention_days"""
+    import pymongo
+    client = pymongo.MongoClient(host=host, port=int(port))
+    _collection = client[database][collection]
+    for keys in INDEXES:
+        _collection.create_index(keys)
+    ensure_ttl_index(_collection, retention_days * 86400)
+    return _collection
+
+
+def ensure_ttl_index(collection, seconds: int) -> None:
+    """ TTL index datetime_1. The collections created before the retention have a datetime_1 index without TTL,
+    creating it again with other options fails (IndexOptionsConflict): it is dropped and created with the TTL,
+    and the TTL of an index with other retention is changed with collMod"""
+    index = collection.index_information().get('datetime_1')
+    if index is not None and 'expireAfterSeconds' not in index:
+        collection.drop_index('datetime_1')
+        index = None
+    if index is None:
+        collection.create_index([('datetime', 1)], name='datetime_1', expireAfterSeconds=seconds)
+    elif index['expireAfterSeconds'] != seconds:
+        collection.database.command('collMod', collection.name,
+                                    index={'keyPattern': {'datetime': 1}, 'expireAfterSeconds': seconds})
+
+
+def _to_bson(value):
+    if isinstance(value, _BSON_TYPES):
+        return value
+    elif isinstance(value, dict):
+        return {str(k): _to_bson(v) for k, v in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return [_to_bson(v) for v in value]
+    return str(value)
+
+
+def to_document(event) -> dict:
+    """ Document of an event dataclass, values not supported by BSON are saved as strings"""
+    return _to_bson(event.__dict__)
+
+
+class EventSink(object):
+    """ Write the events in batches of batch_size or every flush_seconds.
+
+    Parameters
+    ----------
+    collection: collection with insert_many
+    batch_size: maximum events by insert_many
+    flush_seconds: maximum seconds an event waits in the queue
+    max_queue: events queued before blocking put
+    """
+
+    def __init__(self, collection, batch_size: int = 1000, flush_seconds: float = 1.0, max_queue: int = 100000):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.inserted = 0
+        self.blocked = 0  # puts that waited for space in the queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._active = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, event) -> None:
+        """ Queue an event, blocks while the queue is full"""
+        try:
+            self._queue.put_nowait(to_document(event))
+        except queue.Full:
+            self.blocked += 1
+            logger.warning(f'Events sink full, waiting for the database ({self._queue.qsize()} events queued)')
+            self._queue.put(to_document(event))
+
+    def close(self) -> None:
+        """ Write the events queued and stop the writer"""
+        if not self._active:
+            return
+        self._active = False
+        self._queue.put(None)  # wake up the writer
+        self._thread.join()
+
+    def _next_batch(self) -> list:
+        batch = []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                document = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if document is None:  # closing
+                break
+            batch.append(document)
+        return batch
+
+    def _run(self) -> None:
+        while self._active or not self._queue.empty():
+            batch = self._next_batch()
+            if len(batch) > 0:
+                self._write(batch)
+
+    def _write(self, batch: list) -> None:
+        """ Insert the batch grouped by event type, retrying while the database is not available"""
+        by_type = {}
+        for document in batch:
+            by_type.setdefault(document.get('event_type'), []).append(document)
+        for documents in by_type.values():
+            backoff = 0.5
+            while True:
+                try:
+                    self.collection.insert_many(documents, ordered=False)
+                    self.inserted += len(documents)
+                    break
+                except Exception as e:
+                    if type(e).__name__ == 'BulkWriteError':  # the valid documents are inserted
+                        logger.error(f'Events not saved: {e}')
+                        break
+                    logger.error(f'Error saving {len(documents)} events, retrying: {e}')
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
@@ -0,0 +1,191 @@
+""" Asynchronous download of historical bars from Interactive Brokers with reqHistoricalDataAsync.
+The date range of each symbol is split in windows of window_days and the windows of all the symbols are requested
+concurrently, spaced by the pacing rules of IB historical data:
+ - no more than 60 requests in any 10 minutes
+ - no identical requests within 15 seconds
+ - no 6 or more requests for the same contract within 2 seconds
+The pages of a symbol are concatenated once at the end.
+"""
+import asyncio
+import collections
+import datetime as dt
+import logging
+import time
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+BAR_FIELDS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+
+class IBPacing(object):
+    """ Turns of the historical requests of one IB connection, shared by all the symbols.
+    The turns are given in order, so each request only has to respect the requests before it.
+
+    Parameters
+    ----------
+    max_requests: requests allowed in period seconds
+    period: seconds of the window of max_requests
+    identical_seconds: seconds between identical requests
+    burst_requests: requests for the same contract that are a violation within burst_seconds
+    burst_seconds: seconds of the window of burst_requests
+    clock: monotonic clock, sleep: coroutine sleeping seconds (replaced in the tests)
+    """
+
+    def __init__(self, max_requests: int = 60, period: float = 600, identical_seconds: float = 15,
+                 burst_requests: int = 6, burst_seconds: float = 2, clock: callable = time.monotonic,
+                 sleep: callable = asyncio.sleep):
+        self.max_requests = max_requests
+        self.period = period
+        self.identical_seconds = identical_seconds
+        self.burst_requests = burst_requests
+        self.burst_seconds = burst_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self._turns = collections.deque()  # turns of the last period
+        self._turns_contract = {}  # key: contract, value: deque of turns of the last burst_seconds
+        self._identical = {}  # key: request, value: last turn
+        self._last = 0.0
+
+    def next_turn(self, request: tuple, contract: str) -> float:
+        """ Reserve the first turn that respects the pacing rules"""
+        now = self.clock()
+        while self._turns and self._turns[0] <= now - self.period:
+            self._turns.popleft()
+        turns_contract = self._turns_contract.setdefault(contract, collections.deque())
+        while turns_contract and turns_contract[0] <= now - self.burst_seconds:
+            turns_contract.popleft()
+        turn = max(now, self._last)
+        if request in self._identical:
+            turn = max(turn, self._identical[request] + self.identical_seconds)
+        if len(self._turns) >= self.max_requests:
+            turn = max(turn, self._turns[-self.max_requests] + self.period)
+        if len(turns_contract) >= self.burst_requests - 1:
+            turn = max(turn, turns_contract[-(self.burst_requests - 1)] + self.burst_seconds)
+        self._turns.append(turn)
+        turns_contract.append(turn)
+        self._identical[request] = turn
+        self._last = turn
+        return turn
+
+    async def wait(self, request: tuple, contract: str) -> None:
+        turn = self.next_turn(request, contract)
+        delay = turn - self.clock()
+        if delay > 0:
+            await self.sleep(delay)
+
+
+def bar_size(timeframe, unit: str) -> tuple:
+    """ barSizeSetting of IB and unit of the bars ('day', 'hour', 'min')"""
+    timeframe = int(timeframe)
+    if unit.lower() in ['daily', 'day']:
+        _unit = 'day'
+    elif unit.lower() == 'hour':
+        _unit = 'hour'
+    elif unit.lower() in ['minute', 'min']:
+        _unit = 'min'
+    else:
+        raise ValueError(f'Unit {unit} not supported')
+    setting = f'{timeframe} {_unit}'
+    if _unit == 'min' and timeframe > 1:
+        setting += 's'
+    return setting, _unit
+
+
+def windows(start_date: dt.datetime, end_date: dt.datetime, days: int = 10) -> List[tuple]:
+    """ (start, end) of windows of days covering the range"""
+    length = dt.timedelta(days=days)
+    return [(start_date + i * length, min(start_date + (i + 1) * length, end_date))
+            for i in range((end_date - start_date) // length + 1)]
+
+
+def to_frame(pages: List[list], symbol: str, unit: str):
+    """ DataFrame of the bars of all the pages with the columns of the historical data"""
+    import pandas as pd
+    rows = [[getattr(b, f) for f in BAR_FIELDS] for bars in pages for b in bars]
+    df = pd.DataFrame(rows, columns=BAR_FIELDS)
+    # dates of formatDate=2 are utc, the days are dates without time
+    _dtime = pd.to_datetime(df['date'], utc=True).dt.tz_localize(None)
+    df['datetime'] = _dtime.dt.normalize() if unit == 'day' else _dtime.dt.floor('min')
+    df = df.drop(columns=['date']).drop_duplicates(subset='datetime', keep='last').sort_values('datetime')
+    df.index = df['datetime'].values
+    df['ticker'] = symbol
+    df['symbol'] = symbol
+    df['multiplier'] = 1
+    df['exchange'] = 'ib'
+    df['dtime_zone'] = 'utc'
+    df['provider'] = 'ib'
+    df['freq'] = unit
+    return df
+
+
+class HistoricalIB(object):
+    """ Historical bars of several contracts requested concurrently.
+
+    Parameters
+    ----------
+    client: ib_insync.IB connected
+    pacing: IBPacing of the connection
+    window_days: days of each request
+    max_concurrent: requests waiting an answer at the same time
+    retries: new requests of a window after an error, with the pacing of any other request
+    """
+
+    def __init__(self, client, pacing: IBPacing = None, window_days: int = 10, max_concurrent: int = 6,
+                 retries: int = 2):
+        self.client = client
+        self.pacing = IBPacing() if pacing is None else pacing
+        self.window_days = window_days
+        self.max_concurrent = max_concurrent
+        self.retries = retries
+
+    async def _request(self, semaphore: asyncio.Semaphore, contract, symbol: str, start: dt.datetime,
+                       end: dt.datetime, setting: str) -> list:
+        end_str = end.strftime("%Y%m%d %H:%M:%S")
+        days = max(1, abs((end - start).days))
+        what_to_show = 'MIDPOINT' if getattr(contract, 'exchange', None) == 'IDEALPRO' else 'TRADES'
+        for attempt in range(self.retries + 1):
+            try:
+                async with semaphore:
+                    await self.pacing.wait((symbol, end_str, setting, what_to_show), symbol)
+                    bars = await self.client.reqHistoricalDataAsync(contract, endDateTime=end_str,
+                                                                    durationStr=f'{days} D', barSizeSetting=setting,
+                                                                    whatToShow=what_to_show, useRTH=0, formatDate=2)
+                return list(bars or [])
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f'Error getting historical data of {symbol} until {end_str}, retrying: {e}')
+
+    async def get_pages(self, contracts: Dict[str, object], timeframe=1, unit: str = 'Daily',
+                        start_date: dt.datetime = dt.datetime(2017, 1, 1),
+                        end_date: dt.datetime = None) -> Dict[str, List[list]]:
+        """ Bars of each symbol (key of contracts) by window, in order of dates.
+        A window that fails after the retries raises its error once all the requests have finished, a gap in the
+        pages would be saved as if the data didn't exist.
+        """
+        end_date = dt.datetime.utcnow() if end_date is None else end_date
+        setting, _ = bar_size(timeframe, unit)
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        tasks = {symbol: [self._request(semaphore, contract, symbol, start, end, setting)
+                          for start, end in windows(start_date, end_date, self.window_days)]
+                 for symbol, contract in contracts.items()}
+        # the windows of all the symbols are interleaved so the burst rule doesn't block one symbol after another
+        order = [(symbol, i) for i in range(max(map(len, tasks.values()), default=0))
+                 for symbol in tasks if i < len(tasks[symbol])]
+        results = await asyncio.gather(*[tasks[symbol][i] for symbol, i in order], return_exceptions=True)
+        pages = {symbol: [None] * len(tasks[symbol]) for symbol in tasks}
+        for (symbol, i), result in zip(order, results):
+            if isinstance(result, Exception):
+                logger.error(f'Error getting historical data of {symbol}: {result}')
+                raise result
+            pages[symbol][i] = result
+        return pages
+
+    async def get_historical_data(self, contracts: Dict[str, object], timeframe=1, unit: str = 'Daily',
+                                  start_date: dt.datetime = dt.datetime(2017, 1, 1),
+                                  end_date: dt.datetime = None) -> Dict:
+        """ DataFrame of each symbol (key of contracts)"""
+        _, _unit = bar_size(timeframe, unit)
+        pages = await self.get_pages(contracts, timeframe, unit, start_date, end_date)
+        return {symbol: to_frame(symbol_pages, symbol, _unit) for symbol, symbol_pages in pages.items()}
@@ -6,8 +6,9 @@ from ib_insync import MarketOrder, LimitOrder
 import datetime as dt
 import time
 from src.infrastructure.brokerMQ import Emit_Events
+from src.infrastructure.ib.historical_ib import HistoricalIB, IBPacing
 from src.application.base_logger import logger
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # default Callable
 async def _callable(data: Dict) -> None:
@@ -29,6 +30,7 @@ class Trading(Abstract_Trading):
         self.contract_from_contractIB = {}
         self.ticker_info = pd.read_csv(path_ticker, encoding="utf-8", sep=",")
         self.sleep = None
+        self.pacing = IBPacing()  # pacing of the historical requests of the connection
 
         if self.send_orders_status:
             self.emit_orders = Emit_Events(config=config_brokermq)
@@ -45,6 +47,7 @@ class Trading(Abstract_Trading):
             self.client = ib_insync.IB()
             self.client.connect(self.config_broker['HOST_IB'], self.config_broker['PORT_IB'], self.config_broker['CLIENT_IB'])
             self.sleep = self.client.sleep
+            self.historical = HistoricalIB(self.client, pacing=self.pacing)
             print(self.client)
             return self.client
         except Exception as ex:
@@ -267,7 +270,7 @@ class Trading(Abstract_Trading):
         self.client.run()
 
     def get_historical_data(self, symbols=None, timeframe=1, unit='Daily', start_date=dt.datetime(2017, 1, 1),
-                                end_date=dt.datetime.today()):
+                                end_date=None):
         """
         Get historical data for a given symbol(s) from Interactive Brokers
 
@@ -275,83 +278,17 @@ class Trading(Abstract_Trading):
         :param timeframe: int; the timeframe for each data point, in minutes (e.g. 1 for 1 minute bars)
         :param unit: str; the unit of the data (e.g. 'Daily' for daily bars, 'Hour' for hourly bars, 'Min' for minute bars)
         :param start_date: datetime; the start date for the data range
-        :param end_date: datetime; the end date for the data range
-        :return: pd.DataFrame containing the historical data for the specified symbol(s)
+        :param end_date: datetime; the end date for the data range, now if None
+        :return: pd.DataFrame containing the historical data for the specified symbol, dict of symbol: pd.DataFrame
+                 if symbols is a list
         """
-
-        ## Create contrat IB
+        _symbols = symbols if isinstance(symbols, list) else [symbols]
         # Convert symbol(s) to IB contract object
-        contractIB = self.get_contractIB_from_contract(symbols)
-
-        # Create empty DataFrame to store the historical data
-        df = pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume'])
-
-        # Split the date range into 10-day intervals
-        interval_length = timedelta(days=10)
-        intervals = [(start_date + i * interval_length, min(start_date + (i + 1) * interval_length, end_date)) for i
-                     in
-                     range((end_date - start_date) // interval_length + 1)]
-
-        # Convert timeframe to an integer
-        timeframe = int(timeframe)
-
-        # Iterate through the date ranges and request the historical data for each interval
-        for start, end in intervals:
-            # Convert end date to string in the format required by IB API
-            end_str = end.strftime("%Y%m%d %H:%M:%S")
-            duration = start - end
-            days = str(abs(duration.days))
-            if days == '0':  # filter
-                days = '1'
-            durationStr = days + ' D'
-            whatToShow = 'TRADES'
-            if contractIB.exchange == 'IDEALPRO':
-                whatToShow = 'MIDPOINT'
-
-            # Determine the bar size based on the timeframe and unit parameters
-            if unit.lower() in ['daily', 'day']:
-                _unit = 'day'
-            elif unit.lower() == 'hour':
-                _unit = 'hour'
-            elif unit.lower() in ['minute', 'min']:
-                _unit = 'min'
-                if timeframe > 1:
-                    _unit = 'mins'
-            barSizeSetting = str(timeframe) + ' ' + _unit
-
-            # Request the historical data from IB API
-            bars = self.client.reqHistoricalData(contractIB, endDateTime=end_str, durationStr=durationStr,
-                                                 barSizeSetting=barSizeSetting,
-                                                 whatToShow=whatToShow,
-                                                 useRTH=0,
-                                                 formatDate=2)
-
-            # Convert the returned bars to a pandas DataFrame and append it to the main DataFrame
-            bars_df = ib_insync.util.df(bars)
-            df = df.append(bars_df, ignore_index=True)
-
-            # Create a new column with datetime objects for easier indexing and plotting
-            _dtime = []
-            for i in range(len(df['date'])):
-                d = df['date'].loc[i]
-                if _unit == 'day':
-                    _dtime.append(dt.datetime(d.year, d.month, d.day))
-                else:
-                    _dtime.append(dt.datetime(d.year, d.month, d.day, d.hour, d.minute))
-
-            df['datetime'] = _dtime
-            df.index = _dtime
-
-        df['ticker'] = symbols
-        df['symbol'] = symbols
-        df['multiplier'] = 1
-        df['exchange'] = 'ib'
-        df['dtime_zone'] = 'utc'
-        df['provider'] = 'ib'
-        df['freq'] = _unit
-        df = df.drop(columns=['date'])
-
-        return df
+        contracts = {symbol: self.get_contractIB_from_contract(symbol) for symbol in _symbols}
+        # the 10-day intervals of all the symbols are requested concurrently respecting the pacing of IB
+        data = self.client.run(self.historical.get_historical_data(contracts, timeframe=timeframe, unit=unit,
+                                                                   start_date=start_date, end_date=end_date))
+        return data if isinstance(symbols, list) else data[symbols]
 
     def get_account_positions(self, account_keys):
         """
@@ -0,0 +1,137 @@
+""" In-process stand-in of RabbitMQ for the benchmarks and the tests.
+It implements the part of the pika BlockingConnection/BlockingChannel API used by brokerMQ (topic exchange,
+exclusive queues, bindings with * and #, basic_consume, start_consuming, process_data_events), so Emit_Events
+and receive_events run unchanged with the connection factory of the broker in the config:
+{'host': 'local', 'port': None, 'user': None, 'password': None, 'connection_factory': broker.connection}
+"""
+import itertools
+import queue
+import threading
+from types import SimpleNamespace
+
+
+def topic_matches(binding_key: str, routing_key: str) -> bool:
+    """ True if the routing key matches the binding key of a topic exchange (* one word, # zero or more)"""
+    def _match(pattern, words):
+        if len(pattern) == 0:
+            return len(words) == 0
+        if pattern[0] == '#':
+            return any(_match(pattern[1:], words[i:]) for i in range(len(words) + 1))
+        return len(words) > 0 and pattern[0] in ('*', words[0]) and _match(pattern[1:], words[1:])
+    return _match(binding_key.split('.'), routing_key.split('.'))
+
+
+class LocalBroker(object):
+    """ Topic exchanges in memory, the messages of each queue are delivered in order"""
+
+    def __init__(self, name: str = 'local'):
+        self.name = name
+        self.published = 0
+        self._queues = {}  # key: queue name, value: (queue.Queue, list of binding keys)
+        self._names = itertools.count()
+        self._lock = threading.Lock()
+
+    def connection(self) -> 'LocalConnection':
+        return LocalConnection(self)
+
+    def _declare(self, name: str = '') -> str:
+        with self._lock:
+            name = name or f'local.{next(self._names)}'
+            self._queues.setdefault(name, (queue.Queue(), []))
+            return name
+
+    def _bind(self, queue_name: str, routing_key: str) -> None:
+        with self._lock:
+            self._queues[queue_name][1].append(routing_key)
+
+    def _delete(self, queue_name: str) -> None:
+        with self._lock:
+            self._queues.pop(queue_name, None)
+
+    def publish(self, routing_key: str, body, properties=None) -> None:
+        with self._lock:
+            targets = [q for q, bindings in self._queues.values()
+                       if any(topic_matches(b, routing_key) for b in bindings)]
+            self.published += 1
+        for q in targets:
+            q.put((routing_key, body, properties))
+
+    def get(self, queue_name: str, timeout: float = 0):
+        """ Next message of the queue, None if there is none after timeout seconds"""
+        entry = self._queues.get(queue_name)
+        if entry is None:
+            return None
+        try:
+            return entry[0].get(timeout=timeout) if timeout > 0 else entry[0].get_nowait()
+        except queue.Empty:
+            return None
+
+
+class LocalChannel(object):
+    def __init__(self, broker: LocalBroker):
+        self.broker = broker
+        self._consumers = []  # (queue name, callback)
+        self._consuming = False
+        self.is_open = True
+
+    def exchange_declare(self, exchange: str = None, exchange_type: str = 'topic', **kwargs):
+        pass
+
+    def queue_declare(self, queue: str = '', exclusive: bool = False, **kwargs):
+        return SimpleNamespace(method=SimpleNamespace(queue=self.broker._declare(queue)))
+
+    def queue_bind(self, queue: str, exchange: str = None, routing_key: str = None, **kwargs):
+        self.broker._bind(queue, routing_key)
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties=None, **kwargs):
+        self.broker.publish(routing_key, body, properties)
+
+    def basic_consume(self, queue: str, on_message_callback: callable, auto_ack: bool = True, **kwargs):
+        self._consumers.append((queue, on_message_callback))
+
+    def process_data_events(self, time_limit: float = 0) -> int:
+        """ Deliver the messages waiting, waiting up to time_limit for the first one"""
+        delivered = 0
+        for queue_name, callback in self._consumers:
+            message = self.broker.get(queue_name, timeout=time_limit if delivered == 0 else 0)
+            while message is not None:
+                routing_key, body, properties = message
+                callback(self, SimpleNamespace(routing_key=routing_key), properties, body)
+                delivered += 1
+                message = self.broker.get(queue_name)
+        return delivered
+
+    def start_consuming(self) -> None:
+        self._consuming = True
+        while self._consuming and self.is_open:
+            self.process_data_events(time_limit=0.1)
+
+    def stop_consuming(self) -> None:
+        self._consuming = False
+
+    def close(self) -> None:
+        self.is_open = False
+        self._consuming = False
+        for queue_name, _ in self._consumers:
+            self.broker._delete(queue_name)
+
+
+class LocalConnection(object):
+    def __init__(self, broker: LocalBroker):
+        self.broker = broker
+        self._channels = []
+        self.is_open = True
+
+    def channel(self) -> LocalChannel:
+        channel = LocalChannel(self.broker)
+        self._channels.append(channel)
+        return channel
+
+    def process_data_events(self, time_limit: float = 0) -> None:
+        for channel in self._channels:
+            channel.process_data_events(time_limit=time_limit)
+
+    def close(self) -> None:
+        self.is_open = False
+        for channel in self._channels:
+            channel.close()
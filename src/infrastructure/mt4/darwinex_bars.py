@@ -0,0 +1,142 @@
+""" Bars from the tick files of the Darwinex FTP, one day at a time.
+The ticks of each day are resampled in a single groupby/agg pass and the day is released before the next one is
+downloaded, so the memory used is the one of a day and not of the whole range. The symbols are processed in
+parallel, each thread with its own FTP connection (darwinex_ticks is not thread safe).
+"""
+import datetime as dt
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def days(start_date: dt.datetime, end_date: dt.datetime) -> List[str]:
+    """ Days of the range, both included, in the format of the Darwinex files"""
+    return [(start_date.date() + dt.timedelta(days=i)).strftime("%Y-%m-%d")
+            for i in range((end_date.date() - start_date.date()).days + 1)]
+
+
+def ticks_to_bars(data, timeframe: str = '1min', previous: Dict = None):
+    """ Bars of the ticks of a day (columns Ask, Bid, Ask_size, Bid_size) with open, high, low, close of the
+    mid price, volume, bid and ask. The periods without ticks between the first and the last bar take the close
+    of the bar before with volume 0.
+
+    Parameters
+    ----------
+    data: DataFrame of ticks with utc index
+    timeframe: pandas frequency of the bars
+    previous: {'Ask', 'Bid'} last quote of the day before, for the first ticks with only one side
+    """
+    import pandas as pd
+    data = data.copy()
+    data[['Ask', 'Bid']] = data[['Ask', 'Bid']].ffill()
+    if previous:
+        data = data.fillna(previous)
+    data = data.dropna(subset=['Ask', 'Bid'])
+    if len(data) == 0:
+        return None
+    index = data.index.tz_localize(None) if data.index.tz is not None else data.index
+    ticks = pd.DataFrame({'price': ((data['Ask'] + data['Bid']) / 2).astype(float).values,
+                          'volume': (data['Ask_size'].fillna(0) + data['Bid_size'].fillna(0)).values,
+                          'bid': data['Bid'].values, 'ask': data['Ask'].values},
+                         index=index.floor(timeframe))
+    bars = ticks.groupby(level=0, sort=True).agg(open=('price', 'first'), high=('price', 'max'),
+                                                 low=('price', 'min'), close=('price', 'last'),
+                                                 volume=('volume', 'sum'), bid=('bid', 'last'), ask=('ask', 'last'))
+    full = pd.date_range(bars.index[0], bars.index[-1], freq=timeframe)
+    if len(full) > len(bars):  # periods without ticks
+        bars = bars.reindex(full)
+        close = bars['close'].ffill()
+        for c in ['open', 'high', 'low']:
+            bars[c] = bars[c].fillna(close)
+        bars['close'] = close
+        bars['volume'] = bars['volume'].fillna(0)
+        bars[['bid', 'ask']] = bars[['bid', 'ask']].ffill()
+    bars.index.name = None
+    return bars
+
+
+class DarwinexBars(object):
+    """ Historical bars of the Darwinex tick data.
+
+    Parameters
+    ----------
+    connect: callable() returning a darwinex_ticks.DarwinexTicksConnection, called once by thread
+    timeframe: pandas frequency of the bars
+    max_workers: symbols processed at the same time
+    """
+
+    def __init__(self, connect: callable, timeframe: str = '1min', max_workers: int = 4):
+        self.connect = connect
+        self.timeframe = timeframe
+        self.max_workers = max_workers
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, 'dwt', None) is None:
+            self._local.dwt = self.connect()
+        return self._local.dwt
+
+    def iter_days(self, ticker: str, start_date: dt.datetime, end_date: dt.datetime):
+        """ Generator of the bars of the ticker by day.
+        Only the days without files in the FTP (weekends and holidays) are skipped, any other error is raised so a
+        resumed download does not continue after a day that was not downloaded.
+        """
+        dwt = self._connection()
+        with_files = set(dwt.list_of_files(ticker)['date'])
+        previous = None
+        for day in days(start_date, end_date):
+            if day not in with_files:
+                continue
+            data = dwt.ticks_from_darwinex(ticker, start=day, end=day)
+            bars = ticks_to_bars(data, self.timeframe, previous)
+            if bars is None:
+                continue
+            previous = {'Ask': bars['ask'].iloc[-1], 'Bid': bars['bid'].iloc[-1]}
+            del data
+            bars = bars[(bars.index >= start_date) & (bars.index <= end_date)]
+            if len(bars) > 0:
+                yield self._add_columns(bars, ticker)
+
+    def _add_columns(self, bars, ticker: str):
+        bars['ticker'] = ticker
+        bars['symbol'] = ticker
+        bars['datetime'] = bars.index
+        bars['dtime_zone'] = 'UTC'
+        bars['exchange'] = 'mt4_darwinex'
+        bars['provider'] = 'mt4_darwinex'
+        bars['freq'] = self.timeframe
+        bars['multiplier'] = 1
+        return bars
+
+    def _symbol(self, ticker: str, start_date: dt.datetime, end_date: dt.datetime, on_day: callable):
+        pages = []
+        for bars in self.iter_days(ticker, start_date, end_date):
+            if on_day is not None:
+                on_day(ticker, bars)  # written by day, not kept in memory
+            else:
+                pages.append(bars)
+        return pages
+
+    def get_historical_data(self, symbols: List[str], start_date: dt.datetime, end_date: dt.datetime,
+                            on_day: callable = None) -> Dict:
+        """ Bars of the symbols in parallel.
+        With on_day(ticker, bars) each day is passed to it and nothing is returned, without it returns a dict of
+        ticker: DataFrame with all the days.
+        """
+        import pandas as pd
+        bars = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {ticker: pool.submit(self._symbol, ticker, start_date, end_date, on_day)
+                       for ticker in symbols}
+            for ticker, future in futures.items():
+                try:
+                    pages = future.result()
+                except Exception as e:
+                    logger.error(f'Error getting historical data of {ticker}: {e}')
+                    continue
+                if len(pages) > 0:
+                    bars[ticker] = pd.concat(pages)
+        return bars
@@ -3,12 +3,13 @@ from typing import Dict, List
 import threading
 import time
 import datetime as dt
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from src.domain.abstractions.abstract_trading import Abstract_Trading
 from src.domain.decorators import check_api_key
 from src.infrastructure.mt4.mt_zeromq_connector import MTZeroMQConnector
-from time import sleep
 from src.application.base_logger import logger
 import darwinex_ticks
+from src.infrastructure.mt4.darwinex_bars import DarwinexBars
 from src.infrastructure.brokerMQ import Emit_Events
 
 
@@ -67,7 +68,8 @@ class Trading(Abstract_Trading):
         super().__init__(send_orders_status=send_orders_status, exchange_or_broker=exchange_or_broker,
                          config_broker=config_broker)
         self.exchange_or_broker = exchange_or_broker.split('_')[0]
-        self.dwt = None  # darwinex_ticks with FTP connection
+        self.dwt = {}  # key: timeframe, value: DarwinexBars with the FTP connections of darwinex_ticks
+        self._dwt_lock = threading.Lock()
         self.sleep = None
         if self.exchange_or_broker == 'darwinex':
             self.get_historical_data = self._get_historical_data_darwinex
@@ -93,57 +95,22 @@ class Trading(Abstract_Trading):
         setting: dict (default: {'symbols': List[str]})
             Symbols of the assets. Example: EURUSD, etc.
         """
-        if timeframe == '1m':
-            timeframe = '1min'
-        elif timeframe == '5m':
-            timeframe = '5min'
-
-        if self.dwt is None:  # connection already exists
-            self.dwt = darwinex_ticks.DarwinexTicksConnection(dwx_ftp_user=self.config_broker['DWT_FTP_USER'],
-                                                              dwx_ftp_pass=self.config_broker['DWT_FTP_PASS'],
-                                                              dwx_ftp_hostname=self.config_broker['DWT_FTP_HOSTNAME'],
-                                                              dwx_ftp_port=self.config_broker['DWT_FTP_PORT'])
-        _start_date = start_date.strftime("%Y-%m-%d")
-        _end_date = end_date.strftime("%Y-%m-%d")
-        bars = {}
-        for ticker in symbols:
-            print(dt.datetime.utcnow())
-            # Read historical data from darwinex
-
-            data = self.dwt.ticks_from_darwinex(ticker, start=_start_date,
-                                                end=_end_date)
-
-            if len(data) > 0:
-                data.index = data.index.tz_localize(None)
-                data['datetime'] = data.index
-                data['date'] = data['datetime'].dt.floor('Min')
-                data['price'] = (data['Ask'] + data['Bid']) / 2
-                data['volume'] = data['Ask_size'] + data['Bid_size']
-                # Get open, low, high and close
-                ohlc = data['price'].astype(float).resample(timeframe).ohlc()
-                # Group by volume, bid and ask and get this values
-                groupby_volume = data.groupby(["date"])["volume"].sum().to_frame()
-                groupby_volume.index.name = 'datetime'
-                groupby_ask = data.groupby(["date"])["Ask"].last().to_frame()
-                groupby_ask.index.name = 'datetime'
-                groupby_bid = data.groupby(["date"])["Bid"].last().to_frame()
-                groupby_bid.index.name = 'datetime'
-                # Fill columns
-                ohlc['volume'] = groupby_volume['volume']
-                ohlc['bid'] = groupby_bid['Bid']
-                ohlc['ask'] = groupby_ask['Ask']
-                ohlc['ticker'] = ticker
-                ohlc['symbol'] = ticker
-                ohlc['datetime'] = ohlc.index
-                ohlc['dtime_zone'] = 'UTC'
-                ohlc['exchange'] = 'mt4_darwinex'
-                ohlc['provider'] = 'mt4_darwinex'
-                ohlc['freq'] = timeframe
-                ohlc['multiplier'] = 1
-                ohlc = ohlc.fillna(method="ffill")
-                if len(ohlc) > 0:  #
-                    bars[ticker] = ohlc
-        return bars
+        # the ticks are resampled day by day and the symbols in parallel, each thread with its FTP connection
+        return self.darwinex_bars(timeframe).get_historical_data(symbols, start_date, end_date)
+
+    def _connect_darwinex_ticks(self):
+        return darwinex_ticks.DarwinexTicksConnection(dwx_ftp_user=self.config_broker['DWT_FTP_USER'],
+                                                      dwx_ftp_pass=self.config_broker['DWT_FTP_PASS'],
+                                                      dwx_ftp_hostname=self.config_broker['DWT_FTP_HOSTNAME'],
+                                                      dwx_ftp_port=self.config_broker['DWT_FTP_PORT'])
+
+    def darwinex_bars(self, timeframe: str = '1min') -> DarwinexBars:
+        """ Resampler of the tick data of Darwinex, the FTP connections are reused between calls"""
+        timeframe = {'1m': '1min', '5m': '5min'}.get(timeframe, timeframe)
+        with self._dwt_lock:
+            if timeframe not in self.dwt:
+                self.dwt[timeframe] = DarwinexBars(self._connect_darwinex_ticks, timeframe=timeframe)
+            return self.dwt[timeframe]
 
     def start_update_orders_status(self) -> None:
         """Start update orders status."""
@@ -176,17 +143,13 @@ class Trading(Abstract_Trading):
             if order.action_mt4 == 'close_trade':
                 # Close total
                 logger.info(f'Sending Order to close positions in ticker: {order.ticker} quantity: {order.quantity}')
-                self.client._set_response_(None)
-                self.client.MTX_CLOSE_TRADE_BY_TICKET_(order.order_id_receiver)
-                respond_order = self._get_return()
+                respond_order = self._get_return(self.client.MTX_CLOSE_TRADE_BY_TICKET_(order.order_id_receiver))
 
             # partially closed trade
             elif order.action_mt4 == 'close_partial':
                 logger.info(f'Sending Order to close partial positions in ticker: {order.ticker} quantity: {order.quantity}')
-                self.client._set_response_(None)
-                self.client.MTX_CLOSE_PARTIAL_BY_TICKET_(
-                    order.order_id_receiver, order.quantity)
-                respond_order = self._get_return()
+                respond_order = self._get_return(self.client.MTX_CLOSE_PARTIAL_BY_TICKET_(
+                    order.order_id_receiver, order.quantity))
 
             try:
                 # Saving order_id en order
@@ -262,11 +225,11 @@ class Trading(Abstract_Trading):
         for _ti in tickers:
             self.client.MTX_SUBSCRIBE_MARKETDATA_(_symbol=_ti)
 
-    def get_total_balance(self, _delay=0.1, _wbreak=10):
+    def get_total_balance(self, timeout=1.0):
         """
         Get Balance
         """
-        response = self._get_response('_info')
+        response = self._get_response('_info', timeout=timeout)
 
         if response is None:
             msg = 'No response received, either there are no open trades or check the connection'
@@ -276,69 +239,58 @@ class Trading(Abstract_Trading):
         else:
             return response['_equity']
 
-    def _get_response(self, key, _delay=0.1, _wbreak=10):
+    def _request(self, key):
+        """ Send the command that answers with key, returns a Future"""
+        if key == '_info':
+            return self.client.MTX_GET_BALANCE_()
+        elif key == 't':
+            return self.client.MTX_GET_POSITION_()
+        elif key == '_trades':
+            return self.client.MTX_GET_ALL_OPEN_TRADES_()
+
+    def _get_response(self, key, timeout=1.0):
         """
         Returns active positions, balance
         """
-        # Reset data output
-        self.client._set_response_(None)
+        return self._get_responses([key], timeout=timeout)[key]
 
-        # Get open trades from MetaTrader
-        if key == '_info':
-            self.client.MTX_GET_BALANCE_()
-        elif key == 't':
-            self.client.MTX_GET_POSITION_()
-        elif key == '_trades':
-            self.client.MTX_GET_ALL_OPEN_TRADES_()
-
-        # While loop start time reference
-        _ws = dt.datetime.utcnow()
-
-        # While data not received, sleep until timeout
-        while not self.client._valid_response_('zmq'):
-            sleep(_delay)
-            if (dt.datetime.utcnow() - _ws).total_seconds() > (
-                    _delay * _wbreak):
-                break
-
-        # If data received, return DataFrame
-        if self.client._valid_response_('zmq'):
-            _response = self.client._get_response_()
-            # print('respuesta :', _response)
-            if (key in _response.keys()):
-                # len(_response['_trades']) > 0):
-                return _response[key]
-        return None
+    def _get_responses(self, keys, timeout=1.0):
+        """
+        Send the commands of all the keys at once (balance, positions, trades) and wait for all the responses
+        Returns dict with the response by key, None if it is not received in timeout seconds
+        """
+        futures = {key: self._request(key) for key in keys}
+        deadline = time.monotonic() + timeout
+        responses = {}
+        for key, future in futures.items():
+            response = self._get_return(future, timeout=max(0.0, deadline - time.monotonic()), _check=key)
+            responses[key] = response[key] if response is not None else None
+        return responses
 
     def _get_return(self,
-                    _delay=0.250,
-                    _wbreak=22,
+                    future,
+                    timeout=5.5,
                     _check='_action'):
-
-        # While loop start time reference
-        _ws = dt.datetime.utcnow()
-
-        # While data not received, sleep until timeout
-        while not self.client._valid_response_('zmq'):
-            sleep(_delay)
-
-            if (dt.datetime.utcnow() - _ws).total_seconds() > (
-                    _delay * _wbreak):
-                break
-
-        # If data received, return response
-        if self.client._valid_response_('zmq'):
-            msg = self.client._get_response_()
-            if _check in msg.keys():
-                return msg
+        """ Wait for the response of the command, returns None if it is not received in timeout seconds"""
+        if future is None:
+            return None
+        try:
+            msg = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            return None
+        if _check in msg.keys():
+            return msg
         # Default
         return None
 
-    def get_trades(self):
+    def get_trades(self, response=None):
         """
            Returns open trades
+           response: response of GET_POSITION if it has been already asked
         """
-        response = self._get_response('t')
+        if response is None:
+            response = self._get_response('t')
         if response is None:
             msg = 'No response received, either there are no open trades or check the connection'
             logger.error(msg)
@@ -364,8 +316,7 @@ class Trading(Abstract_Trading):
             order_response = self._send_order(order,
                                               comment=order.order_id_sender,
                                               _verbose=False,
-                                              _delay=0.250,
-                                              _wbreak=22,
+                                              timeout=5.5,
                                               up_date=up_date)
 
             print(f'Response order :{order_response}')
@@ -403,8 +354,8 @@ class Trading(Abstract_Trading):
             self.dict_from_strategies.pop(order.order_id_sender)
             self.dict_open_orders[order.order_id_sender] = order
 
-    def _send_order(self, order: dataclasses.dataclass, comment='SmartBots_to_MT', _verbose=False, _delay=0.1,
-                    _wbreak=10, up_date=False):
+    def _send_order(self, order: dataclasses.dataclass, comment='SmartBots_to_MT', _verbose=False, timeout=1.0,
+                    up_date=False):
 
         _check = ''
         actions = {'buy': 0,
@@ -424,9 +375,7 @@ class Trading(Abstract_Trading):
                      '_magic': 123456,
                      '_type': actions[order.action]}
 
-        # Reset thread data output
-        self.client._set_response_(None)
-
+        future = None
         if order.type in ['market']:
             exec_dict['_price'] = 0
         elif order.type in ['limit']:
@@ -439,19 +388,19 @@ class Trading(Abstract_Trading):
             exec_dict['_action'] = 'OPEN'
             exec_dict['_ticket'] = 0
             _check = '_action'
-            self.client.MTX_NEW_TRADE_(_order=exec_dict)
+            future = self.client.MTX_NEW_TRADE_(_order=exec_dict)
 
         if _verbose:
             print('\n[{}] {} -> MetaTrader'.format(exec_dict['_comment'],
                                                    str(exec_dict)))
 
-        return self._get_return(_check=_check)
+        return self._get_return(future, timeout=timeout, _check=_check)
 
-    def _get_trades_all_info(self, _delay=0.1, _wbreak=10):
+    def _get_trades_all_info(self, timeout=1.0):
         """ Fails when there are more than 16 open orders
            Returns the open trades with all the information
         """
-        response = self._get_response('_trades')
+        response = self._get_response('_trades', timeout=timeout)
 
         if response is None:
             msg = 'No response received, either there are no open trades or check the connection'
@@ -463,9 +412,11 @@ class Trading(Abstract_Trading):
 
     def _check_order(self):
         """ Check open order and send changes to Portfolio  and for saving in the database"""
-        current_positions = self._get_trades_all_info()
+        # both commands are pipelined, positions are used if the trades with all the info fail
+        responses = self._get_responses(['_trades', 't'])
+        current_positions = responses['_trades']
         if current_positions is None:
-            current_positions = self.get_trades()
+            current_positions = self.get_trades(response=responses['t'])
         list_changing = []
         for order_id in self.dict_open_orders.keys():
             order = self.dict_open_orders[order_id]
@@ -1,7 +1,67 @@
 import zmq
-from time import sleep
+import ast
+import itertools
+import json
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from datetime import datetime
-from threading import Thread
+from threading import Thread, Lock
+from src.domain.services.stats.latency import LatencyStats
+
+try:
+    import orjson  # faster json decoder if it is installed
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+def parse_response(msg: str) -> dict:
+    """ Parse the response of MetaTrader without eval.
+    The EA sends python dict literals with single quotes, they are decoded as json replacing the quotes and
+    ast.literal_eval (safe, slower) is used when that is not possible.
+    """
+    try:
+        return _json_loads(msg)
+    except ValueError:
+        pass
+    if '"' not in msg and '\\' not in msg:
+        try:
+            return _json_loads(msg.replace("'", '"'))
+        except ValueError:
+            pass
+    return ast.literal_eval(msg)  # integer keys, booleans or escaped quotes
+
+# Key of the response of every action, the trade actions answer with '_action'
+RESPONSE_KEYS = {'GET_BALANCE': '_info', 'GET_POSITION': 't', 'GET_OPEN_TRADES': '_trades'}
+
+
+class _Request(namedtuple('_Request', ['id', 'key', 'future', 'time'])):
+    """ Command sent waiting for its response"""
+
+    def __new__(cls, id, key, future):
+        return super().__new__(cls, id, key, future, time.monotonic())
+
+
+class TickCounter(object):
+    """ Ticks received by symbol and ticks by second in the last completed second"""
+
+    def __init__(self):
+        self.count = 0
+        self.rate = 0.0
+        self._second = None
+        self._second_count = 0
+
+    def add(self, now: float) -> None:
+        self.count += 1
+        second = int(now)
+        if second != self._second:
+            if self._second is not None:
+                # seconds without ticks between the windows lower the rate
+                self.rate = self._second_count if second - self._second == 1 else 0.0
+            self._second = second
+            self._second_count = 0
+        self._second_count += 1
 
 
 class MTZeroMQConnector():
@@ -18,7 +78,11 @@ class MTZeroMQConnector():
                  sub_port=32770,  # Port for Subscribing for prices
                  delimiter=';',
                  market_data_callback=None,  # Callback for Market data
-                 verbose=False):  # String delimiter
+                 verbose=False,
+                 market_data_maxlen=1000,  # Ticks kept by symbol in _Market_Data_DB, 0 to keep none
+                 poll_timeout=1000,  # Milliseconds waiting for data before checking _ACTIVE
+                 send_timeout=1000,  # Milliseconds waiting to send a command
+                 stale_seconds=60):  # Seconds keeping a request timed out waiting for its response
 
         # Strategy Status (if this is False, ZeroMQ will not listen for data)
         self._ACTIVE = True
@@ -49,6 +113,7 @@ class MTZeroMQConnector():
         # Create Sockets
         self._PUSH_SOCKET = self._ZMQ_CONTEXT.socket(zmq.PUSH)
         self._PUSH_SOCKET.setsockopt(zmq.SNDHWM, 1)
+        self._PUSH_SOCKET.setsockopt(zmq.SNDTIMEO, send_timeout)
 
         self._PULL_SOCKET = self._ZMQ_CONTEXT.socket(zmq.PULL)
         self._PULL_SOCKET.setsockopt(zmq.RCVHWM, 1)
@@ -73,19 +138,15 @@ class MTZeroMQConnector():
 
         # Start listening for responses to commands and new market data
         self._string_delimiter = delimiter
+        self._poll_timeout = poll_timeout
 
-        # BID/ASK Market Data Subscription Threads ({SYMBOL: Thread})
-        self._MarketData_Thread = None
-
-        # Begin polling for PULL / SUB data
+        # Market Data by Symbol, last market_data_maxlen ticks (holds tick data)
+        self._market_data_maxlen = market_data_maxlen
+        self._Market_Data_DB = {}  # {SYMBOL: deque([(TIMESTAMP, BID, ASK)])}
 
-        self._MarketData_Thread = Thread(target=self._MT_ZMQ_Poll_Data,
-                                         args=(self._string_delimiter,
-                                               self._market_data_callback))
-        self._MarketData_Thread.start()
-
-        # Market Data Dictionary by Symbol (holds tick data)
-        self._Market_Data_DB = {}  # {SYMBOL: {TIMESTAMP: (BID, ASK)}}
+        # Ticks by second and latency of the callback by symbol
+        self._tick_counters = {}  # {SYMBOL: TickCounter}
+        self._callback_latency = LatencyStats()
 
         # Temporary Order STRUCT for convenience wrappers later.
         self.temp_order_dict = self._generate_default_order_dict()
@@ -96,6 +157,24 @@ class MTZeroMQConnector():
         # Verbosity
         self._verbose = verbose
 
+        # Sends from several threads share the PUSH socket
+        self._send_lock = Lock()
+
+        # Requests waiting for response
+        self._requests = deque()  # [_Request]
+        self._requests_lock = Lock()
+        self._request_ids = itertools.count(1)
+        self._stale_seconds = stale_seconds
+
+        # BID/ASK Market Data Subscription Threads ({SYMBOL: Thread})
+        self._MarketData_Thread = None
+
+        # Begin polling for PULL / SUB data
+        self._MarketData_Thread = Thread(target=self._MT_ZMQ_Poll_Data,
+                                         args=(self._string_delimiter,),
+                                         daemon=True)
+        self._MarketData_Thread.start()
+
     ##########################################################################
 
     """
@@ -114,12 +193,20 @@ class MTZeroMQConnector():
     """
 
     def remote_send(self, _socket, _data):
+        """ Returns False if the command couldn't be sent in SNDTIMEO"""
+
+        with self._send_lock:
+            return self._send_string(_socket, _data)
+
+    @staticmethod
+    def _send_string(_socket, _data):
 
         try:
-            _socket.send_string(_data, zmq.DONTWAIT)
+            _socket.send_string(_data)  # blocks until SNDTIMEO
         except zmq.error.Again:
             print("\nResource timeout.. please try again.")
-            sleep(0.000000001)
+            return False
+        return True
 
     ##########################################################################
 
@@ -153,20 +240,28 @@ class MTZeroMQConnector():
     Function to retrieve data from MetaTrader (PULL or SUB)
     """
 
-    def remote_recv(self, _socket):
-
-        try:
-            msg = _socket.recv_string(zmq.DONTWAIT)
-            return msg
-        except zmq.error.Again:
-            print("\nResource timeout.. please try again.")
-            sleep(0.000001)
+    def remote_recv(self, _socket, _timeout=None):
 
+        if _socket.poll(self._poll_timeout if _timeout is None else _timeout, zmq.POLLIN):
+            try:
+                return _socket.recv_string(zmq.DONTWAIT)
+            except zmq.error.Again:
+                pass
+        print("\nResource timeout.. please try again.")
         return None
 
     ##########################################################################
 
+    def get_market_data_stats(self):
+        """ Ticks received, ticks by second and latency of the callback (seconds) by symbol"""
+        latency = self._callback_latency.summary()
+        return {symbol: {'ticks': counter.count, 'rate': counter.rate, 'latency': latency.get(symbol)}
+                for symbol, counter in list(self._tick_counters.items())}
+
+    ##########################################################################
+
     # Convenience functions to permit easy trading via underlying functions.
+    # Every command returns a Future completed with its response by the poller thread.
 
     # OPEN ORDER
     def MTX_NEW_TRADE_(self, _order=None):
@@ -175,110 +270,55 @@ class MTZeroMQConnector():
             _order = self._generate_default_order_dict()
 
         # Execute
-        self.MTX_SEND_COMMAND_(**_order)
+        return self.MTX_SEND_COMMAND_(**_order)
 
     # MODIFY ORDER
     def MTX_MODIFY_TRADE_BY_TICKET_(self, _ticket, _SL, _TP):  # in points
 
-        try:
-            self.temp_order_dict['_action'] = 'MODIFY'
-            self.temp_order_dict['_SL'] = _SL
-            self.temp_order_dict['_TP'] = _TP
-            self.temp_order_dict['_ticket'] = _ticket
-
-            # Execute
-            self.MTX_SEND_COMMAND_(**self.temp_order_dict)
-
-        except KeyError:
-            print("[ERROR] Order Ticket {} not found!".format(_ticket))
+        return self._send_action('MODIFY', _SL=_SL, _TP=_TP, _ticket=_ticket)
 
     # CLOSE ORDER
     def MTX_CLOSE_TRADE_BY_TICKET_(self, _ticket):
 
-        try:
-            self.temp_order_dict['_action'] = 'CLOSE'
-            self.temp_order_dict['_ticket'] = _ticket
-
-            # Execute
-            self.MTX_SEND_COMMAND_(**self.temp_order_dict)
-
-        except KeyError:
-            print("[ERROR] Order Ticket {} not found!".format(_ticket))
+        return self._send_action('CLOSE', _ticket=_ticket)
 
     # CLOSE PARTIAL
     def MTX_CLOSE_PARTIAL_BY_TICKET_(self, _ticket, _lots):
 
-        try:
-            self.temp_order_dict['_action'] = 'CLOSE_PARTIAL'
-            self.temp_order_dict['_ticket'] = _ticket
-            self.temp_order_dict['_lots'] = _lots
-
-            # Execute
-            self.MTX_SEND_COMMAND_(**self.temp_order_dict)
-
-        except KeyError:
-            print("[ERROR] Order Ticket {} not found!".format(_ticket))
+        return self._send_action('CLOSE_PARTIAL', _ticket=_ticket, _lots=_lots)
 
     # CLOSE MAGIC
     def MTX_CLOSE_TRADES_BY_MAGIC_(self, _magic):
 
-        try:
-            self.temp_order_dict['_action'] = 'CLOSE_MAGIC'
-            self.temp_order_dict['_magic'] = _magic
-
-            # Execute
-            self.MTX_SEND_COMMAND_(**self.temp_order_dict)
-
-        except KeyError:
-            pass
+        return self._send_action('CLOSE_MAGIC', _magic=_magic)
 
     # CLOSE ALL TRADES
     def MTX_CLOSE_ALL_TRADES_(self):
 
-        try:
-            self.temp_order_dict['_action'] = 'CLOSE_ALL'
-
-            # Execute
-            self.MTX_SEND_COMMAND_(**self.temp_order_dict)
-
-        except KeyError:
-            pass
+        return self._send_action('CLOSE_ALL')
 
     # GET OPEN TRADES
     def MTX_GET_ALL_OPEN_TRADES_(self):
 
-        try:
-            self.temp_order_dict['_action'] = 'GET_OPEN_TRADES'
-
-            # Execute
-            self.MTX_SEND_COMMAND_(**self.temp_order_dict)
-
-        except KeyError:
-            pass
+        return self._send_action('GET_OPEN_TRADES')
 
     # GET OPEN POSITION
     def MTX_GET_POSITION_(self):
 
-        try:
-            self.temp_order_dict['_action'] = 'GET_POSITION'
-
-            # Execute
-            self.MTX_SEND_COMMAND_(**self.temp_order_dict)
-
-        except KeyError:
-            pass
+        return self._send_action('GET_POSITION')
 
     # GET BALANCE
     def MTX_GET_BALANCE_(self):
 
-        try:
-            self.temp_order_dict['_action'] = 'GET_BALANCE'
-
-            # Execute
-            self.MTX_SEND_COMMAND_(**self.temp_order_dict)
+        return self._send_action('GET_BALANCE')
 
-        except KeyError:
-            pass
+    def _send_action(self, _action, **kwargs):
+        """ Send command with the default order dict, a new dict is used by command so that
+        commands from several threads do not share it"""
+        _order = self._generate_default_order_dict()
+        _order.update(kwargs)
+        _order['_action'] = _action
+        return self.MTX_SEND_COMMAND_(**_order)
 
     # DEFAULT ORDER DICT
     def _generate_default_order_dict(self):
@@ -313,13 +353,15 @@ class MTZeroMQConnector():
                                      _end=datetime.now().strftime('%Y.%m.%d %H:%M:00')):
         # _end='2019.01.04 17:05:00'):
 
-        _msg = "{};{};{};{};{}".format('DATA',
-                                       _symbol,
-                                       _timeframe,
-                                       _start,
-                                       _end)
+        _id = next(self._request_ids)
+        _msg = "{};{};{};{};{};{}".format('DATA',
+                                          _symbol,
+                                          _timeframe,
+                                          _start,
+                                          _end,
+                                          _id)
         # Send via PUSH Socket
-        self.remote_send(self._PUSH_SOCKET, _msg)
+        return self._send_request(_id, '_action', _msg)
 
     ##########################################################################
     """
@@ -331,14 +373,15 @@ class MTZeroMQConnector():
                           _SL=50, _TP=50, _comment="Python-to-MT",
                           _lots=0.01, _magic=123456, _ticket=0):
 
-        _msg = "{};{};{};{};{};{};{};{};{};{};{}".format('TRADE', _action, _type,
-                                                         _symbol, _price,
-                                                         _SL, _TP, _comment,
-                                                         _lots, _magic,
-                                                         _ticket)
+        _id = next(self._request_ids)
+        _msg = "{};{};{};{};{};{};{};{};{};{};{};{}".format('TRADE', _action, _type,
+                                                            _symbol, _price,
+                                                            _SL, _TP, _comment,
+                                                            _lots, _magic,
+                                                            _ticket, _id)
 
         # Send via PUSH Socket
-        self.remote_send(self._PUSH_SOCKET, _msg)
+        return self._send_request(_id, RESPONSE_KEYS.get(_action, '_action'), _msg)
 
         """
          compArray[0] = TRADE or DATA
@@ -366,91 +409,146 @@ class MTZeroMQConnector():
          compArray[8] = Lots
          compArray[9] = Magic Number
          compArray[10] = Ticket Number (MODIFY/CLOSE)
+         compArray[11] = Request id, echoed as '_id' by the EA if it supports it
          """
-        # pass
 
     ##########################################################################
 
     """
     Function to check Poller for new reponses (PULL) and market data (SUB)
+    The poll blocks until there is data or poll_timeout, then every socket is drained without waiting.
     """
 
     def _MT_ZMQ_Poll_Data(self,
-                          string_delimiter=';',
-                          # market_data_callback=None,
-                          dictionary_DB=True):
+                          string_delimiter=';'):
 
         while self._ACTIVE:
 
-            sockets = dict(self._poller.poll())
+            sockets = dict(self._poller.poll(self._poll_timeout))
 
             # Process response to commands sent to MetaTrader
-            if self._PULL_SOCKET in sockets and sockets[
-                self._PULL_SOCKET] == zmq.POLLIN:
-
-                try:
-
-                    msg = self._PULL_SOCKET.recv_string(zmq.DONTWAIT)
+            if sockets.get(self._PULL_SOCKET) == zmq.POLLIN:
+                for msg in self._drain(self._PULL_SOCKET):
+                    self._process_response(msg)
 
-                    # If data is returned, store as pandas Series
-                    if msg != '' and msg != None:
-
-                        try:
-                            _data = eval(msg)
-
-                            self._thread_data_output = _data
-                            if self._verbose:
-                                print(_data)  # default logic
+            # Receive new market data from MetaTrader
+            if sockets.get(self._SUB_SOCKET) == zmq.POLLIN:
+                for msg in self._drain(self._SUB_SOCKET):
+                    self._process_market_data(msg, string_delimiter)
+
+    @staticmethod
+    def _drain(_socket):
+        """ Messages waiting in the socket"""
+        while True:
+            try:
+                yield _socket.recv_string(zmq.DONTWAIT)
+            except zmq.error.Again:
+                return
+
+    def _process_response(self, msg):
+
+        if msg == '' or msg is None:
+            return
+        try:
+            _data = parse_response(msg)
+        except (ValueError, SyntaxError) as ex:
+            _exstr = "Exception Type {0}. Args:\n{1!r}"
+            print(_exstr.format(type(ex).__name__, ex.args))
+            return
+
+        self._thread_data_output = _data
+        if self._verbose:
+            print(_data)  # default logic
+        if isinstance(_data, dict):
+            self._complete_request(_data)
 
-                        except Exception as ex:
-                            _exstr = "Exception Type {0}. Args:\n{1!r}"
-                            _msg = _exstr.format(type(ex).__name__, ex.args)
-                            print(_msg)
+    ##########################################################################
 
-                except zmq.error.Again:
-                    pass  # resource temporarily unavailable, nothing to print
-                except ValueError:
-                    pass  # No data returned, passing iteration.
-                except UnboundLocalError:
-                    pass  # _symbol may sometimes get referenced before being assigned.
+    """
+    Correlation of commands and responses.
+    Responses with '_id' complete the request with this id. Otherwise the EA answers in the same order
+    than it receives the commands, so the response completes the oldest request waiting for its key.
+    Requests whose caller timed out stay in the queue to consume their late response, until stale_seconds.
+    The request is queued before sending so a fast response finds it, the send lock keeps the queue in the order
+    of the sends and the poller thread is not blocked while a send waits. A command not sent is removed from the
+    queue and its future fails with TimeoutError, so it doesn't take the response of another command.
+    """
 
-            # Receive new market data from MetaTrader
-            if self._SUB_SOCKET in sockets and sockets[
-                self._SUB_SOCKET] == zmq.POLLIN:
-
-                try:
-                    msg = self._SUB_SOCKET.recv_string(zmq.DONTWAIT)
-
-                    if msg != "":
-                        _symbol, _data = msg.split(" ")
-                        _bid, _ask = _data.split(string_delimiter)
-                        _timestamp = str(datetime.utcnow())
-
-                        if self._verbose:
-                            print(
-                                "\n[" + _symbol + "] " + _timestamp + " (" + _bid + "/" + _ask + ") BID/ASK")
-
-                        # Update Market Data
-                        if dictionary_DB:
-                            if _symbol not in self._Market_Data_DB.keys():
-                                self._Market_Data_DB[_symbol] = {}
-
-                            self._Market_Data_DB[_symbol][_timestamp] = (
-                                float(_bid), float(_ask))
-
-                        if self._market_data_callback:
-                            _event = {'Symbol': _symbol,
-                                      'Time': _timestamp,
-                                      'Bid': _bid,
-                                      'Ask': _ask}
-                            self._market_data_callback(_event)
-
-                except zmq.error.Again:
-                    pass  # resource temporarily unavailable, nothing to print
-                except ValueError:
-                    pass  # No data returned, passing iteration.
-                except UnboundLocalError:
-                    pass  # _symbol may sometimes get referenced before being assigned.
+    def _send_request(self, _id, _key, _msg):
+
+        future = Future()
+        request = _Request(_id, _key, future)
+        with self._send_lock:
+            with self._requests_lock:
+                self._requests.append(request)
+            sent = self._send_string(self._PUSH_SOCKET, _msg)
+        if not sent:
+            with self._requests_lock:
+                if request in self._requests:
+                    self._requests.remove(request)
+            if future.set_running_or_notify_cancel():
+                future.set_exception(FutureTimeoutError(f'Command {_id} not sent to MetaTrader'))
+        return future
+
+    def _complete_request(self, _data):
+
+        now = time.monotonic()
+        with self._requests_lock:
+            request = None
+            if '_id' in _data:
+                for r in self._requests:
+                    if str(r.id) == str(_data['_id']):
+                        request = r
+                        break
+            if request is None:
+                for r in self._requests:
+                    if r.key in _data:
+                        request = r
+                        break
+            if request is not None:
+                self._requests.remove(request)
+            # forget requests timed out long ago, their response will not arrive
+            self._requests = deque(r for r in self._requests
+                                   if not (r.future.cancelled() and now - r.time > self._stale_seconds))
+        if request is not None and request.future.set_running_or_notify_cancel():
+            request.future.set_result(_data)
+
+    def _process_market_data(self, msg, string_delimiter=';'):
+
+        if msg == '':
+            return
+        try:
+            _symbol, _data = msg.split(" ", 1)
+            _bid, _ask = _data.split(string_delimiter)[:2]
+        except ValueError:
+            return  # message without symbol or prices
+        _now = time.time()
+        _timestamp = str(datetime.utcfromtimestamp(_now))
+
+        if self._verbose:
+            print(
+                "\n[" + _symbol + "] " + _timestamp + " (" + _bid + "/" + _ask + ") BID/ASK")
+
+        counter = self._tick_counters.get(_symbol)
+        if counter is None:
+            counter = self._tick_counters[_symbol] = TickCounter()
+        counter.add(_now)
+
+        # Update Market Data
+        if self._market_data_maxlen > 0:
+            ticks = self._Market_Data_DB.get(_symbol)
+            if ticks is None:
+                ticks = self._Market_Data_DB[_symbol] = deque(maxlen=self._market_data_maxlen)
+            ticks.append((_timestamp, float(_bid), float(_ask)))
+
+        if self._market_data_callback:
+            _event = {'Symbol': _symbol,
+                      'Time': _timestamp,
+                      'Bid': _bid,
+                      'Ask': _ask}
+            _start = time.perf_counter()
+            self._market_data_callback(_event)
+            self._callback_latency.add(_symbol, time.perf_counter() - _start)
 
     ##########################################################################
 
@@ -464,8 +562,10 @@ class MTZeroMQConnector():
         self._SUB_SOCKET.setsockopt_string(zmq.SUBSCRIBE, _symbol)
 
         if self._MarketData_Thread is None:
+            self._ACTIVE = True
             self._MarketData_Thread = Thread(target=self._MT_ZMQ_Poll_Data,
-                                             args=(_string_delimiter))
+                                             args=(_string_delimiter,),
+                                             daemon=True)
             self._MarketData_Thread.start()
 
         print(f"[KERNEL] Suscrito al {_symbol} para actualizaciones de BID/ASK ")